@@ -0,0 +1,92 @@
+"""
+Chunking multi-megabyte manuscripts: the legacy string slicer vs offset spans.
+
+Legacy is the old _chunk_text body: normalized copy of the text, split() copies of
+every paragraph, `current_chunk +=` merging and no MAX_CHUNK_SIZE. The span chunker
+walks the text with regex positions and only returns offsets. Also reports peak
+traced memory and the largest chunk each produces.
+
+Run from backend/:  python -m benchmarks.bench_chunker [--mb 1 4 16]
+"""
+import argparse
+import random
+import re
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.text_processor import processor
+
+WORDS = "the merchant walked along the canal and spoke of ships ledgers bonds and weather".split()
+
+
+def make_text(mb: float, rng: random.Random, paragraphs: bool = True) -> str:
+    parts, size = [], 0
+    while size < mb * 1024 * 1024:
+        sentences = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 25))).capitalize() + "."
+                     for _ in range(rng.randint(1, 40))]
+        part = " ".join(sentences)
+        parts.append(part)
+        size += len(part) + 2
+    return ("\r\n\r\n" if paragraphs else " ").join(parts)
+
+
+def legacy(text: str, min_size: int = 200):
+    text = text.strip()
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    raw_chunks = [p.strip() for p in text.split('\n\n') if p.strip()]
+    if len(raw_chunks) <= 1:
+        raw_chunks = [p.strip() for p in text.split('\n') if p.strip()]
+    if len(raw_chunks) <= 1:
+        raw_chunks = re.split(r'(?<=[.!?])\s+', text)
+    final_chunks, current_chunk = [], ""
+    for piece in raw_chunks:
+        if len(current_chunk) + len(piece) < min_size:
+            current_chunk += "\n\n" + piece
+        else:
+            if current_chunk:
+                final_chunks.append(current_chunk.strip())
+            current_chunk = piece
+    if current_chunk:
+        final_chunks.append(current_chunk.strip())
+    return [len(c) for c in final_chunks]
+
+
+def spans(text: str):
+    return [end - start for start, end in processor.chunk_spans(text)]
+
+
+def measure(fn, text):
+    start = time.perf_counter()
+    sizes = fn(text)
+    elapsed = time.perf_counter() - start
+
+    # Separate traced run: tracemalloc slows allocation-heavy code down
+    tracemalloc.start()
+    fn(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, sizes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=float, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    print(f"{'input':>14} {'impl':>7} {'time s':>7} {'peak MB':>8} {'chunks':>7} {'largest':>8}")
+    for mb in args.mb:
+        for paragraphs in (True, False):
+            text = make_text(mb, rng, paragraphs)
+            label = f"{mb:g}MB {'paras' if paragraphs else 'block'}"
+            for name, fn in (("legacy", legacy), ("spans", spans)):
+                elapsed, peak, sizes = measure(fn, text)
+                print(f"{label:>14} {name:>7} {elapsed:>7.2f} {peak / 1e6:>8.1f} {len(sizes):>7} {max(sizes):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Statements and wall time per chunk for GraphManager._save_transaction.
+
+By default the transaction is an in-memory stand-in that records every Cypher
+statement and sleeps for a simulated Bolt round trip. Pass --neo4j to write to the
+database configured in .env instead (uses a throwaway manuscript id).
+
+Run from backend/:  python -m benchmarks.bench_graph_writes
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.graph_manager import graph_db
+from services.neo4j_driver import close_driver
+
+
+class RecordingResult:
+    def __init__(self, version: int):
+        self.version = version
+
+    async def single(self):
+        # Only the manuscript version bump reads its result
+        return {"version": self.version}
+
+
+class RecordingTx:
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.statements = 0
+
+    async def run(self, query, **params):
+        self.statements += 1
+        await asyncio.sleep(self.rtt)
+        return RecordingResult(self.statements)
+
+
+def make_chunk(n_chars: int, n_locs: int, n_events: int):
+    return {
+        "characters": [{"text": f"Character {i}", "archetype": "Hero", "emotion": "Calm", "goal": "Win"} for i in range(n_chars)],
+        "locations": [{"text": f"Place {i}", "type": "Setting"} for i in range(n_locs)],
+        "events": [{"text": f"Event {i} happens", "significance": "Medium"} for i in range(n_events)],
+        "relationships": [],
+    }
+
+
+def legacy_statement_count(entities: dict, seq_index: int) -> int:
+    # Previous write path: scene + timeline link + one statement per row + description
+    events = entities["events"]
+    return 1 + (seq_index > 0) + len(entities["characters"]) + len(entities["locations"]) + bool(events) + len(events)
+
+
+async def write_chunks(entities: dict, args) -> int:
+    statements = 0
+    for i in range(args.chunks):
+        metadata = {"manuscript_id": "bench-graph-writes", "paragraph": f"0_{i}", "chunk_index": i, "raw_text": "bench"}
+        if args.neo4j:
+            await graph_db.save_extracted_entities(entities, metadata)
+        else:
+            tx = RecordingTx(args.rtt)
+            await graph_db._save_transaction(tx, entities, metadata)
+            statements = tx.statements
+    return statements
+
+
+async def cleanup():
+    async with graph_db.driver.session() as session:
+        await session.run("MATCH (m:Manuscript {id: 'bench-graph-writes'})-[:CONTAINS]->(s) DETACH DELETE m, s")
+        await session.run("MATCH (n {manuscript_id: 'bench-graph-writes'}) DETACH DELETE n")
+    await close_driver()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rtt", type=float, default=0.002, help="simulated seconds per statement")
+    parser.add_argument("--chunks", type=int, default=20)
+    parser.add_argument("--neo4j", action="store_true", help="write to the real database instead")
+    args = parser.parse_args()
+
+    shapes = [(1, 1, 1), (4, 2, 3), (8, 4, 5), (20, 8, 12)]
+    print(f"{'chars/locs/events':>18} {'stmts':>6} {'legacy':>7} {'ms/chunk':>9}")
+
+    for shape in shapes:
+        entities = make_chunk(*shape)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):  # Silence the per-scene log line
+            statements = await write_chunks(entities, args)
+        per_chunk = (time.perf_counter() - start) / args.chunks * 1000
+        legacy = legacy_statement_count(entities, 1)
+        label = "/".join(map(str, shape))
+        print(f"{label:>18} {statements if not args.neo4j else '-':>6} {legacy:>7} {per_chunk:>9.1f}")
+
+    if args.neo4j:
+        await cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+"""
+Tolerant single-pass parser (services/json_repair.py) vs the previous
+EntityExtractor parser on a corpus of malformed extraction completions.
+
+The corpus mirrors failure modes seen from llama-3.1-8b-instant: code fences and
+chatter, unquoted keys, single quotes, trailing commas, raw newlines in strings
+and completions cut off by max_tokens. Each case is also scaled up to long
+completions (many entities) to show how cost grows.
+
+Run from backend/:  python -m benchmarks.bench_json_repair
+"""
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.json_repair import parse_llm_json
+
+
+# --- Previous parser, kept verbatim for comparison ---
+def legacy_parse(content: str):
+    def sanitize(text):
+        text = re.sub(r'```json\s*', '', text)
+        text = re.sub(r'```', '', text)
+        return text.strip()
+
+    def surgical(text):
+        text = sanitize(text)
+        start_idx = text.find('{')
+        if start_idx == -1: return None
+        balance = 0
+        in_string = False
+        escape = False
+        for i in range(start_idx, len(text)):
+            char = text[i]
+            if char == '"' and not escape: in_string = not in_string
+            if char == '\\' and not escape: escape = True
+            else: escape = False
+            if not in_string:
+                if char == '{': balance += 1
+                elif char == '}':
+                    balance -= 1
+                    if balance == 0:
+                        json_str = text[start_idx : i + 1]
+                        try:
+                            return json.loads(json_str)
+                        except json.JSONDecodeError:
+                            fixed_str = re.sub(r'(?<!")(\b\w+\b)(?=\s*:)', r'"\1"', json_str)
+                            try:
+                                return json.loads(fixed_str)
+                            except:
+                                continue
+        return None
+
+    extracted = surgical(content)
+    if not extracted:
+        json_match = re.search(r'\{.*\}', content, re.DOTALL)
+        if json_match:
+            try:
+                extracted = json.loads(json_match.group())
+            except:
+                fixed_str = re.sub(r'(?<!")(\b\w+\b)(?=\s*:)', r'"\1"', json_match.group())
+                extracted = json.loads(fixed_str)
+        else:
+            raise ValueError("No JSON found")
+    return extracted
+
+
+def entity(i):
+    return {"text": f"Character {i}", "archetype": "Merchant", "emotion": "Anxious", "goal": "Repay the bond"}
+
+
+def corpus(n):
+    chars = [entity(i) for i in range(n)]
+    good = json.dumps({"characters": chars, "locations": [{"text": "Venice", "type": "City"}], "events": [], "relationships": []})
+    return {
+        "valid": good,
+        "fenced + chatter": f"Sure! Here is the JSON you asked for:\n```json\n{good}\n```\nLet me know if you need more.",
+        "trailing commas": good.replace("}", ",}").replace("]", ",]"),
+        "unquoted keys": re.sub(r'"(\w+)":', r'\1:', good),
+        "single quotes": good.replace('"', "'"),
+        "raw newlines": good.replace("Repay the bond", "Repay\nthe bond"),
+        "truncated": good[: int(len(good) * 0.7)],
+        "missing commas": good.replace("}, {", "} {"),
+    }
+
+
+def count_entities(result):
+    if not isinstance(result, dict):
+        return 0
+    return sum(len(result.get(k) or []) for k in ("characters", "locations", "events") if isinstance(result.get(k), list))
+
+
+def timed(fn, text, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        try:
+            result = fn(text)
+        except Exception:
+            result = None
+    return (time.perf_counter() - start) / repeat * 1e6, result
+
+
+def main():
+    print(f"{'case':>18} {'entities':>8} | {'legacy µs':>10} {'found':>6} | {'repair µs':>10} {'found':>6}")
+    for n in (5, 200):
+        print(f"--- {n} characters per completion ---")
+        for name, text in corpus(n).items():
+            legacy_us, legacy = timed(legacy_parse, text, 20)
+            repair_us, repaired = timed(lambda t: parse_llm_json(t).value, text, 20)
+            print(f"{name:>18} {n + 1:>8} | {legacy_us:>10.0f} {count_entities(legacy):>6} | {repair_us:>10.0f} {count_entities(repaired):>6}")
+
+
+if __name__ == "__main__":
+    main()
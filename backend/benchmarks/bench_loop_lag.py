@@ -0,0 +1,90 @@
+"""
+Event-loop responsiveness while N extractions are in flight.
+
+A ticker task asks to wake every 10 ms and records how late it actually wakes
+(loop lag). EntityExtractor runs with a stub LLM whose round trip takes
+--latency seconds, either as a real await (the async node) or as a blocking
+sleep (what a synchronous invoke on the loop looks like). The async run must
+stay under --max-lag-ms, otherwise the script exits non-zero.
+
+Run from backend/:  python -m benchmarks.bench_loop_lag
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.entity_extractor import EntityExtractor
+from services.rate_limiter import limiter
+
+COMPLETION = json.dumps({
+    "characters": [{"text": "Portia", "archetype": "Heroine", "emotion": "Calm", "goal": "Choose wisely"}],
+    "locations": [{"text": "Belmont", "type": "Estate"}],
+    "events": [{"text": "Suitors arrive", "significance": "Medium"}],
+    "relationships": [],
+})
+
+
+class StubLLM:
+    def __init__(self, latency: float, blocking: bool):
+        self.latency = latency
+        self.blocking = blocking
+
+    async def ainvoke(self, prompt):
+        if self.blocking:
+            time.sleep(self.latency)
+        else:
+            await asyncio.sleep(self.latency)
+        return SimpleNamespace(content=COMPLETION)
+
+
+async def measure(n: int, latency: float, blocking: bool):
+    extractor = EntityExtractor(llm=StubLLM(latency, blocking))
+    limiter.configure(extractor.model_name, rpm=100000, tpm=10 ** 9, max_concurrency=n)
+
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - start - 0.01)
+
+    tick = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    results = await asyncio.gather(*(extractor.extract(f"Chunk {i} text.", {}, []) for i in range(n)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await tick
+
+    assert all(r.get("characters") for r in results)
+    return elapsed, max(lags) * 1000, sorted(lags)[len(lags) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=20, help="extractions in flight")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per stub LLM call")
+    parser.add_argument("--max-lag-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    print(f"{args.n} concurrent extractions, {args.latency * 1000:.0f} ms per LLM call")
+    failed = False
+    for label, blocking in (("blocking", True), ("async", False)):
+        elapsed, max_lag, median_lag = asyncio.run(measure(args.n, args.latency, blocking))
+        print(f"{label:>9}: total {elapsed:5.2f}s, loop lag max {max_lag:7.1f} ms, median {median_lag:5.1f} ms")
+        if not blocking and max_lag > args.max_lag_ms:
+            failed = True
+
+    print("FAIL: loop lag above bound" if failed else f"OK: async loop lag stayed under {args.max_lag_ms:.0f} ms")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
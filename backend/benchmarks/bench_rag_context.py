@@ -0,0 +1,84 @@
+"""
+RAG prompt size and latency: whole timeline vs relevance-bounded selection.
+
+Builds synthetic timelines (a cast of named characters, varied events) of growing
+length and asks a few questions of each. Reports context tokens sent, selection time,
+and an estimated model latency from --base-ms plus --ms-per-1k prompt tokens (a
+stand-in for prefill cost, so no API key is needed). Also checks that every scene of
+a character named in the question made it into the selected context.
+
+Run from backend/:  python -m benchmarks.bench_rag_context
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.context_selector import ContextSelector
+from services.timeline_digest import TimelineDigest
+from services.tokens import estimate_tokens
+
+CAST = ["Portia", "Bassanio", "Antonio", "Shylock", "Jessica", "Lorenzo", "Gratiano", "Nerissa",
+        "Launcelot", "Tubal", "Salerio", "Solanio", "Leonardo", "Balthazar", "Stephano", "Old Gobbo"]
+ACTIONS = ["argues with", "borrows money from", "writes a letter to", "travels to Belmont with",
+           "hides a ring from", "pleads in court against", "dines with", "elopes with", "mocks", "forgives"]
+PLACES = ["Venice", "Belmont", "the Rialto", "the court", "Shylock's house", "a gondola"]
+EMOTIONS = ["Anxious", "Joyful", "Bitter", "Hopeful", "Furious", "Calm"]
+QUESTIONS = [
+    "How does Jessica feel about leaving her father?",
+    "What happens with the ring at Belmont?",
+    "Why does Antonio borrow money and who is involved?",
+    "How does Shylock change through the court scenes?",
+]
+
+
+def make_digest(n_scenes: int, rng: random.Random) -> TimelineDigest:
+    digest = TimelineDigest("bench-rag")
+    for i in range(n_scenes):
+        names = rng.sample(CAST, 3)
+        place = rng.choice(PLACES)
+        events = [f"{names[0]} {rng.choice(ACTIONS)} {names[1]} in {place}",
+                  f"{names[2]} {rng.choice(ACTIONS)} {names[0]}"]
+        states = [f"{n} (Feeling: {rng.choice(EMOTIONS)}, Goal: Settle the bond)" for n in names]
+        digest.upsert(f"bench-rag_p{i}", i, events[0], events, states, names)
+    return digest
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget", type=int, default=3000, help="context token budget")
+    parser.add_argument("--base-ms", type=float, default=250.0, help="estimated fixed model latency")
+    parser.add_argument("--ms-per-1k", type=float, default=80.0, help="estimated latency per 1k prompt tokens")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    selector = ContextSelector()
+    print(f"{'scenes':>7} {'full tok':>9} {'sent tok':>9} {'select ms':>10} {'model ms (full)':>15} {'named kept':>11}")
+
+    for n_scenes in (20, 100, 300, 1000):
+        digest = make_digest(n_scenes, rng)
+        full_tokens = estimate_tokens(digest.text())
+        sent, select_ms, kept = [], [], []
+        for question in QUESTIONS:
+            start = time.perf_counter()
+            context = selector.select(digest, question, budget_tokens=args.budget)
+            select_ms.append((time.perf_counter() - start) * 1000)
+            sent.append(estimate_tokens(context))
+
+            named = selector.named_characters(question, digest.ordered())
+            must = [s for s in digest.ordered() if named.intersection(s["names"])]
+            kept.append(all(f"SCENE {s['step']}:\n" in context for s in must))
+
+        tokens = statistics.mean(sent)
+        model_ms = args.base_ms + tokens / 1000 * args.ms_per_1k
+        full_ms = args.base_ms + full_tokens / 1000 * args.ms_per_1k
+        print(f"{n_scenes:>7} {full_tokens:>9} {tokens:>9.0f} {statistics.mean(select_ms):>10.2f} "
+              f"{model_ms:>7.0f} ({full_ms:>5.0f}) {'yes' if all(kept) else 'NO':>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Exercises the shared rate limiter against a local stub server that returns 429s.
+
+The stub accepts --server-rpm requests per rolling minute-window (scaled down to
+--window seconds so the run is short) and answers everything else with
+429 + Retry-After. We fire --calls concurrent requests through the limiter and,
+for comparison, through a naive client that retries immediately.
+
+Run from backend/:  python -m benchmarks.bench_rate_limiter
+"""
+import argparse
+import asyncio
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.rate_limiter import RateLimiter, is_rate_limited
+
+
+def start_stub_server(max_requests: int, window: float, latency: float):
+    lock = threading.Lock()
+    accepted = deque()
+    counters = {"ok": 0, "429": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with lock:
+                now = time.monotonic()
+                while accepted and now - accepted[0] > window:
+                    accepted.popleft()
+                allowed = len(accepted) < max_requests
+                if allowed:
+                    accepted.append(now)
+                    counters["ok"] += 1
+                else:
+                    counters["429"] += 1
+                    reset = window - (now - accepted[0])
+            if allowed:
+                time.sleep(latency)
+                body = b'{"choices": [{"message": {"content": "{}"}}]}'
+                self.send_response(200)
+            else:
+                body = b'{"error": {"code": "rate_limit_exceeded"}}'
+                self.send_response(429)
+                self.send_header("Retry-After", f"{reset:.2f}")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, counters
+
+
+def post(url: str):
+    request = urllib.request.Request(url, data=b'{"model": "stub"}', method="POST")
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.read()
+
+
+async def run_limited(url: str, calls: int, limiter: RateLimiter):
+    async def one():
+        # urllib.error.HTTPError carries .code and .headers, like the Groq SDK errors
+        return await limiter.acall("stub-model", lambda: asyncio.to_thread(post, url), tokens=100)
+    await asyncio.gather(*(one() for _ in range(calls)))
+
+
+async def run_naive(url: str, calls: int):
+    async def one():
+        while True:
+            try:
+                return await asyncio.to_thread(post, url)
+            except urllib.error.HTTPError as e:
+                if not is_rate_limited(e):
+                    raise
+                await asyncio.sleep(0.01)
+    await asyncio.gather(*(one() for _ in range(calls)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=40)
+    parser.add_argument("--server-rpm", type=int, default=10, help="requests the stub allows per window")
+    parser.add_argument("--window", type=float, default=2.0, help="stub window in seconds (stands in for a minute)")
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    for label in ("naive", "limiter"):
+        server, counters = start_stub_server(args.server_rpm, args.window, args.latency)
+        url = f"http://127.0.0.1:{server.server_address[1]}/openai/v1/chat/completions"
+
+        start = time.perf_counter()
+        if label == "naive":
+            asyncio.run(run_naive(url, args.calls))
+        else:
+            limiter = RateLimiter()
+            # Budget deliberately set 50% above what the stub allows, to show 429 adaptation
+            per_minute = args.server_rpm * 60 / args.window * 1.5
+            limiter.configure("stub-model", rpm=per_minute, tpm=per_minute * 1000, max_concurrency=8)
+            asyncio.run(run_limited(url, args.calls, limiter))
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+
+        print(f"{label:>8}: {args.calls} calls in {elapsed:5.2f}s, {counters['429']:>4} x 429 received")
+        if label == "limiter":
+            print(f"          limiter stats: {limiter.stats()['stub-model']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Sentiment scoring for a whole manuscript: legacy per-row loop vs the batch engine.
+
+Legacy is the old get_character_arc body: TextBlob on every scene, two any(...)
+trigger scans, and a Python moving average. The engine scans both lexicons with one
+compiled regex, runs TextBlob only where no trigger decides the score, and smooths
+with NumPy. Also checks that both produce the same scores. TextBlob dominates both,
+so at realistic trigger rates (~20%) the engine is only 1.0-1.2x faster.
+
+Run from backend/:  python -m benchmarks.bench_sentiment [--scenes 10000]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from textblob import TextBlob
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.sentiment import NEGATIVE_TRIGGERS, POSITIVE_TRIGGERS, classify_arc, score_texts, smooth
+
+NEUTRAL_WORDS = ("the merchant walked along the canal and spoke of ships ledgers bonds and the weather "
+                 "in venice while servants carried letters between houses and the court met again").split()
+
+
+def make_scenes(n: int, trigger_rate: float, rng: random.Random):
+    scenes = []
+    for _ in range(n):
+        words = [rng.choice(NEUTRAL_WORDS) for _ in range(90)]
+        if rng.random() < trigger_rate:
+            words[rng.randrange(len(words))] = rng.choice(NEGATIVE_TRIGGERS + POSITIVE_TRIGGERS)
+        scenes.append(" ".join(words).capitalize() + ".")
+    return scenes
+
+
+def legacy(texts):
+    scores, smoothed = [], []
+    for idx, analysis_text in enumerate(texts):
+        polarity = TextBlob(analysis_text).sentiment.polarity
+        text_lower = analysis_text.lower()
+        if any(x in text_lower for x in NEGATIVE_TRIGGERS):
+            polarity = -0.8
+        elif any(x in text_lower for x in POSITIVE_TRIGGERS):
+            polarity = 0.8
+        scores.append(polarity)
+        window = scores[max(0, idx-2) : idx+1]
+        smoothed.append(sum(window) / len(window))
+    delta = scores[-1] - scores[0]
+    arc = "Redemption / Rise" if delta > 0.4 else "Tragedy / Fall" if delta < -0.4 else "Steady / Flat"
+    return scores, smoothed, arc
+
+
+def engine(texts):
+    scores = score_texts(texts)["score"]
+    return scores, smooth(scores), classify_arc(scores)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenes", type=int, default=10000)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    print(f"{'triggered':>10} {'legacy s':>9} {'engine s':>9} {'speedup':>8} {'match':>6}")
+    for rate in (0.2, 0.6, 0.9):
+        texts = make_scenes(args.scenes, rate, rng)
+
+        start = time.perf_counter()
+        old_scores, old_smoothed, old_arc = legacy(texts)
+        legacy_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        new_scores, new_smoothed, new_arc = engine(texts)
+        engine_s = time.perf_counter() - start
+
+        match = (np.allclose(old_scores, new_scores) and np.allclose(old_smoothed, new_smoothed) and old_arc == new_arc)
+        print(f"{rate:>10.0%} {legacy_s:>9.2f} {engine_s:>9.2f} {legacy_s / engine_s:>7.1f}x {'yes' if match else 'NO':>6}")
+
+
+if __name__ == "__main__":
+    main()
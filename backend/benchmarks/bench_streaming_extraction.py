@@ -0,0 +1,75 @@
+"""
+Time-to-first-entity with streamed extraction vs waiting for the full completion.
+
+A local stub plays the LLM: it streams a realistic extraction JSON in ~4-char
+tokens with a fixed per-token delay. The streaming path feeds each token to
+IncrementalEntityParser; the blocking path parses only once the last token lands.
+
+Run from backend/:  python -m benchmarks.bench_streaming_extraction
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.stream_parser import IncrementalEntityParser
+
+
+def fake_completion(n_chars: int, n_locs: int, n_events: int) -> str:
+    body = json.dumps({
+        "characters": [{"text": f"Character {i}", "archetype": "Merchant", "emotion": "Anxious", "goal": "Repay the bond"} for i in range(n_chars)],
+        "locations": [{"text": f"Venice quarter {i}", "type": "City"} for i in range(n_locs)],
+        "events": [{"text": f"Event {i}: a bargain is struck over the ships at sea", "significance": "High"} for i in range(n_events)],
+        "relationships": [],
+    }, indent=2)
+    return f"Here is the extracted knowledge graph:\n```json\n{body}\n```"
+
+
+async def stub_stream(text: str, token_delay: float):
+    for i in range(0, len(text), 4):
+        await asyncio.sleep(token_delay)
+        yield text[i:i + 4]
+
+
+async def streaming(text: str, token_delay: float):
+    start = time.perf_counter()
+    parser = IncrementalEntityParser()
+    first = None
+    count = 0
+    async for token in stub_stream(text, token_delay):
+        found = parser.feed(token)
+        if found and first is None:
+            first = time.perf_counter() - start
+        count += len(found)
+    return first, time.perf_counter() - start, count
+
+
+async def blocking(text: str, token_delay: float):
+    start = time.perf_counter()
+    pieces = [token async for token in stub_stream(text, token_delay)]
+    content = "".join(pieces)
+    result = json.loads(content[content.index("{"):content.rindex("}") + 1])
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed, sum(len(result[k]) for k in ("characters", "locations", "events"))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--token-delay", type=float, default=0.004, help="seconds per streamed token")
+    args = parser.parse_args()
+
+    print(f"{'entities':>9} {'tokens':>7} {'mode':>10} {'first entity':>13} {'complete':>9}")
+    for shape in [(2, 1, 2), (8, 4, 5), (20, 8, 12)]:
+        text = fake_completion(*shape)
+        tokens = len(text) // 4
+        for mode, fn in (("blocking", blocking), ("streaming", streaming)):
+            first, total, count = asyncio.run(fn(text, args.token_delay))
+            print(f"{count:>9} {tokens:>7} {mode:>10} {first * 1000:>10.0f} ms {total * 1000:>6.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
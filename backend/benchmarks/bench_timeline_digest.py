@@ -0,0 +1,168 @@
+"""
+Timeline context latency for GraphRAG: digest build (graph walk) vs cache hit.
+
+By default the graph is an in-memory stand-in that returns synthetic scene records
+after a simulated query time (--rtt plus --per-scene for every scene). "legacy" is
+the previous path: the same query plus += string building on every question.
+"update" is the write-path cost of folding one saved scene into a loaded digest and
+re-rendering it. Pass --neo4j to write the scenes to the database configured in
+.env and time the real query instead (uses a throwaway manuscript id).
+
+Run from backend/:  python -m benchmarks.bench_timeline_digest
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.graph_manager import graph_db
+from services.neo4j_driver import close_driver
+from services.timeline_digest import TIMELINE_QUERY, TimelineDigestRegistry
+
+MANUSCRIPT = "bench-timeline-digest"
+
+
+def make_records(n_scenes: int):
+    return [{
+        "scene_id": f"{MANUSCRIPT}_p{i}",
+        "step": i,
+        "scene_desc": f"Scene {i}: the travellers argue about the road ahead",
+        "specific_events": [f"Event {i}.{j} changes the plan" for j in range(3)],
+        "character_states": [f"Character {j} (Feeling: Tense, Goal: Reach the city)" for j in range(4)],
+        "names": [f"Character {j}" for j in range(4)],
+    } for i in range(n_scenes)]
+
+
+class StubResult:
+    def __init__(self, records):
+        self.records = records
+
+    async def data(self):
+        return self.records
+
+
+class StubSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def run(self, query, **params):
+        await asyncio.sleep(self.driver.rtt + self.driver.per_scene * len(self.driver.records))
+        return StubResult(self.driver.records)
+
+
+class StubDriver:
+    def __init__(self, records, rtt, per_scene):
+        self.records, self.rtt, self.per_scene = records, rtt, per_scene
+
+    def session(self):
+        return StubSession(self)
+
+
+def legacy_render(manuscript_id, records):
+    # Previous _get_narrative_context body
+    context_text = f"STORY TIMELINE FOR MANUSCRIPT '{manuscript_id}':\n\n"
+    for r in records:
+        step = r['step'] if r['step'] is not None else "?"
+        context_text += f"SCENE {step}:\n"
+        context_text += f"  Summary: {r['scene_desc']}\n"
+        if r['specific_events']:
+            valid_events = [ev for ev in r['specific_events'] if ev]
+            if valid_events:
+                context_text += f"  Details: {', '.join(valid_events)}\n"
+        if r['character_states']:
+            context_text += f"  Characters: {'; '.join(r['character_states'])}\n"
+        context_text += "\n"
+    return context_text
+
+
+async def timed(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+async def measure(driver, n_scenes, repeats):
+    async def legacy():
+        async with driver.session() as session:
+            result = await session.run(TIMELINE_QUERY, mid=MANUSCRIPT)
+            legacy_render(MANUSCRIPT, await result.data())
+
+    async def build():
+        registry = TimelineDigestRegistry()
+        (await registry.get(MANUSCRIPT, driver)).text()
+
+    warm = TimelineDigestRegistry()
+    (await warm.get(MANUSCRIPT, driver)).text()
+
+    async def hit():
+        (await warm.get(MANUSCRIPT, driver)).text()
+
+    async def update():
+        warm.record_scene(MANUSCRIPT, f"{MANUSCRIPT}_p{n_scenes}", n_scenes, "A new scene",
+                          ["Something happens"], ["Character 0 (Feeling: Calm, Goal: Rest)"])
+        warm._digests[MANUSCRIPT].text()
+
+    return [await timed(fn, repeats) for fn in (legacy, build, hit, update)]
+
+
+async def seed_neo4j(first, last):
+    entities = {
+        "characters": [{"text": f"Character {j}", "archetype": "Hero", "emotion": "Tense", "goal": "Reach the city"} for j in range(4)],
+        "locations": [{"text": "The road", "type": "Setting"}],
+        "events": [{"text": f"Event {j} changes the plan", "significance": "Medium"} for j in range(3)],
+        "relationships": [],
+    }
+    with contextlib.redirect_stdout(io.StringIO()):  # Silence the per-scene log line
+        for i in range(first, last):
+            metadata = {"manuscript_id": MANUSCRIPT, "paragraph": f"0_{i}", "chunk_index": i, "raw_text": "bench"}
+            await graph_db.save_extracted_entities(entities, metadata)
+
+
+async def cleanup():
+    async with graph_db.driver.session() as session:
+        await session.run("MATCH (m:Manuscript {id: $mid})-[:CONTAINS]->(s) DETACH DELETE m, s", mid=MANUSCRIPT)
+        await session.run("MATCH (n {manuscript_id: $mid}) DETACH DELETE n", mid=MANUSCRIPT)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rtt", type=float, default=0.002, help="simulated query round trip (s)")
+    parser.add_argument("--per-scene", type=float, default=0.00005, help="simulated query time per scene (s)")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--neo4j", action="store_true", help="query the real database instead")
+    args = parser.parse_args()
+
+    print(f"{'scenes':>7} {'legacy ms':>10} {'build ms':>9} {'hit ms':>8} {'update ms':>10}")
+    seeded = 0
+    for n_scenes in (20, 300, 1000):
+        if args.neo4j:
+            await seed_neo4j(seeded, n_scenes)  # Continues the sequence already written
+            seeded = n_scenes
+            driver = graph_db.driver
+        else:
+            driver = StubDriver(make_records(n_scenes), args.rtt, args.per_scene)
+        legacy, build, hit, update = await measure(driver, n_scenes, args.repeats)
+        print(f"{n_scenes:>7} {legacy:>10.2f} {build:>9.2f} {hit:>8.4f} {update:>10.3f}")
+
+    if args.neo4j:
+        await cleanup()
+        await close_driver()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
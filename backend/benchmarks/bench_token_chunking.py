@@ -0,0 +1,82 @@
+"""
+Requests per novel and tokens per request: char chunking vs token-budget chunking.
+
+A synthetic novel mixes dialogue (short lines), ordinary paragraphs and long
+descriptive passages. Char mode is the default chunker, with MIN_CHUNK_SIZE
+merging and MAX_CHUNK_SIZE splitting. Its "cut" column counts the chunks the old
+extractor would have truncated at 6000 chars; token mode sends them whole.
+
+Token mode packs each chunk up to the input budget left by the prompt template
+and the expected output, for several per-call budgets. Token counts come from
+count_tokens, which uses the local tokenizer if available and the estimator
+otherwise.
+
+Run from backend/:  python -m benchmarks.bench_token_chunking [--mb 1]
+"""
+import argparse
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.text_processor import TextStreamProcessor
+from services.tokens import count_tokens, token_counter
+
+try:
+    from services.entity_extractor import EXTRACTION_TEMPLATE, EntityExtractor
+    PROMPT_TOKENS = count_tokens(EXTRACTION_TEMPLATE.format(text=""))
+    OUTPUT_TOKENS = EntityExtractor.OUTPUT_TOKENS
+except ImportError:  # langchain not installed: the template is ~1440 chars
+    PROMPT_TOKENS, OUTPUT_TOKENS = 360, 400
+
+WORDS = "the merchant walked along the canal and spoke of ships ledgers bonds weather gold".split()
+
+
+def sentence(rng, lo=5, hi=25):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(lo, hi))).capitalize() + "."
+
+
+def make_novel(mb: float, rng: random.Random) -> str:
+    parts, size = [], 0
+    while size < mb * 1024 * 1024:
+        style = rng.random()
+        if style < 0.4:    # Dialogue: one short line per paragraph
+            part = f'"{sentence(rng, 3, 12)}" said {rng.choice(["Antonio", "Portia", "Shylock"])}.'
+        elif style < 0.9:  # Ordinary paragraph
+            part = " ".join(sentence(rng) for _ in range(rng.randint(3, 10)))
+        else:              # Long descriptive passage
+            part = " ".join(sentence(rng) for _ in range(rng.randint(60, 200)))
+        parts.append(part)
+        size += len(part) + 2
+    return "\n\n".join(parts)
+
+
+def report(label: str, text: str, spans, call_budget: int = None):
+    chunk_tokens = [count_tokens(text[s:e]) for s, e in spans]
+    per_request = [PROMPT_TOKENS + t + OUTPUT_TOKENS for t in chunk_tokens]
+    mean = sum(per_request) / len(per_request)
+    cut = sum(1 for s, e in spans if e - s > 6000)
+    used = f"{mean / call_budget:>6.0%}" if call_budget else f"{'-':>6}"
+    print(f"{label:>14} {len(spans):>9} {mean:>10.0f} {max(per_request):>9} {used} {cut:>5}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=float, default=1)
+    args = parser.parse_args()
+
+    text = make_novel(args.mb, random.Random(7))
+    print(f"{len(text) / 1e6:.1f}M chars, {count_tokens(text)} tokens ({token_counter.stats()['mode']}), "
+          f"prompt {PROMPT_TOKENS} + output {OUTPUT_TOKENS} tokens per request")
+    print(f"{'mode':>14} {'requests':>9} {'tok/req':>10} {'max tok':>9} {'budget':>6} {'cut':>5}")
+
+    chunker = TextStreamProcessor()
+    report("chars", text, list(chunker.chunk_spans(text)))
+    for call_budget in (2000, 3000, 6000):
+        chunker.token_budget = call_budget - PROMPT_TOKENS - OUTPUT_TOKENS
+        report(f"tokens/{call_budget}", text, list(chunker.chunk_spans(text)), call_budget)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Bulk-ingest a manuscript text file (no browser tab needed)
+
+  python ingest.py novel.txt --manuscript my-novel
+      Runs the pipeline in this process: the file is memory-mapped, chunked
+      incrementally and extracted by the same worker pool the server uses.
+
+  python ingest.py novel.txt --manuscript my-novel --server http://localhost:8000
+      Streams the file to a running server (POST /ingest/{id}) and polls the job.
+"""
+import argparse
+import asyncio
+import mmap
+import os
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+sys.path.insert(0, str(Path(__file__).parent))
+load_dotenv(Path(__file__).parent / ".env")
+
+UPLOAD_BLOCK = 1024 * 1024
+POLL_SECONDS = 2.0
+
+
+def print_progress(job: dict):
+    progress = f"{job['progress']:.0%}" if job["progress"] is not None else "?"
+    print(f"⏳ {job['state']}: {job['bytes_read']}/{job['bytes_total']} bytes read, "
+          f"{job['chunks_extracted']}/{job['chunks_queued']} chunks extracted "
+          f"({job['chunks_failed']} failed, {job['chunks_unchanged']} unchanged) {progress}")
+
+
+def print_usage(stats: dict, manuscript_id: str):
+    usage = stats["manuscripts"].get(manuscript_id)
+    if usage:
+        print(f"🧮 {usage['requests']} LLM requests, {usage['chunks_per_request']} chunks and "
+              f"{usage['tokens_per_request']} tokens per request ({usage['budget_used']:.0%} of {stats['call_tokens']})")
+
+
+def file_blocks(path: Path):
+    # mmap slices, so the upload never reads the whole file into memory
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for offset in range(0, len(mm), UPLOAD_BLOCK):
+                yield mm[offset:offset + UPLOAD_BLOCK]
+
+
+def ingest_remote(args) -> dict:
+    import httpx
+
+    with httpx.Client(base_url=args.server, timeout=None) as client:
+        response = client.post(
+            f"/ingest/{args.manuscript}",
+            params={"chapter": args.chapter, "paragraph": args.paragraph, "filename": args.file.name},
+            content=file_blocks(args.file),
+            headers={"Content-Type": "text/plain; charset=utf-8"},
+        )
+        response.raise_for_status()
+        job = response.json()
+        print(f"✓ Uploaded {args.file.name}: job {job['job_id']}")
+
+        while job["state"] not in ("done", "failed"):
+            time.sleep(POLL_SECONDS)
+            job = client.get(f"/ingest/jobs/{job['job_id']}").json()
+            print_progress(job)
+        print_usage(client.get("/stats/extraction").json(), args.manuscript)
+        return job
+
+
+async def ingest_local(args) -> dict:
+    # Same pipeline as the API (schema, embedding pipeline, worker pool), but without
+    # resuming unfinished jobs: those belong to the server, which may be running them
+    from main import shutdown_event, start_pipeline, story_logic
+    from services.ingest_jobs import ingest_jobs
+
+    await start_pipeline()
+    try:
+        job = ingest_jobs.start_file(args.manuscript, args.file, args.chapter, args.paragraph)
+        while True:
+            try:
+                await asyncio.wait_for(job.wait(), POLL_SECONDS)
+                break
+            except asyncio.TimeoutError:
+                print_progress(job.to_dict())
+        print_usage(story_logic.extractor.stats(), args.manuscript)
+        return job.to_dict()
+    finally:
+        await shutdown_event()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-ingest a manuscript text file")
+    parser.add_argument("file", type=Path)
+    parser.add_argument("--manuscript", required=True)
+    parser.add_argument("--chapter", type=int, default=1)
+    parser.add_argument("--paragraph", type=int, default=0, help="Base paragraph id of the chunks (0_0, 0_1, ...)")
+    parser.add_argument("--server", help="Upload to a running server instead of ingesting in-process")
+    args = parser.parse_args()
+
+    job = ingest_remote(args) if args.server else asyncio.run(ingest_local(args))
+    print_progress(job)
+    if job["state"] == "failed":
+        print(f"❌ Ingest failed: {job['error']}")
+        sys.exit(1)
+    print(f"✓ Ingested {args.file.name} into {args.manuscript} in {job['elapsed_s']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import os
 import sys
 import asyncio
 import uvicorn
@@ -13,11 +14,21 @@ sys.path.insert(0, str(Path(__file__).parent))
 # --- SERVICE IMPORTS ---
 from services.text_processor import processor as text_streamer
 from services.story_processor import processor as story_logic
+from services.worker_pool import ExtractionWorkerPool
+from services.embedding_pipeline import embedding_pipeline
+from services.graph_manager import graph_db
+from services.job_store import job_store
+from services.neo4j_driver import close_driver
+from services.schema import apply_schema, print_report
+from services.tokens import token_counter
 
 # --- ROUTER IMPORTS ---
 # We alias 'character_arc' as 'analytics' to keep the URL path clean
 from routers import character_arc as analytics 
 from routers import rag
+from routers import stats
+from routers import entities
+from routers import ingest
 
 # Load environment variables
 load_dotenv(Path(__file__).parent / ".env")
@@ -37,45 +48,138 @@ app.add_middleware(
 # --- REGISTER ROUTERS ---
 app.include_router(analytics.router) # Endpoints: /analytics/character-arc/...
 app.include_router(rag.router)       # Endpoints: /rag/query
+app.include_router(stats.router)     # Endpoints: /stats/* (cache, limiter and pipeline counters)
+app.include_router(entities.router)  # Endpoints: /entities/{id}/aliases
+app.include_router(ingest.router)    # Endpoints: /ingest/{id}, /ingest/jobs/{job_id}
 
-# --- BACKGROUND WORKER ---
-async def extraction_worker():
+# --- BACKGROUND WORKERS ---
+# Stream LLM tokens and push 'entity_partial' frames before the full result is ready
+STREAM_EXTRACTION = os.getenv("STREAM_EXTRACTION", "0") == "1"
+
+async def extraction_worker(jobs):
+    """
+    Processes consecutive queued chunks of one manuscript through the Story Processor.
+    Runs inside the worker pool so the WebSocket stays responsive. With packing enabled
+    (EXTRACTION_BATCH_TOKENS) several chunks share one LLM call. Bulk ingest and resumed
+    jobs have no WebSocket (websocket=None); ingest jobs report to their IngestJob.
+
+    Each job is claimed in the durable job store first. Jobs are processed even when
+    their WebSocket has closed: they are persisted, so dropping them would only defer
+    them to the next restart. A job superseded by newer text of its slot is skipped.
+    """
+    live, results = [], []
+    try:
+        live = [job for job in jobs if await asyncio.to_thread(job_store.claim, job_store.key(job['metadata']))]
+        if not live:
+            return
+
+        # 1. Extract Entities (AI + Graph Logic)
+        if len(live) == 1:
+            job = live[0]
+            on_entity = None
+            if STREAM_EXTRACTION and job['websocket'] is not None:
+                # Push each entity to the sidebar as soon as the model has written it;
+                # the graph write still happens once, at the end. A closed socket only
+                # stops these frames, never the extraction itself.
+                async def on_entity(kind, entity):
+                    websocket = job['websocket']
+                    if websocket.client_state != WebSocketState.CONNECTED:
+                        return
+                    try:
+                        await websocket.send_json({
+                            "type": "entity_partial",
+                            "kind": kind,
+                            "entity": entity,
+                            "paragraph_index": job['metadata'].get('chunk_index')
+                        })
+                    except Exception as e:
+                        print(f"⚠️ Could not send 'entity_partial': {e}")
+            results = [await story_logic.process_paragraph(job['text'], job['metadata'], on_entity)]
+        else:
+            results = await story_logic.process_batch([(job['text'], job['metadata']) for job in live])
+
+        # 2. Send 'Success' signal back to Frontend
+        # Note: We send the full result mostly for debugging/visualization on the front end
+        for job, result in zip(live, results):
+            metadata = job['metadata']
+            if job['websocket'] is None or job['websocket'].client_state != WebSocketState.CONNECTED:
+                continue
+            await job['websocket'].send_json({
+                "type": "entities_extracted", 
+                "data": result,
+                "paragraph_index": metadata.get('chunk_index'),
+                # Source offsets of the chunk, so the editor can highlight it
+                "char_start": metadata.get('char_start'),
+                "char_end": metadata.get('char_end')
+            })
+
+            print(f"🚀 Sent results for Paragraph {metadata.get('paragraph')}")
+    finally:
+        # Free the backpressure slots so throttled producers can continue, record each
+        # outcome in the job store and count finished chunks of bulk ingest jobs
+        # (an exception fails the whole batch)
+        outcome = {id(job): result for job, result in zip(live, results)}
+        claimed = {id(job) for job in live}
+        for job in jobs:
+            text_streamer.release(job)
+            result = outcome.get(id(job))
+            ok = result is not None and "error" not in result
+            if id(job) in claimed and not await asyncio.to_thread(record_outcome, job, result, ok):
+                text_streamer.forget(job['metadata'])  # So resending the chunk retries it
+            if job.get('ingest') is not None:
+                # A superseded job has nothing left to do: not a failure
+                job['ingest'].chunk_finished(ok or id(job) not in claimed)
+
+def record_outcome(job, result, ok) -> bool:
+    """
+    Marks the claimed job done or failed in the job store. True if it is done.
+    A paragraph with no characters, locations or events is done too: only an error
+    (or an exception, result None) makes resending the chunk retry it.
     """
-    Consumes chunks from the queue and processes them through the Story Processor.
-    This runs in the background so the WebSocket stays responsive.
+    key = job_store.key(job['metadata'])
+    if ok:
+        job_store.complete(key, result.get('entities_extracted') or {})
+        return True
+    job_store.fail(key, (result or {}).get('error') or "extraction raised")
+    return False
+
+# Different manuscripts run in parallel; chunks of one manuscript stay in order
+worker_pool = ExtractionWorkerPool(text_streamer.processing_queue, extraction_worker)
+
+# --- STARTUP / SHUTDOWN EVENTS ---
+async def start_pipeline():
+    """
+    Schema, tokenizer, embedding pipeline and extraction workers. Also used by the ingest CLI,
+    which must not resume the server's unfinished jobs.
     """
-    print("⚙️ Worker: Online and listening to queue...")
-    while True:
-        # Get a job from the queue
-        job = await text_streamer.processing_queue.get()
-        websocket, text, metadata = job['websocket'], job['text'], job['metadata']
-        
-        try:
-            if websocket.client_state == WebSocketState.CONNECTED:
-                # 1. Extract Entities (AI + Graph Logic)
-                result = await story_logic.process_paragraph(text, metadata)
-                
-                # 2. Send 'Success' signal back to Frontend
-                # Note: We send the full result mostly for debugging/visualization on the front end
-                await websocket.send_json({
-                    "type": "entities_extracted", 
-                    "data": result,
-                    "paragraph_index": metadata.get('chunk_index')
-                })
-                
-                print(f"🚀 Sent results for Paragraph {metadata.get('paragraph')}")
-                
-        except Exception as e:
-            print(f"❌ Worker Error: {e}")
-        finally:
-            # Mark job as done so the queue knows
-            text_streamer.processing_queue.task_done()
-
-# --- STARTUP EVENT ---
+    # Make sure every hot MERGE/MATCH key is backed by an index before writes begin
+    try:
+        print_report(await apply_schema(graph_db.driver))
+    except Exception as e:
+        print(f"⚠️ Schema bootstrap skipped: {e}")
+
+    # Tokenizer before any chunking, so token counts never load it on the event loop
+    await token_counter.load()
+    # Token-budget chunking (CHUNK_MODE=tokens): each chunk is sized so the extraction
+    # prompt + chunk + expected output fill EXTRACTION_CALL_TOKENS, instead of char counts
+    if os.getenv("CHUNK_MODE", "chars") == "tokens":
+        text_streamer.use_token_budget(story_logic.extractor.input_budget())
+
+    # Start the background workers when the API starts
+    embedding_pipeline.start()
+    worker_pool.start()
+
 @app.on_event("startup")
 async def startup_event():
-    # Start the background worker when the API starts
-    asyncio.create_task(extraction_worker())
+    await start_pipeline()
+    # Chunks a previous run queued but never finished go back on the queue
+    asyncio.create_task(text_streamer.resume(await asyncio.to_thread(job_store.resume)))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await worker_pool.stop()
+    await embedding_pipeline.stop()
+    await close_driver()
 
 # --- WEBSOCKET ENDPOINT ---
 @app.websocket("/ws/manuscript/{manuscript_id}")
@@ -93,7 +197,7 @@ async def websocket_endpoint(websocket: WebSocket, manuscript_id: str):
             
             # Send text to the Stream Processor (which handles chunking & queuing)
             # We default paragraph to 0 if not provided, but the chunker handles sub-indexing (0_1, 0_2...)
-            await text_streamer.add_to_stream(
+            plan = await text_streamer.add_to_stream(
                 websocket, 
                 data.get('text', ''), 
                 {
@@ -102,6 +206,14 @@ async def websocket_endpoint(websocket: WebSocket, manuscript_id: str):
                     "paragraph": data.get('paragraph', 0)
                 }
             )
+
+            # Chunks that vanished from the document lose their scenes (one batch)
+            if plan["retracted"]:
+                await graph_db.retract_scenes(manuscript_id, plan["retracted"])
+            # Unchanged chunks shifted by an edit keep their scenes; only offsets move
+            await graph_db.move_scenes(manuscript_id, plan["moved"])
+
+            await websocket.send_json({"type": "ingest_plan", **plan, "moved": len(plan["moved"])})
             
     except WebSocketDisconnect:
         print(f"Disconnected: {manuscript_id}")
@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+"""Create Neo4j constraints/indexes and record the schema version"""
+import asyncio
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from services.neo4j_driver import get_driver, close_driver
+from services.schema import apply_schema, current_version, print_report
+
+async def main():
+    driver = get_driver()
+    print(f"Current schema version: {await current_version(driver)}")
+    print_report(await apply_schema(driver))
+    print("✓ Schema is up to date")
+    await close_driver()
+
+asyncio.run(main())
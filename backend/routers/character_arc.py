@@ -1,10 +1,12 @@
-import os
-from typing import List, Dict, Any
-from fastapi import APIRouter, HTTPException
+import asyncio
+from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, HTTPException, Query, Request
 from pydantic import BaseModel
-from neo4j import GraphDatabase
-from textblob import TextBlob
 from dotenv import load_dotenv
+from services.alias_index import alias_registry, normalize_name
+from services.neo4j_driver import get_driver
+from services.response_cache import cached_response, manuscript_versions
+from services.sentiment import classify_arc, lexicons, score_scene, score_scenes, score_text, smooth
 
 load_dotenv()
 
@@ -26,122 +28,236 @@ class ArcResponse(BaseModel):
     data_points: List[CharacterPoint]
     overall_sentiment: str 
 
+class ArcsResponse(BaseModel):
+    manuscript_id: str
+    arcs: List[ArcResponse]
+    missing: List[str] = []  # Requested names with no matching character
+
+class LexiconUpdate(BaseModel):
+    negative: List[str] = []
+    positive: List[str] = []
+    extend: bool = True  # False replaces the default triggers instead of adding to them
+
 # -- 2. Neo4j Helper --
 class AnalyticsService:
-    def __init__(self):
-        uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-        user = os.getenv("NEO4J_USER", "neo4j")
-        password = os.getenv("NEO4J_PASSWORD", "password")
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
+    @property
+    def driver(self):
+        # Shared async driver, so the endpoint never blocks the event loop
+        return get_driver()
 
-    def close(self):
-        self.driver.close()
+    async def _name_keys(self, manuscript_id: str, names: List[str]) -> Dict[str, List[str]]:
+        """
+        Exact lookup keys per requested name: its normalized form, plus the canonical
+        character it is a known alias of.
+        """
+        index = await alias_registry.ensure_loaded(manuscript_id, self.driver)
+        keys = {}
+        for name in names:
+            key = normalize_name(name)
+            canonical = index.by_key.get(key)
+            keys[name] = list(dict.fromkeys([key] + ([normalize_name(canonical)] if canonical else [])))
+        return keys
 
-    def get_character_arc(self, manuscript_id: str, character_name: str) -> List[Dict]:
+    async def get_character_arcs(self, manuscript_id: str, names: Optional[List[str]] = None, fuzzy: bool = False) -> List[Dict]:
         """
-        Fetches character data sorted by sequence_index with raw text for sentiment analysis.
+        One query for the arcs of every character (or of the requested names), grouped by
+        character, with the precomputed scene sentiment in sequence_index order. Raw text
+        is only shipped for scenes written before sentiment was stored.
+
+        Names are matched exactly on the indexed name_key; fuzzy=True restores substring
+        matching (a scan of the manuscript's entities).
         """
-        query = """
-        MATCH (c:NarrativeEntity {manuscript_id: $mid})-[:APPEARS_IN]->(s:Scene)
-        WHERE c:Character AND toLower(c.name) CONTAINS toLower($name)
+        if names is None:
+            where, params = "", {}
+        elif fuzzy:
+            where = "AND any(n IN $names WHERE toLower(c.name) CONTAINS toLower(n))"
+            params = {"names": [n.replace("The ", "").strip() for n in names]}
+        else:
+            where = "AND c.name_key IN $keys"
+            params = {"keys": [k for keys in (await self._name_keys(manuscript_id, names)).values() for k in keys]}
+
+        query = f"""
+        MATCH (c:NarrativeEntity {{manuscript_id: $mid}})
+        WHERE c:Character {where}
+        MATCH (c)-[:APPEARS_IN]->(s:Scene)
+        WITH c, s ORDER BY s.sequence_index ASC
         RETURN 
-            s.sequence_index AS step,
-            s.description AS scene_desc,
-            s.raw_text AS raw_text,
+            c.name AS character,
+            c.name_key AS name_key,
             c.emotion AS emotion,
             c.goal AS goal,
-            c.archetype AS archetype
-        ORDER BY s.sequence_index ASC
+            c.archetype AS archetype,
+            collect({{
+                scene_id: s.id,
+                step: s.sequence_index,
+                scene_desc: s.description,
+                sentiment_score: s.sentiment_score,
+                raw_text: CASE WHEN s.sentiment_score IS NULL THEN s.raw_text END
+            }}) AS points
+        ORDER BY character
         """
         
-        with self.driver.session() as session:
-            # Clean the input name just in case
-            clean_name = character_name.replace("The ", "").strip()
-            result = session.run(query, name=clean_name, mid=manuscript_id)
-            return [record.data() for record in result]
+        async with self.driver.session() as session:
+            result = await session.run(query, mid=manuscript_id, **params)
+            return await result.data()
 
-service = AnalyticsService()
+    async def store_sentiment(self, scores: Dict[str, dict]):
+        """
+        Backfills sentiment for legacy scenes, so they are scored only once.
+        """
+        await self.write_sentiment([{"sid": sid, **score} for sid, score in scores.items()])
 
-# -- 3. The Endpoint --
-@router.get("/character-arc/{manuscript_id}/{character_name}", response_model=ArcResponse)
-async def get_character_arc(manuscript_id: str, character_name: str):
-    # Fetch Data
-    raw_data = service.get_character_arc(manuscript_id, character_name)
-    
-    if not raw_data:
-        raise HTTPException(status_code=404, detail=f"Character '{character_name}' not found in manuscript '{manuscript_id}'.")
+    async def write_sentiment(self, rows: List[Dict], batch_size: int = 1000):
+        async with self.driver.session() as session:
+            for i in range(0, len(rows), batch_size):
+                await session.run("""
+                    UNWIND $rows AS row
+                    MATCH (s:Scene {id: row.sid})
+                    SET s.sentiment_score = row.score,
+                        s.text_polarity = row.polarity,
+                        s.negative_hits = row.negative_hits,
+                        s.positive_hits = row.positive_hits,
+                        s.sentiment_hash = row.hash
+                """, rows=rows[i:i + batch_size])
 
-    processed_points = []
+    async def recompute_sentiment(self, manuscript_id: str) -> int:
+        """
+        Rescores every scene of a manuscript in one batch (e.g. after a lexicon change).
+        """
+        async with self.driver.session() as session:
+            result = await session.run("""
+                MATCH (s:Scene {manuscript_id: $mid})
+                RETURN s.id AS id, s.raw_text AS raw_text, s.description AS description
+            """, mid=manuscript_id)
+            scenes = await result.data()
+        lexicon = await lexicons.ensure_loaded(manuscript_id, self.driver)
+        rows = await asyncio.to_thread(score_scenes, scenes, lexicon)
+        await self.write_sentiment(rows)
+        async with self.driver.session() as session:
+            with manuscript_versions.writing(manuscript_id):
+                version = await session.execute_write(manuscript_versions.bump, manuscript_id)
+        manuscript_versions.committed(manuscript_id, version)  # Every arc may have changed
+        return len(rows)
+
+service = AnalyticsService()
+
+def build_arc(character: str, manuscript_id: str, rows: List[Dict], lexicon, backfill: Dict[str, dict]) -> ArcResponse:
+    """
+    Turns one character's scene rows into an arc. Legacy scenes without stored
+    sentiment are scored here and collected in backfill to be written back.
+    """
     scores = []
 
-    for idx, row in enumerate(raw_data):
-        # Handle Nulls safely
-        emotion_text = row.get("emotion") or "Neutral"
-        goal_text = row.get("goal") or "Unknown"
-        archetype_text = row.get("archetype") or "Unknown"
-        scene_desc = row.get("scene_desc") or "Scene details unavailable"
-        raw_text = row.get("raw_text") or ""  # Get actual paragraph text
-        
+    # 1. Stored sentiment per scene (scored when the scene was written)
+    for row in rows:
+        polarity = row.get("sentiment_score")
+        if polarity is None:
+            scored = backfill.get(row["scene_id"])
+            if scored is None:
+                # Scene predates stored sentiment: score it now (text, then description) and keep it
+                scored = score_scene(row.get("raw_text") or "", row.get("scene_desc"), lexicon)
+                if scored:
+                    backfill[row["scene_id"]] = scored
+            # Nothing to read: fall back to the emotion label
+            polarity = scored["score"] if scored else score_text(row.get("emotion") or "Neutral", lexicon)["score"]
+        scores.append(polarity)
+
+    # 2. Smoothing (Moving Average window of 3), as one array operation
+    smoothed_scores = smooth(scores)
+
+    processed_points = []
+    for idx, row in enumerate(rows):
         # Use the sequence index from DB, or fallback to loop index
         step_val = row.get("step")
         if step_val is None:
             step_val = idx + 1
 
-        # ANALYZE SENTIMENT FROM RAW PARAGRAPH TEXT FIRST, then scene_desc, then emotion
-        # This ensures the arc changes based on story content, not static emotion labels
-        if raw_text and raw_text.strip():
-            analysis_text = raw_text
-        elif scene_desc and scene_desc != "Scene details unavailable":
-            analysis_text = scene_desc
-        else:
-            analysis_text = emotion_text
-            
-        polarity = TextBlob(analysis_text).sentiment.polarity
-        
-        # 2. Heuristic Boost (Crucial for "Little Match Girl" type stories)
-        # TextBlob often misses context. We force it based on keywords.
-        text_lower = analysis_text.lower()
-        
-        negative_triggers = ["misery", "freezing", "frozen", "cold", "dead", "death", "pain", "sad", "despair", "fear", "anxious", "starving", "hungry", "dark", "alone", "weeping", "cry", "suffering", "struggle", "striving", "strived"]
-        positive_triggers = ["warm", "comfort", "happy", "peace", "love", "beautiful", "bright", "awed", "dream", "vision", "hope", "light", "celestial", "glory", "joy", "rejoiced"]
-
-        if any(x in text_lower for x in negative_triggers):
-            polarity = -0.8
-            
-        elif any(x in text_lower for x in positive_triggers):
-            polarity = 0.8
-            
-        scores.append(polarity)
-        
-        # 3. Smoothing (Moving Average window of 3)
-        window = scores[max(0, idx-2) : idx+1]
-        smoothed = sum(window) / len(window)
-
         processed_points.append(CharacterPoint(
             step=step_val,
-            sentiment_score=round(polarity, 2),
-            smoothed_score=round(smoothed, 2),
-            emotion=emotion_text,
-            goal=goal_text,
-            archetype=archetype_text,
-            scene_description=scene_desc
+            sentiment_score=round(scores[idx], 2),
+            smoothed_score=round(float(smoothed_scores[idx]), 2),
+            # Handle Nulls safely
+            emotion=row.get("emotion") or "Neutral",
+            goal=row.get("goal") or "Unknown",
+            archetype=row.get("archetype") or "Unknown",
+            scene_description=row.get("scene_desc") or "Scene details unavailable"
         ))
 
-    # Determine Overall Arc
-    if not scores:
-        arc_type = "Insufficient Data"
-    else:
-        start_score = scores[0]
-        end_score = scores[-1]
-        delta = end_score - start_score
-        
-        if delta > 0.4: arc_type = "Redemption / Rise"
-        elif delta < -0.4: arc_type = "Tragedy / Fall"
-        else: arc_type = "Steady / Flat"
-
+    # 3. Determine Overall Arc
     return ArcResponse(
-        character=character_name,
+        character=character,
         manuscript_id=manuscript_id,
         data_points=processed_points,
-        overall_sentiment=arc_type
-    )
\ No newline at end of file
+        overall_sentiment=classify_arc(scores)
+    )
+
+def _points(record: Dict) -> List[Dict]:
+    # Character-level fields are repeated on each point, as the chart expects
+    extra = {"emotion": record["emotion"], "goal": record["goal"], "archetype": record["archetype"]}
+    return [{**point, **extra} for point in record["points"]]
+
+# -- 3. The Endpoints --
+@router.get("/character-arc/{manuscript_id}/{character_name}", response_model=ArcResponse)
+async def get_character_arc(request: Request, manuscript_id: str, character_name: str, fuzzy: bool = False):
+    # Served from the response cache (or 304) until the manuscript changes
+    return await cached_response(
+        request, "character-arc", manuscript_id, {"name": character_name, "fuzzy": fuzzy},
+        lambda: _character_arc(manuscript_id, character_name, fuzzy),
+    )
+
+async def _character_arc(manuscript_id: str, character_name: str, fuzzy: bool) -> ArcResponse:
+    # Fetch Data (exact, index-backed; ?fuzzy=true for substring matching)
+    records = await service.get_character_arcs(manuscript_id, [character_name], fuzzy)
+    
+    if not records:
+        raise HTTPException(status_code=404, detail=f"Character '{character_name}' not found in manuscript '{manuscript_id}'.")
+
+    # A fuzzy name can match several characters: their scenes form one timeline, as before
+    rows = sorted((p for r in records for p in _points(r)), key=lambda p: (p["step"] is None, p["step"] or 0))
+
+    lexicon = await lexicons.ensure_loaded(manuscript_id, service.driver)
+    backfill = {}
+    arc = build_arc(character_name, manuscript_id, rows, lexicon, backfill)
+    if backfill:
+        await service.store_sentiment(backfill)
+    return arc
+
+@router.get("/character-arcs/{manuscript_id}", response_model=ArcsResponse)
+async def get_character_arcs(request: Request, manuscript_id: str, names: Optional[List[str]] = Query(None), fuzzy: bool = False):
+    """
+    Arcs of every character in the manuscript (or of ?names=...&names=...) from one query.
+    """
+    return await cached_response(
+        request, "character-arcs", manuscript_id, {"names": names, "fuzzy": fuzzy},
+        lambda: _character_arcs(manuscript_id, names, fuzzy),
+    )
+
+async def _character_arcs(manuscript_id: str, names: Optional[List[str]], fuzzy: bool) -> ArcsResponse:
+    records = await service.get_character_arcs(manuscript_id, names, fuzzy)
+    lexicon = await lexicons.ensure_loaded(manuscript_id, service.driver)
+
+    backfill = {}
+    arcs = [build_arc(r["character"], manuscript_id, _points(r), lexicon, backfill) for r in records]
+    if backfill:
+        await service.store_sentiment(backfill)
+
+    missing = []
+    if names and not fuzzy:
+        found = {r["name_key"] for r in records}
+        keys = await service._name_keys(manuscript_id, names)
+        missing = [name for name in names if not found.intersection(keys[name])]
+    elif names:
+        missing = [n for n in names if not any(n.replace("The ", "").strip().lower() in r["character"].lower() for r in records)]
+
+    return ArcsResponse(manuscript_id=manuscript_id, arcs=arcs, missing=missing)
+
+@router.put("/sentiment-lexicon/{manuscript_id}")
+async def set_sentiment_lexicon(manuscript_id: str, update: LexiconUpdate):
+    # Stored scores were computed with the old lexicon: rescore the manuscript in one batch
+    lexicon = await lexicons.set_lexicon(manuscript_id, update.negative, update.positive, update.extend, service.driver)
+    rescored = await service.recompute_sentiment(manuscript_id)
+    return {"manuscript_id": manuscript_id, "lexicon": lexicon.to_dict(), "rescored_scenes": rescored}
+
+@router.post("/sentiment/{manuscript_id}/recompute")
+async def recompute_sentiment(manuscript_id: str):
+    return {"manuscript_id": manuscript_id, "rescored_scenes": await service.recompute_sentiment(manuscript_id)}
\ No newline at end of file
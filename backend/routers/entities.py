@@ -0,0 +1,23 @@
+from typing import Dict
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from services.alias_index import alias_registry
+from services.graph_manager import graph_db
+
+router = APIRouter(prefix="/entities", tags=["entities"])
+
+class AliasTable(BaseModel):
+    aliases: Dict[str, str]  # {"Lord Bassanio": "Bassanio", "the Jew": "Shylock"}
+
+@router.get("/{manuscript_id}/aliases")
+async def get_aliases(manuscript_id: str):
+    # Canonical character names with every alias that has been merged into them
+    index = await alias_registry.ensure_loaded(manuscript_id, graph_db.driver)
+    return {"manuscript_id": manuscript_id, "characters": index.table()}
+
+@router.post("/{manuscript_id}/aliases")
+async def push_aliases(manuscript_id: str, table: AliasTable):
+    if any(not alias.strip() or not canonical.strip() for alias, canonical in table.aliases.items()):
+        raise HTTPException(status_code=422, detail="Aliases and canonical names must be non-empty")
+    index = await alias_registry.push_table(manuscript_id, table.aliases, graph_db.driver)
+    return {"manuscript_id": manuscript_id, "added": len(table.aliases), "characters": len(index)}
@@ -0,0 +1,45 @@
+import os
+import tempfile
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request
+from services.ingest_jobs import SPOOL_DIR, ingest_jobs
+
+router = APIRouter(prefix="/ingest", tags=["ingest"])
+
+# Largest accepted upload (bytes)
+INGEST_MAX_BYTES = int(os.getenv("INGEST_MAX_BYTES", str(200 * 1024 * 1024)))
+
+@router.post("/{manuscript_id}", status_code=202)
+async def ingest_manuscript(request: Request, manuscript_id: str, chapter: int = 1, paragraph: int = 0,
+                            filename: Optional[str] = None):
+    """
+    Streams the raw request body (UTF-8 text) to a spool file and starts a bulk
+    ingest job. Poll GET /ingest/jobs/{job_id} for progress.
+    """
+    SPOOL_DIR.mkdir(parents=True, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=".txt", dir=SPOOL_DIR)
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as spool:
+            async for data in request.stream():
+                size += len(data)
+                if size > INGEST_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Upload exceeds {INGEST_MAX_BYTES} bytes")
+                spool.write(data)
+    except BaseException:
+        os.unlink(path)
+        raise
+
+    job = ingest_jobs.start_file(manuscript_id, path, chapter, paragraph, source=filename or "upload", cleanup=True)
+    return job.to_dict()
+
+@router.get("/jobs")
+async def list_ingest_jobs(manuscript_id: Optional[str] = None):
+    return {"jobs": ingest_jobs.list(manuscript_id)}
+
+@router.get("/jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Ingest job '{job_id}' not found")
+    return job.to_dict()
@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from services.rag_service import rag_service
+from services.response_cache import cached_response
 
 router = APIRouter(prefix="/rag", tags=["rag"])
 
@@ -11,10 +12,18 @@ class QueryRequest(BaseModel):
 class QueryResponse(BaseModel):
     answer: str
 
+async def _answer(payload: QueryRequest) -> QueryResponse:
+    answer = await rag_service.answer_question(payload.manuscript_id, payload.question)
+    return QueryResponse(answer=answer)
+
 @router.post("/query", response_model=QueryResponse)
-async def ask_story(payload: QueryRequest):
+async def ask_story(request: Request, payload: QueryRequest):
     try:
-        answer = await rag_service.answer_question(payload.manuscript_id, payload.question)
-        return QueryResponse(answer=answer)
+        # The same question about an unchanged manuscript is answered from the cache, without an LLM call
+        question = " ".join(payload.question.split())
+        return await cached_response(
+            request, "rag-query", payload.manuscript_id, {"question": question},
+            lambda: _answer(payload), conditional=False,
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,44 @@
+from fastapi import APIRouter
+from services.embedding_pipeline import embedding_pipeline
+from services.extraction_cache import extraction_cache
+from services.job_store import job_store
+from services.rate_limiter import limiter
+from services.response_cache import response_cache
+from services.story_processor import processor as story_logic
+from services.timeline_digest import timeline_digests
+from services.vector_index import vector_indexes
+
+# Read-only counters of the caches, rate limiter and extraction/embedding pipelines
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+@router.get("/extraction-cache")
+async def get_extraction_cache_stats():
+    return extraction_cache.stats()
+
+@router.get("/rate-limiter")
+async def get_rate_limiter_stats():
+    return limiter.stats()
+
+@router.get("/timeline-digest")
+async def get_timeline_digest_stats():
+    return timeline_digests.stats()
+
+@router.get("/vector-index")
+async def get_vector_index_stats():
+    return vector_indexes.stats()
+
+@router.get("/embeddings")
+async def get_embedding_pipeline_stats():
+    return embedding_pipeline.stats()
+
+@router.get("/response-cache")
+async def get_response_cache_stats():
+    return response_cache.stats()
+
+@router.get("/extraction")
+async def get_extraction_stats():
+    return story_logic.extractor.stats()
+
+@router.get("/job-store")
+async def get_job_store_stats():
+    return job_store.stats()
@@ -0,0 +1,230 @@
+"""
+Per-manuscript alias resolution for character names.
+
+Each manuscript gets an AliasIndex over its known characters:
+- an exact map from a normalized key ("The Lord Bassanio's" -> "lord bassanio")
+- a token map over the names without their titles, so part of a name ("Smith",
+  "Match Girl") resolves when exactly one character carries it
+- a character-trigram index for near-misses ("Basanio"), checked against only the
+  few candidates that share trigrams with the query
+
+Titles stay in the key, and a character only ever carries one title: "Lord Bassanio"
+and "Bassanio" are one character whichever comes first, while "Mr. Smith" and
+"Mrs. Smith", "King Henry" and "Prince Henry" are never merged. Explicit alias tables
+can be pushed per manuscript. Indexes live in memory and are loaded lazily from the
+graph (character names, their recorded aliases and the manuscript's alias table), so
+resolution cost does not grow with the cast.
+"""
+import json
+import re
+from typing import Dict, List, Optional, Set, Tuple
+from .response_cache import manuscript_versions
+
+# Leading words that never identify a character
+ARTICLES = {"the", "a", "an"}
+
+# Leading words that are part of who a character is, but not of their name
+TITLES = {
+    "lord", "lady", "sir", "dame", "mr", "mrs", "ms", "miss", "dr",
+    "king", "queen", "prince", "princess", "duke", "duchess", "count", "countess",
+    "master", "mistress", "madam", "madame", "signior", "signor", "don", "father", "saint", "st",
+}
+
+_POSSESSIVE = re.compile(r"['’]s?\b")
+_NON_WORD = re.compile(r"[^\w\s-]")
+
+def normalize_name(name: str) -> str:
+    """
+    "The Lord Bassanio's" -> "lord bassanio". Only leading articles are stripped,
+    and never when they are the whole name ("The King" stays "king").
+    """
+    text = _NON_WORD.sub(" ", _POSSESSIVE.sub("", name.lower()))
+    tokens = text.split()
+    while len(tokens) > 1 and tokens[0] in ARTICLES:
+        tokens.pop(0)
+    return " ".join(tokens)
+
+def split_title(key: str) -> Tuple[str, str]:
+    """
+    "lord bassanio" -> ("lord", "bassanio"). A title that is the whole name stays the name.
+    """
+    tokens = key.split()
+    i = 0
+    while i < len(tokens) - 1 and tokens[i] in TITLES:
+        i += 1
+    return " ".join(tokens[:i]), " ".join(tokens[i:])
+
+def _trigrams(key: str) -> Set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AliasIndex:
+    FUZZY_THRESHOLD = 0.72  # Dice coefficient on character trigrams
+
+    def __init__(self):
+        self.by_key: Dict[str, str] = {}            # normalized key -> canonical name
+        self.by_token: Dict[str, Set[str]] = {}     # single token (titles excluded) -> normalized keys
+        self.by_trigram: Dict[str, Set[str]] = {}   # trigram -> normalized keys
+        self.keys: Dict[str, Set[str]] = {}         # canonical name -> normalized keys bound to it
+        self.aliases: Dict[str, List[str]] = {}     # canonical name -> raw names seen for it
+
+    def __len__(self):
+        return len(self.aliases)
+
+    def add(self, canonical: str, alias: str = None, override: bool = False):
+        """
+        Registers a canonical name (and optionally one more alias that maps to it).
+        With override, an alias already bound to another character is re-pointed.
+        """
+        self.aliases.setdefault(canonical, [])
+        self.keys.setdefault(canonical, set())
+        for name in (canonical, alias):
+            if not name:
+                continue
+            if name != canonical and name not in self.aliases[canonical]:
+                self.aliases[canonical].append(name)
+            key = normalize_name(name)
+            if not key or (key in self.by_key and not (override and name == alias)):
+                continue
+            if key in self.by_key:
+                self.keys[self.by_key[key]].discard(key)
+            self.by_key[key] = canonical
+            self.keys[canonical].add(key)
+            for token in split_title(key)[1].split():
+                self.by_token.setdefault(token, set()).add(key)
+            for gram in _trigrams(key):
+                self.by_trigram.setdefault(gram, set()).add(key)
+
+    def _compatible(self, canonical: str, title: str) -> bool:
+        # An untitled name fits anyone; a titled one only a character with no other title
+        return not title or all(split_title(key)[0] in ("", title) for key in self.keys[canonical])
+
+    @staticmethod
+    def _overlaps(query: str, known: str) -> bool:
+        # Both padded with spaces, so only whole words match
+        return query in known or (known.count(" ") > 2 and known in query)
+
+    def _unique_owner(self, keys, title: str) -> Optional[str]:
+        owners = {self.by_key[key] for key in keys}
+        owners = {owner for owner in owners if self._compatible(owner, title)}
+        return next(iter(owners)) if len(owners) == 1 else None
+
+    def lookup(self, raw_name: str) -> Optional[str]:
+        key = normalize_name(raw_name)
+        if not key:
+            return None
+
+        # 1. Exact normalized match
+        if key in self.by_key:
+            return self.by_key[key]
+
+        # 2. The name without its title, as whole words of exactly one character's
+        #    name ("Smith" -> "Mr. John Smith", "Match Girl" -> "Little Match Girl"),
+        #    or the other way round for known names of two words or more
+        title, bare = split_title(key)
+        padded = f" {bare} "
+        keys = set().union(*(self.by_token.get(token, set()) for token in bare.split()))
+        owner = self._unique_owner((k for k in keys if self._overlaps(padded, f" {split_title(k)[1]} ")), title)
+        if owner is not None:
+            return owner
+
+        # 3. Fuzzy: only keys sharing trigrams with the query are scored
+        grams = _trigrams(key)
+        shared: Dict[str, int] = {}
+        for gram in grams:
+            for candidate in self.by_trigram.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        best, best_score = None, self.FUZZY_THRESHOLD
+        for candidate, overlap in shared.items():
+            if not self._compatible(self.by_key[candidate], title):
+                continue
+            score = 2 * overlap / (len(grams) + len(_trigrams(candidate)))
+            if score >= best_score:
+                best, best_score = candidate, score
+        return self.by_key[best] if best else None
+
+    def resolve(self, raw_name: str) -> str:
+        """
+        Canonical name for raw_name; unknown names become new canonical entries.
+        """
+        name = raw_name.strip()
+        canonical = self.lookup(name)
+        if canonical is None:
+            canonical = name
+            self.add(canonical)
+        elif name != canonical:
+            self.add(canonical, name)
+        return canonical
+
+    def table(self) -> Dict[str, List[str]]:
+        return {name: list(aliases) for name, aliases in self.aliases.items()}
+
+
+class AliasRegistry:
+    def __init__(self):
+        self._indexes: Dict[str, AliasIndex] = {}
+
+    def index_for(self, manuscript_id: str) -> AliasIndex:
+        index = self._indexes.get(manuscript_id)
+        if index is None:
+            index = self._indexes[manuscript_id] = AliasIndex()
+        return index
+
+    def forget(self, manuscript_id: str):
+        # Reloaded from the graph on the next lookup
+        self._indexes.pop(manuscript_id, None)
+
+    async def ensure_loaded(self, manuscript_id: str, driver) -> AliasIndex:
+        """
+        Builds the manuscript's index from the graph the first time it is needed.
+        """
+        if manuscript_id in self._indexes:
+            return self._indexes[manuscript_id]
+
+        index = AliasIndex()
+        async with driver.session() as session:
+            result = await session.run("""
+                OPTIONAL MATCH (m:Manuscript {id: $mid})
+                OPTIONAL MATCH (c:Character {manuscript_id: $mid})
+                RETURN m.alias_table AS alias_table, collect([c.name, c.aliases]) AS characters
+            """, mid=manuscript_id)
+            record = await result.single()
+
+        if record:
+            for name, aliases in record["characters"]:
+                if not name:
+                    continue
+                index.add(name)
+                for alias in aliases or []:
+                    index.add(name, alias)
+            for alias, canonical in json.loads(record["alias_table"] or "{}").items():
+                index.add(canonical, alias, override=True)
+
+        # Another coroutine may have loaded it while we awaited
+        return self._indexes.setdefault(manuscript_id, index)
+
+    async def push_table(self, manuscript_id: str, table: Dict[str, str], driver) -> AliasIndex:
+        """
+        Merges an {alias: canonical} table into the index and persists it on the Manuscript.
+        """
+        index = await self.ensure_loaded(manuscript_id, driver)
+        for alias, canonical in table.items():
+            index.add(canonical, alias, override=True)
+
+        async with driver.session() as session:
+            with manuscript_versions.writing(manuscript_id):
+                version = await session.execute_write(self._save_table, manuscript_id, table)
+        manuscript_versions.committed(manuscript_id, version)  # Arc lookups by name now resolve differently
+        return index
+
+    @staticmethod
+    async def _save_table(tx, manuscript_id, table):
+        result = await tx.run("MERGE (m:Manuscript {id: $mid}) RETURN m.alias_table AS alias_table", mid=manuscript_id)
+        record = await result.single()
+        merged = json.loads(record["alias_table"] or "{}")
+        merged.update(table)
+        await tx.run("MATCH (m:Manuscript {id: $mid}) SET m.alias_table = $table", mid=manuscript_id, table=json.dumps(merged))
+        return await manuscript_versions.bump(tx, manuscript_id)
+
+alias_registry = AliasRegistry()
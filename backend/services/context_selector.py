@@ -0,0 +1,134 @@
+"""
+Picks which timeline scenes go into a RAG prompt.
+
+Timelines that fit the token budget are sent whole. Longer ones are scored per scene
+against the question:
+
+    score = KEYWORD_WEIGHT   * idf-weighted share of question terms found in the scene
+          + CHARACTER_WEIGHT * share of the named characters appearing in the scene
+          + RECENCY_WEIGHT   * position of the scene in the story (0 first .. 1 last)
+          + SEMANTIC_WEIGHT  * embedding similarity to the question (when provided)
+
+Scenes featuring a character named in the question are always included (in compact
+form once the budget is spent); the rest are packed best-first into what is left.
+The chosen scenes are emitted in story order.
+"""
+import math
+import os
+import re
+from typing import Dict, List, Set
+from .alias_index import TITLES, normalize_name
+from .timeline_digest import TimelineDigest, render_scene, timeline_header
+from .tokens import estimate_tokens
+
+_WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "if", "of", "to", "in", "on", "at", "by", "for",
+    "with", "from", "as", "is", "are", "was", "were", "be", "been", "do", "does", "did",
+    "what", "who", "whom", "why", "how", "when", "where", "which", "that", "this", "these",
+    "those", "it", "its", "he", "she", "they", "his", "her", "their", "them", "him", "about",
+    "scene", "story", "feeling", "goal", "there", "have", "has", "had", "not", "no", "so",
+}
+
+def terms(text: str) -> Set[str]:
+    words = _WORD.findall(text.lower())
+    # Crude plural folding is enough for overlap scoring ("matches" ~ "match")
+    return {w[:-1] if len(w) > 3 and w.endswith("s") else w for w in words if w not in STOPWORDS}
+
+
+class ContextSelector:
+    def __init__(self):
+        self.budget_tokens = int(os.getenv("RAG_CONTEXT_TOKENS", "3000"))
+        self.keyword_weight = float(os.getenv("RAG_KEYWORD_WEIGHT", "1.0"))
+        self.character_weight = float(os.getenv("RAG_CHARACTER_WEIGHT", "1.0"))
+        self.recency_weight = float(os.getenv("RAG_RECENCY_WEIGHT", "0.2"))
+        self.semantic_weight = float(os.getenv("RAG_SEMANTIC_WEIGHT", "1.0"))
+
+    @staticmethod
+    def _scene_terms(scene: dict) -> Set[str]:
+        # Cached on the entry; the digest replaces the entry when the scene changes
+        if "terms" not in scene:
+            scene["terms"] = terms(" ".join([scene["summary"] or "", *scene["events"], *scene["characters"]]))
+        return scene["terms"]
+
+    @staticmethod
+    def named_characters(question: str, scenes: List[dict]) -> Set[str]:
+        """
+        Characters mentioned in the question, by full name or any distinctive word of it.
+        """
+        question_words = set(_WORD.findall(question.lower()))
+        question_key = f" {normalize_name(question)} "
+        named = set()
+        for name in {n for scene in scenes for n in scene["names"]}:
+            key = normalize_name(name)
+            words = [w for w in key.split() if len(w) > 2 and w not in TITLES and w not in STOPWORDS]
+            if key and (f" {key} " in question_key or question_words.intersection(words)):
+                named.add(name)
+        return named
+
+    def fits(self, digest: TimelineDigest, budget_tokens: int = None) -> bool:
+        full_text = digest.text()
+        return not full_text or estimate_tokens(full_text) <= (budget_tokens or self.budget_tokens)
+
+    def select(self, digest: TimelineDigest, question: str, budget_tokens: int = None,
+               semantic: Dict[str, float] = None) -> str:
+        """
+        semantic optionally maps scene ids to their similarity with the question.
+        """
+        budget = budget_tokens or self.budget_tokens
+        if self.fits(digest, budget):
+            return digest.text()
+        semantic = semantic or {}
+
+        scenes = digest.ordered()
+        question_terms = terms(question)
+        named = self.named_characters(question, scenes)
+
+        # idf, so "Portia" counts for more than "said"
+        doc_freq: Dict[str, int] = {}
+        for scene in scenes:
+            for term in self._scene_terms(scene) & question_terms:
+                doc_freq[term] = doc_freq.get(term, 0) + 1
+        idf = {term: math.log(1 + len(scenes) / (1 + df)) for term, df in doc_freq.items()}
+        total_idf = sum(idf.values()) or 1.0
+
+        last = max(len(scenes) - 1, 1)
+        scored = []
+        for position, scene in enumerate(scenes):
+            keyword = sum(idf[t] for t in self._scene_terms(scene) & question_terms if t in idf) / total_idf
+            character = len(named.intersection(scene["names"])) / len(named) if named else 0.0
+            score = (self.keyword_weight * keyword
+                     + self.character_weight * character
+                     + self.recency_weight * position / last
+                     + self.semantic_weight * max(semantic.get(scene["id"], 0.0), 0.0))
+            scored.append((score, position, scene, bool(named.intersection(scene["names"]))))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+
+        # 1. Scenes of named characters are always in; compact once the budget is spent
+        remaining = budget - estimate_tokens(timeline_header(digest.manuscript_id))
+        chosen: Dict[int, str] = {}
+        for score, position, scene, mandatory in scored:
+            if mandatory:
+                block = render_scene(scene)
+                if estimate_tokens(block) > remaining:
+                    block = render_scene(scene, compact=True)
+                chosen[position] = block
+                remaining -= estimate_tokens(block)
+
+        # 2. Everything else best-first while it fits
+        for score, position, scene, mandatory in scored:
+            if remaining <= 0:
+                break
+            if mandatory:
+                continue
+            block = render_scene(scene)
+            cost = estimate_tokens(block)
+            if cost <= remaining:
+                chosen[position] = block
+                remaining -= cost
+
+        omitted = len(scenes) - len(chosen)
+        note = f"({omitted} less relevant scenes omitted)\n\n" if omitted else ""
+        return timeline_header(digest.manuscript_id) + note + "".join(chosen[p] for p in sorted(chosen))
+
+context_selector = ContextSelector()
@@ -1,22 +1,22 @@
 import os
 from langchain_groq import ChatGroq
-from services.graph_manager import KnowledgeGraphManager
+from services.graph_manager import graph_db
+from services.rate_limiter import limiter
+from services.tokens import estimate_tokens
 
 class CreativeAssistant:
     def __init__(self):
         # 1. Reasoning engine for creative writing
+        self.model_name = "llama-3.1-70b-versatile"
         self.llm = ChatGroq(
             temperature=0.7,  # Higher temperature for more creative/varied prose
-            model_name="llama-3.1-70b-versatile",
-            groq_api_key=os.getenv("GROQ_API_KEY")
+            model_name=self.model_name,
+            groq_api_key=os.getenv("GROQ_API_KEY"),
+            max_retries=0  # 429s are retried by the shared rate limiter
         )
         
         # 2. Access to the graph history
-        self.graph_manager = KnowledgeGraphManager(
-            os.getenv('NEO4J_URI'),
-            os.getenv('NEO4J_USER'),
-            os.getenv('NEO4J_PASSWORD')
-        )
+        self.graph_manager = graph_db  # Shares the process-wide async driver
     
     async def suggest_next_scene(self, manuscript_id: str, context: dict):
         """Generates scene suggestions based on current graph state."""
@@ -35,7 +35,7 @@ class CreativeAssistant:
         Focus on sensory details and character tension.
         """
         
-        response = await self.llm.ainvoke(prompt)
+        response = await self._ask(prompt)
         return response.content
 
     async def generate_dialogue(self, character_name: str, situation: str):
@@ -55,9 +55,12 @@ class CreativeAssistant:
         Write 3-4 lines of dialogue. Maintain the character's vocabulary and rhythm.
         """
         
-        response = await self.llm.ainvoke(prompt)
+        response = await self._ask(prompt)
         return response.content
     
+    async def _ask(self, prompt: str):
+        return await limiter.acall(self.model_name, lambda: self.llm.ainvoke(prompt), tokens=estimate_tokens(prompt) + 500)
+
     async def _get_character_voice(self, character_name: str):
         """Retrieves past dialogue snippets from the Knowledge Graph."""
         async with self.graph_manager.driver.session() as session:
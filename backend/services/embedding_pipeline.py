@@ -0,0 +1,191 @@
+"""
+Ingest-side embedding stage.
+
+Saved scenes are queued here instead of being embedded inline by the extraction
+worker. A background task drains the queue into micro-batches (up to
+EMBEDDING_BATCH_SIZE texts, or whatever arrived within EMBEDDING_BATCH_WAIT_MS),
+looks every text up in an LRU cache keyed by its hash, and encodes only the misses
+in ONE call to a worker process, so the model never competes with the event loop.
+The vectors are then appended to the manuscript's vector index, which stays warm:
+a question only has to embed itself.
+
+Drops (retracted scenes) go through the same queue, so a scene retracted while its
+embedding is still pending cannot reappear in the index.
+"""
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .vector_index import vector_indexes
+
+# --- Worker process side ---
+_model = None
+
+def _load_model(model_name: str):
+    global _model
+    from sentence_transformers import SentenceTransformer
+    _model = SentenceTransformer(model_name)
+
+def _encode(texts: List[str]) -> np.ndarray:
+    return _model.encode(texts, batch_size=len(texts), convert_to_numpy=True, normalize_embeddings=True).astype(np.float32)
+
+
+class EmbeddingPipeline:
+    def __init__(self, registry=vector_indexes):
+        self.registry = registry
+        self.batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+        self.batch_wait = int(os.getenv("EMBEDDING_BATCH_WAIT_MS", "50")) / 1000
+        self.cache_size = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=int(os.getenv("EMBEDDING_QUEUE_SIZE", "1000")))
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.batches = 0
+        self.texts = 0
+        self.cache_hits = 0
+        self.encode_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        if self._task:
+            return
+        # spawn: a forked copy of the server (and its event loop) is not a safe place for torch
+        self._executor = ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_load_model, initargs=(self.registry.model,)
+        )
+        self._task = asyncio.create_task(self._run())
+        print(f"🧮 Embedding pipeline online (batches of {self.batch_size})")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def submit(self, manuscript_id: str, scene: dict, raw_text: str):
+        """
+        Queues a saved scene for embedding (inline when the pipeline is not running,
+        e.g. in scripts).
+        """
+        if not self.running:
+            await self.registry.index_scene(manuscript_id, scene, raw_text)
+            return
+        await self.queue.put(("add", manuscript_id, scene, raw_text))
+
+    async def drop_scenes(self, manuscript_id: str, scene_ids: List[str]):
+        if not self.running:
+            await self.registry.drop_scenes(manuscript_id, scene_ids)
+            return
+        await self.queue.put(("drop", manuscript_id, scene_ids, None))
+
+    async def _next_batch(self) -> list:
+        ops = [await self.queue.get()]
+        texts = len(ops[0][2]["events"]) + 1 if ops[0][0] == "add" else 0
+        deadline = time.monotonic() + self.batch_wait
+        while texts < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                op = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            ops.append(op)
+            texts += len(op[2]["events"]) + 1 if op[0] == "add" else 0
+        return ops
+
+    async def _run(self):
+        while True:
+            ops = await self._next_batch()
+            try:
+                # Adds are embedded together; a drop waits for the adds queued before it
+                adds = []
+                for op in ops:
+                    if op[0] == "add":
+                        adds.append(op)
+                        continue
+                    await self._flush(adds)
+                    adds = []
+                    await self.registry.drop_scenes(op[1], op[2])
+                await self._flush(adds)
+            except Exception as e:
+                print(f"⚠️ Embedding batch failed: {e}")
+            finally:
+                for _ in ops:
+                    self.queue.task_done()
+
+    @staticmethod
+    def _key(model: str, text: str) -> str:
+        return hashlib.sha1(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+    async def _flush(self, adds: list):
+        if not adds:
+            return
+        scenes = [(mid, scene, self.registry.scene_items(scene, raw_text)) for _, mid, scene, raw_text in adds]
+
+        # 1. Cache lookups by text hash (repeated events, re-sent unchanged text...)
+        vectors: Dict[str, np.ndarray] = {}
+        misses: Dict[str, str] = {}
+        for _, _, items in scenes:
+            for item in items:
+                key = self._key(self.registry.model, item["text"])
+                if key in vectors or key in misses:
+                    continue
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    vectors[key] = cached
+                    self.cache_hits += 1
+                else:
+                    misses[key] = item["text"]
+
+        # 2. One encode call in the worker process for everything new
+        if misses:
+            start = time.perf_counter()
+            encoded = await asyncio.get_running_loop().run_in_executor(self._executor, _encode, list(misses.values()))
+            self.encode_seconds += time.perf_counter() - start
+            for key, vector in zip(misses, encoded):
+                vectors[key] = vector
+                self._cache[key] = vector
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        self.batches += 1
+        self.texts += sum(len(items) for _, _, items in scenes)
+
+        # 3. Append to the vector indexes (file I/O, off the loop)
+        for mid, scene, items in scenes:
+            if items:
+                matrix = np.stack([vectors[self._key(self.registry.model, item["text"])] for item in items])
+                await asyncio.to_thread(self.registry.index_for(mid).add_scene, scene["scene_id"], items, matrix)
+
+    def stats(self) -> dict:
+        lookups = self.texts
+        return {
+            "running": self.running,
+            "queued": self.queue.qsize(),
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch": round(self.texts / self.batches, 1) if self.batches else 0.0,
+            "cache_hits": self.cache_hits,
+            "cache_hit_rate": round(self.cache_hits / lookups, 3) if lookups else 0.0,
+            "cache_entries": len(self._cache),
+            "encode_seconds": round(self.encode_seconds, 3),
+        }
+
+embedding_pipeline = EmbeddingPipeline()
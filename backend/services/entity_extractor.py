@@ -1,84 +1,17 @@
 import os
-import json
-import re
 from typing import List, TypedDict, Annotated, Dict, Any
-from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
 from langgraph.graph import StateGraph, END
 from dotenv import load_dotenv
+from .json_repair import parse_llm_json
+from .rate_limiter import limiter
+from .stream_parser import IncrementalEntityParser
+from .tokens import count_tokens, estimate_tokens, token_counter
 
 load_dotenv()
 
-class GraphState(TypedDict):
-    text: str
-    metadata: Dict[str, Any]
-    entities: Annotated[Dict[str, Any], lambda old, new: new]
-    active_characters: List[str]
-
-class EntityExtractor:
-    def __init__(self):
-        self.llm = ChatGroq(
-            temperature=0.1, 
-            model_name="llama-3.1-8b-instant", 
-            groq_api_key=os.getenv("GROQ_API_KEY"),
-            max_tokens=4000 
-        )
-        self.workflow = self._build_workflow()
-
-    def _sanitize_json_output(self, text: str) -> str:
-        """
-        Attempts to fix common JSON errors made by LLMs.
-        """
-        # 1. Strip Markdown code blocks
-        text = re.sub(r'```json\s*', '', text)
-        text = re.sub(r'```', '', text)
-        
-        # 2. Fix single quotes used as JSON delimiters (risky but necessary for some models)
-        # This regex looks for 'key': 'value' patterns and tries to double-quote them
-        # It's better to rely on the prompt, but this helps in edge cases.
-        
-        return text.strip()
-
-    def _surgical_json_parser(self, text: str):
-        text = self._sanitize_json_output(text)
-        
-        # Find start and end of JSON object
-        start_idx = text.find('{')
-        if start_idx == -1: return None
-        
-        balance = 0
-        in_string = False
-        escape = False
-        
-        for i in range(start_idx, len(text)):
-            char = text[i]
-            if char == '"' and not escape: in_string = not in_string
-            if char == '\\' and not escape: escape = True
-            else: escape = False
-            
-            if not in_string:
-                if char == '{': balance += 1
-                elif char == '}': 
-                    balance -= 1
-                    if balance == 0:
-                        json_str = text[start_idx : i + 1]
-                        try:
-                            return json.loads(json_str)
-                        except json.JSONDecodeError:
-                            # If standard parsing fails, try "dirty" fixes
-                            # Fix 1: Add quotes to unquoted keys
-                            fixed_str = re.sub(r'(?<!")(\b\w+\b)(?=\s*:)', r'"\1"', json_str)
-                            try:
-                                return json.loads(fixed_str)
-                            except:
-                                continue # Keep searching if this chunk failed
-        return None
-
-    def _extract_entities_node(self, state: GraphState):
-        safe_text = state["text"][:6000]
-        
-        # --- PROMPT UPDATED FOR ROBUSTNESS ---
-        prompt = ChatPromptTemplate.from_template("""
+# --- PROMPT UPDATED FOR ROBUSTNESS ---
+EXTRACTION_TEMPLATE = """
             You are a strict JSON data extractor.
             
             TASK: Extract a Knowledge Graph from the text below.
@@ -113,28 +46,145 @@ class EntityExtractor:
             
             TEXT TO ANALYZE:
             {text}
-        """)
-        
-        try:
-            response = self.llm.invoke(prompt.format(
-                text=safe_text, 
-                active_characters=state["active_characters"]
-            ))
+        """
+
+# Packed variant: several labelled chunks, one result object per label
+BATCH_EXTRACTION_TEMPLATE = """
+            You are a strict JSON data extractor.
+            
+            TASK: Extract a Knowledge Graph from EACH labelled text chunk below, independently.
             
-            extracted = self._surgical_json_parser(response.content)
+            STRICT FORMATTING RULES:
+            1. Output MUST be valid JSON.
+            2. Use DOUBLE QUOTES for all keys and string values. (e.g. "key": "value").
+            3. Do NOT use single quotes.
+            4. Do NOT include comments // in the JSON.
+            5. Output one entry per chunk label: {labels}.
+            
+            CONTENT RULES (Zero-Knowledge):
+            1. **No Pronouns:** If text says "She", resolve it to the character name (e.g., "Little Match Girl").
+            2. **Emotions:** Infer emotion ONLY from that chunk's own text. 
+               - Cold/Hungry/Pain -> "Miserable"
+               - Vision/Food/Warmth -> "Joyful"
+            3. **Merge Names:** Use "Little Match Girl" for "child", "girl", "youngster".
+
+            JSON STRUCTURE:
+            {{
+                "chunks": {{
+                    "<chunk label>": {{
+                        "characters": [ {{ "text": "Name", "archetype": "Role", "emotion": "Adjective", "goal": "Objective" }} ],
+                        "locations": [ {{ "text": "Place Name", "type": "Setting" }} ],
+                        "events": [ {{ "text": "Event summary", "significance": "Medium" }} ],
+                        "relationships": []
+                    }}
+                }}
+            }}
+            
+            TEXT CHUNKS TO ANALYZE:
+            {sections}
+        """
+
+class GraphState(TypedDict):
+    text: str
+    metadata: Dict[str, Any]
+    entities: Annotated[Dict[str, Any], lambda old, new: new]
+    active_characters: List[str]
+
+class EntityExtractor:
+    # Bump whenever the extraction prompt changes, so cached results are not reused
+    PROMPT_VERSION = "1"
+    # Expected completion size per chunk, reserved against the tokens-per-minute budget
+    OUTPUT_TOKENS = 400
+    # Tokens per extraction call (prompt + chunk + expected output) in token-budget chunking
+    CALL_TOKENS = int(os.getenv("EXTRACTION_CALL_TOKENS", "3000"))
+
+    def __init__(self, llm=None):
+        self.model_name = "llama-3.1-8b-instant"
+        if llm is None:
+            # Imported here so tests and benchmarks can pass a stub LLM without the Groq client
+            from langchain_groq import ChatGroq
+            llm = ChatGroq(
+                temperature=0.1, 
+                model_name=self.model_name, 
+                groq_api_key=os.getenv("GROQ_API_KEY"),
+                max_tokens=4000,
+                max_retries=0  # 429s are retried by the shared rate limiter
+            )
+        self.llm = llm
+
+        # Templates are parsed once here, not on every chunk
+        self.prompt = ChatPromptTemplate.from_template(EXTRACTION_TEMPLATE)
+        self.batch_prompt = ChatPromptTemplate.from_template(BATCH_EXTRACTION_TEMPLATE)
+
+        self.workflow = self._build_workflow()
+
+        # manuscript_id -> requests, chunks and prompt/completion tokens sent to the model
+        self.usage: Dict[str, Dict[str, int]] = {}
+
+    def input_budget(self) -> int:
+        """
+        Chunk tokens that fit one call once the prompt template and the expected
+        output are paid for (the token_budget for token-budget chunking).
+        """
+        overhead = count_tokens(self._format_prompt("", [])) + self.OUTPUT_TOKENS
+        return max(self.CALL_TOKENS - overhead, 100)
+
+    def _record_usage(self, manuscript_id: str, prompt_text: str, chunks: int, usage: dict = None):
+        # usage is the model's own count (usage_metadata) when the response has one
+        usage = usage or {}
+        prompt_tokens = usage.get("input_tokens") or count_tokens(prompt_text)
+        token_counter.observe(len(prompt_text), usage.get("input_tokens"))
+
+        entry = self.usage.setdefault(manuscript_id or "default", {
+            "requests": 0, "chunks": 0, "prompt_tokens": 0, "completion_tokens": 0,
+        })
+        entry["requests"] += 1
+        entry["chunks"] += chunks
+        entry["prompt_tokens"] += prompt_tokens
+        entry["completion_tokens"] += usage.get("output_tokens") or 0
+
+    def stats(self) -> dict:
+        manuscripts = {}
+        for mid, u in self.usage.items():
+            total = u["prompt_tokens"] + u["completion_tokens"]
+            manuscripts[mid] = {
+                **u,
+                "chunks_per_request": round(u["chunks"] / u["requests"], 2),
+                "tokens_per_request": round(total / u["requests"], 1),
+                # Share of the per-call budget actually used (token-budget chunking targets 1.0)
+                "budget_used": round(total / u["requests"] / self.CALL_TOKENS, 3),
+            }
+        return {
+            "model": self.model_name,
+            "call_tokens": self.CALL_TOKENS,
+            "input_budget": self.input_budget(),
+            "tokens": token_counter.stats(),
+            "manuscripts": manuscripts,
+        }
+
+    def _format_prompt(self, text: str, active_characters: list) -> str:
+        return self.prompt.format(text=text, active_characters=active_characters)
+
+    def _parse_response(self, content: str) -> dict:
+        # One tolerant pass: fences, unquoted keys, trailing commas, truncation...
+        extracted = parse_llm_json(content).value
+        if not isinstance(extracted, dict):
+            raise ValueError("No JSON found")
+        return extracted
+
+    async def _extract_entities_node(self, state: GraphState):
+        # No truncation: chunks are bounded by the chunker (split, never cut)
+        try:
+            prompt_text = self._format_prompt(state["text"], state["active_characters"])
+            # Native async call: the event loop keeps serving sockets during the round trip
+            response = await limiter.acall(
+                self.model_name,
+                lambda: self.llm.ainvoke(prompt_text),
+                tokens=estimate_tokens(prompt_text) + self.OUTPUT_TOKENS
+            )
+            self._record_usage(state["metadata"].get("manuscript_id"), prompt_text, 1, getattr(response, "usage_metadata", None))
             
-            if not extracted:
-                # Last ditch effort: regex find
-                json_match = re.search(r'\{.*\}', response.content, re.DOTALL)
-                if json_match:
-                    try:
-                        extracted = json.loads(json_match.group())
-                    except:
-                        # Attempt to fix unquoted keys in regex match
-                        fixed_str = re.sub(r'(?<!")(\b\w+\b)(?=\s*:)', r'"\1"', json_match.group())
-                        extracted = json.loads(fixed_str)
-                else:
-                    raise ValueError("No JSON found")
+            extracted = self._parse_response(response.content)
             
             new_chars = [c.get('text') for c in extracted.get('characters', [])]
             updated_memory = list(set(state["active_characters"] + new_chars))[-15:] 
@@ -150,6 +200,82 @@ class EntityExtractor:
                 "active_characters": state["active_characters"]
             }
 
+    async def extract_streaming(self, text: str, metadata: dict, context: list = None, on_entity=None):
+        """
+        Same extraction, but streams the completion and awaits on_entity(kind, entity)
+        for every entity as soon as its JSON object closes. Returns the full result.
+        """
+        prompt_text = self._format_prompt(text, context or [])
+        pushed = set()  # A retried stream (after a 429) must not push entities twice
+        usage = {}
+
+        async def consume():
+            parser = IncrementalEntityParser()
+            pieces = []
+            async for chunk in self.llm.astream(prompt_text):
+                pieces.append(chunk.content)
+                if getattr(chunk, "usage_metadata", None):
+                    usage.update(chunk.usage_metadata)  # Sent with the last chunk, if at all
+                for kind, entity in parser.feed(chunk.content):
+                    key = (kind, entity.get("text"))
+                    if on_entity and key not in pushed:
+                        pushed.add(key)
+                        await on_entity(kind, entity)
+            return "".join(pieces)
+
+        try:
+            content = await limiter.acall(
+                self.model_name, consume,
+                tokens=estimate_tokens(prompt_text) + self.OUTPUT_TOKENS
+            )
+            self._record_usage(metadata.get("manuscript_id"), prompt_text, 1, usage)
+            return self._parse_response(content)
+        except Exception as e:
+            print(f"⚠️ Extraction Skipped: {e}")
+            return {"characters": [], "locations": [], "relationships": []}
+
+    def _build_batch_prompt(self, labelled_chunks: List[tuple]) -> str:
+        return self.batch_prompt.format(
+            labels=", ".join(f'"{label}"' for label, _ in labelled_chunks),
+            sections="\n\n".join(f"[CHUNK {label}]\n{text}" for label, text in labelled_chunks)
+        )
+
+    async def extract_batch(self, chunks: List[tuple], context: list = None, manuscript_id: str = None) -> Dict[str, Any]:
+        """
+        Packs several (chunk_id, text) pairs into ONE LLM call and splits the result back
+        out per chunk. Chunks missing from an unparseable/partial response fall back to
+        individual extract() calls, so every chunk id gets an entry.
+        """
+        labels = {f"c{i}": chunk_id for i, (chunk_id, _) in enumerate(chunks)}
+        texts = {chunk_id: text for chunk_id, text in chunks}
+        results: Dict[str, Any] = {}
+
+        try:
+            prompt_text = self._build_batch_prompt(
+                [(label, texts[chunk_id]) for label, chunk_id in labels.items()]
+            )
+            response = await limiter.acall(
+                self.model_name,
+                lambda: self.llm.ainvoke(prompt_text),
+                tokens=estimate_tokens(prompt_text) + self.OUTPUT_TOKENS * len(chunks)
+            )
+            self._record_usage(manuscript_id, prompt_text, len(chunks), getattr(response, "usage_metadata", None))
+            packed = (parse_llm_json(response.content).value or {}).get("chunks", {})
+            for label, chunk_id in labels.items():
+                entities = packed.get(label)
+                if isinstance(entities, dict):
+                    results[chunk_id] = entities
+        except Exception as e:
+            print(f"⚠️ Packed extraction failed: {e}")
+
+        missing = [chunk_id for chunk_id in texts if chunk_id not in results]
+        if missing:
+            print(f"↩️ Packed response missing {len(missing)}/{len(chunks)} chunks, extracting them one by one")
+        for chunk_id in missing:
+            results[chunk_id] = await self.extract(texts[chunk_id], {"manuscript_id": manuscript_id}, context)
+
+        return results
+
     def _build_workflow(self):
         builder = StateGraph(GraphState)
         builder.add_node("extract", self._extract_entities_node)
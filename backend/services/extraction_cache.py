@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+DEFAULT_PATH = Path(__file__).resolve().parent.parent / ".cache" / "extraction_cache.sqlite3"
+
+class ExtractionCache:
+    """
+    Persistent, content-addressed cache of EntityExtractor results.
+
+    Key = sha256(model name + prompt version + chunk text), so a re-uploaded or
+    unchanged paragraph never pays for a second LLM call. Entries are evicted
+    least-recently-used first once the stored bytes exceed the size cap.
+    """
+
+    def __init__(self, path: str = None, max_bytes: int = None):
+        self.path = Path(path or os.getenv("EXTRACTION_CACHE_PATH", DEFAULT_PATH))
+        self.max_bytes = max_bytes or int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Called from executor threads, so guard the single connection with a lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS extractions (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                tokens INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS extractions_lru ON extractions (last_used)")
+        self._conn.commit()
+
+        self.bytes_held = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+
+    @staticmethod
+    def make_key(text: str, model_name: str, prompt_version: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{prompt_version}\0{text}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT value, tokens FROM extractions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE extractions SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            self.tokens_saved += row[1]
+            return json.loads(row[0])
+
+    def put(self, key: str, entities: Dict[str, Any], tokens: int = 0):
+        value = json.dumps(entities)
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM extractions WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extractions (key, value, size, tokens, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, tokens, time.time()),
+            )
+            self.bytes_held += size - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # Drop least-recently-used entries until we are back under the cap
+        while self.bytes_held > self.max_bytes:
+            rows = self._conn.execute("SELECT key, size FROM extractions ORDER BY last_used ASC LIMIT 64").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self.bytes_held <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM extractions WHERE key = ?", (key,))
+                self.bytes_held -= size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes_held": self.bytes_held,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "llm_calls_saved": self.hits,
+            "tokens_saved_estimate": self.tokens_saved,
+        }
+
+extraction_cache = ExtractionCache()
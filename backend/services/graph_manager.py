@@ -1,13 +1,13 @@
-import os
-import re
-from neo4j import GraphDatabase
+import asyncio
+from .alias_index import alias_registry, normalize_name
+from .neo4j_driver import get_driver
+from .sentiment import lexicons, score_scene
+from .timeline_digest import character_state, timeline_digests
+from .embedding_pipeline import embedding_pipeline
+from .response_cache import manuscript_versions
 
 class GraphManager:
     def __init__(self):
-        uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-        user = os.getenv("NEO4J_USER", "neo4j")
-        password = os.getenv("NEO4J_PASSWORD", "password")
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
         
         # PROHIBITED NAMES: If the AI outputs these, we SKIP creating the node.
         self.PRONOUN_BLACKLIST = {
@@ -15,115 +15,235 @@ class GraphManager:
             "man", "woman", "person", "someone", "nobody"
         }
 
-    def save_extracted_entities(self, entities: dict, metadata: dict):
-        with self.driver.session() as session:
-            session.execute_write(self._save_transaction, entities, metadata)
+    @property
+    def driver(self):
+        # Shared async driver (one pool for every service)
+        return get_driver()
 
-    def _resolve_name(self, raw_name: str) -> str:
+    async def save_extracted_entities(self, entities: dict, metadata: dict):
+        # Alias index is built from the graph on the manuscript's first write
+        await alias_registry.ensure_loaded(metadata.get("manuscript_id"), self.driver)
+        # Sentiment is scored once here (off the loop) so arc charts only read numbers.
+        # Unchanged chunks never reach this point, so it only runs when the text changed.
+        if "sentiment" not in metadata:
+            lexicon = await lexicons.ensure_loaded(metadata.get("manuscript_id"), self.driver)
+            metadata = {**metadata, "sentiment": await asyncio.to_thread(
+                score_scene, metadata.get("raw_text", ""), self._first_event(entities), lexicon)}
+        async with self.driver.session() as session:
+            with manuscript_versions.writing(metadata.get("manuscript_id")):
+                scene, version = await session.execute_write(self._save_transaction, entities, metadata)
+        # Committed: cached analytics/RAG responses are now stale; keep the in-memory
+        # timeline (if loaded) in step with the graph
+        manuscript_versions.committed(scene["manuscript_id"], version)
+        timeline_digests.record_scene(**scene)
+        return scene
+
+    def _resolve_name(self, raw_name: str, manuscript_id: str) -> str:
         """
-        Master cleaning function to merge duplicates.
+        Master cleaning function to merge duplicates, backed by the manuscript's alias index.
         """
         if not raw_name: return None
         
-        # 1. Basic Cleaning
-        name = raw_name.strip()
-        # Remove "The" prefix (case insensitive)
-        name = re.sub(r'^(The|the|A|a|An|an)\s+', '', name)
-        
-        # 2. Check Blacklist (Case insensitive)
-        if name.lower() in self.PRONOUN_BLACKLIST:
+        # 1. Check Blacklist (articles and possessives are ignored)
+        if normalize_name(raw_name) in self.PRONOUN_BLACKLIST:
             return None # Reject this node entirely
 
-        # 3. Canonical Mapping (Force variations to one master name)
-        # You can expand this dictionary as needed.
-        aliases = {
-            "little girl": "Little Match Girl",
-            "girl": "Little Match Girl",
-            "child": "Little Match Girl",
-            "youngster": "Little Match Girl",
-            "match girl": "Little Match Girl",
-            "poor little girl": "Little Match Girl",
-            "grandmother": "Grandmother",
-            "old grandmother": "Grandmother",
-            "grandma": "Grandmother"
-        }
-        
-        # Normalize to lower case for lookup, but return Title Case
-        lookup = name.lower()
-        if lookup in aliases:
-            return aliases[lookup]
+        # 2. Canonical name: exact/token match, then fuzzy trigram match, else a new character
+        return alias_registry.index_for(manuscript_id).resolve(raw_name)
+
+    @staticmethod
+    def _first_event(entities: dict):
+        events = [evt.get('text') for evt in entities.get("events", []) if evt.get('text')]
+        return events[0] if events else None
+
+    def _build_rows(self, entities: dict, manuscript_id: str = None):
+        """
+        Flattens the extracted entities into one parameter list per entity kind.
+        """
+        characters = []
+        for char in entities.get("characters", []):
+            raw_name = char.get('text')
+            final_name = self._resolve_name(raw_name, manuscript_id)
             
-        # 4. Fuzzy Fallback (e.g. if name is "Little Match Girl's Slipper")
-        if "match girl" in lookup: return "Little Match Girl"
-        
-        return name # Return original if no rules matched
+            # If name was blacklisted (returned None), SKIP IT.
+            if not final_name: continue 
+
+            characters.append({
+                "name": final_name,
+                "key": normalize_name(final_name),
+                "alias": raw_name.strip() if raw_name.strip() != final_name else None,
+                "arch": char.get('archetype', 'Unknown'),
+                "emo": char.get('emotion', 'Neutral'),
+                "goal": char.get('goal', 'Unknown')
+            })
+
+        locations = [
+            {"name": loc['text'], "key": normalize_name(loc['text']), "type": loc.get('type', 'Place')}
+            for loc in entities.get("locations", []) if loc.get('text')
+        ]
+
+        events = [{"desc": evt['text']} for evt in entities.get("events", []) if evt.get('text')]
+
+        return characters, locations, events
+
+    async def retract_scenes(self, manuscript_id: str, paragraph_ids: list):
+        """
+        Removes the scenes of deleted chunks (and their events) in one batch, then
+        drops entities of this manuscript that no longer appear in any scene.
+        """
+        if not paragraph_ids:
+            return
+        scene_ids = [f"{manuscript_id}_p{pid}" for pid in paragraph_ids]
+        async with self.driver.session() as session:
+            with manuscript_versions.writing(manuscript_id):
+                version = await session.execute_write(self._retract_transaction, manuscript_id, scene_ids)
+        manuscript_versions.committed(manuscript_id, version)
+        timeline_digests.drop_scenes(manuscript_id, scene_ids)
+        await embedding_pipeline.drop_scenes(manuscript_id, scene_ids)
+        print(f"🗑️ Retracted {len(scene_ids)} scenes from {manuscript_id}")
 
-    def _save_transaction(self, tx, entities, metadata):
+    async def move_scenes(self, manuscript_id: str, moved: list):
+        """
+        Updates the source offsets of unchanged chunks that an edit above them shifted
+        ([{"paragraph", "char_start", "char_end"}, ...]), in one statement.
+        """
+        if not moved:
+            return
+        rows = [{"sid": f"{manuscript_id}_p{m['paragraph']}", "start": m["char_start"], "end": m["char_end"]} for m in moved]
+        async with self.driver.session() as session:
+            await session.run("""
+                UNWIND $rows AS row
+                MATCH (s:Scene {id: row.sid})
+                SET s.char_start = row.start, s.char_end = row.end
+            """, rows=rows)
+
+    async def _retract_transaction(self, tx, mid, scene_ids):
+        await tx.run("""
+            UNWIND $sids AS sid
+            MATCH (s:Scene {id: sid})
+            OPTIONAL MATCH (s)-[:INCLUDES_EVENT]->(e:Event)
+            DETACH DELETE e, s
+        """, sids=scene_ids)
+        await tx.run("""
+            MATCH (n:NarrativeEntity {manuscript_id: $mid})
+            WHERE NOT (n)--(:Scene)
+            DETACH DELETE n
+        """, mid=mid)
+        return await manuscript_versions.bump(tx, mid)
+
+    async def _save_transaction(self, tx, entities, metadata):
+        """
+        Writes one scene in a fixed number of statements: the scene itself plus one
+        UNWIND per entity kind, regardless of how many entities the chunk has.
+        Returns the scene's timeline digest entry and the manuscript's new version.
+        """
         mid = metadata.get("manuscript_id")
         seq_index = metadata.get("chunk_index", 0) 
         para_id = metadata.get('paragraph') 
         scene_id = f"{mid}_p{para_id}"
+        # Chunk i of a paragraph follows chunk i-1 of the same paragraph ("0_3" after "0_2");
+        # chunk_index restarts at 0 for every paragraph, so it is not unique per manuscript
+        base_para = str(para_id).rpartition('_')[0]
+        prev_scene_id = f"{mid}_p{base_para}_{seq_index - 1}" if base_para and seq_index > 0 else None
         raw_text = metadata.get('raw_text', '')  # Store the actual paragraph text
+        sentiment = metadata["sentiment"] if "sentiment" in metadata else score_scene(raw_text, self._first_event(entities))
+
+        characters, locations, events = self._build_rows(entities, mid)
+
+        # 0. REVISED CHUNK: drop the links/events extracted from the previous text
+        if metadata.get('is_revision'):
+            await tx.run("""
+                MATCH (s:Scene {id: $sid})
+                OPTIONAL MATCH (s)-[:INCLUDES_EVENT]->(e:Event)
+                DETACH DELETE e
+                WITH DISTINCT s
+                OPTIONAL MATCH (s)-[r:APPEARS_IN|SETTING_IS]-()
+                DELETE r
+            """, sid=scene_id)
 
-        # 1. CREATE SCENE
-        tx.run("""
+        # 1. CREATE SCENE + TIMELINE LINK
+        await tx.run("""
             MERGE (m:Manuscript {id: $mid})
             MERGE (s:Scene {id: $sid})
             SET s.paragraph_id = $pid, 
+                s.manuscript_id = $mid,
                 s.sequence_index = $seq_idx,
                 s.raw_text = $text,
+                s.char_start = $char_start,
+                s.char_end = $char_end,
+                s.description = coalesce($desc, s.description),
                 s.created_at = timestamp()
+            // Precomputed sentiment; a rewrite with the same text keeps the stored values
+            FOREACH (x IN CASE WHEN $sentiment IS NULL OR s.sentiment_hash = $sentiment.hash THEN [] ELSE [1] END |
+                SET s.sentiment_score = $sentiment.score,
+                    s.text_polarity = $sentiment.polarity,
+                    s.negative_hits = $sentiment.negative_hits,
+                    s.positive_hits = $sentiment.positive_hits,
+                    s.sentiment_hash = $sentiment.hash)
             MERGE (m)-[:CONTAINS]->(s)
-        """, mid=mid, sid=scene_id, pid=str(para_id), seq_idx=seq_index, text=raw_text)
+            WITH s
+            OPTIONAL MATCH (prev:Scene {id: $prev_sid})
+            FOREACH (p IN CASE WHEN prev IS NULL THEN [] ELSE [prev] END |
+                MERGE (p)-[:NEXT_SCENE]->(s))
+        """, mid=mid, sid=scene_id, pid=str(para_id), seq_idx=seq_index, text=raw_text,
+             desc=events[0]['desc'] if events else None, prev_sid=prev_scene_id, sentiment=sentiment,
+             char_start=metadata.get('char_start'), char_end=metadata.get('char_end'))
 
-        # 2. TIMELINE LINK
-        if seq_index > 0:
-             tx.run("""
-                MATCH (curr:Scene {id: $curr_id})
-                MATCH (prev:Scene {manuscript_id: $mid, sequence_index: $prev_idx})
-                MERGE (prev)-[:NEXT_SCENE]->(curr)
-             """, curr_id=scene_id, mid=mid, prev_idx=seq_index - 1)
-
-        # 3. SAVE CHARACTERS (With Resolution)
-        for char in entities.get("characters", []):
-            final_name = self._resolve_name(char['text'])
-            
-            # If name was blacklisted (returned None), SKIP IT.
-            if not final_name: continue 
-            
-            tx.run("""
-                MERGE (c:NarrativeEntity {name: $name, manuscript_id: $mid})
+        # 2. SAVE CHARACTERS (With Resolution)
+        if characters:
+            await tx.run("""
+                MATCH (s:Scene {id: $sid})
+                UNWIND $rows AS row
+                MERGE (c:NarrativeEntity {name: row.name, manuscript_id: $mid})
                 SET c:Character, 
-                    c.archetype = $arch,
-                    c.emotion = $emo,
-                    c.goal = $goal
-                MERGE (c)-[:APPEARS_IN]->(s:Scene {id: $sid})
-            """, 
-            name=final_name, 
-            mid=mid, 
-            sid=scene_id, 
-            arch=char.get('archetype', 'Unknown'),
-            emo=char.get('emotion', 'Neutral'),
-            goal=char.get('goal', 'Unknown'))
-
-        # 4. LOCATIONS
-        for loc in entities.get("locations", []):
-            tx.run("""
-                MERGE (l:NarrativeEntity {name: $name, manuscript_id: $mid})
-                SET l:Location, l.type = $type
-                MERGE (s:Scene {id: $sid})-[:SETTING_IS]->(l)
-            """, name=loc['text'], mid=mid, sid=scene_id, type=loc.get('type', 'Place'))
-
-        # 5. EVENTS
-        events = entities.get("events", [])
+                    c.name_key = row.key,
+                    c.archetype = row.arch,
+                    c.emotion = row.emo,
+                    c.goal = row.goal,
+                    c.aliases = CASE
+                        WHEN row.alias IS NULL OR row.alias IN coalesce(c.aliases, []) THEN c.aliases
+                        ELSE coalesce(c.aliases, []) + row.alias
+                    END
+                MERGE (c)-[:APPEARS_IN]->(s)
+            """, rows=characters, mid=mid, sid=scene_id)
+
+        # 3. LOCATIONS
+        if locations:
+            await tx.run("""
+                MATCH (s:Scene {id: $sid})
+                UNWIND $rows AS row
+                MERGE (l:NarrativeEntity {name: row.name, manuscript_id: $mid})
+                SET l:Location, l.type = row.type, l.name_key = row.key
+                MERGE (s)-[:SETTING_IS]->(l)
+            """, rows=locations, mid=mid, sid=scene_id)
+
+        # 4. EVENTS
         if events:
-            tx.run("MATCH (s:Scene {id: $sid}) SET s.description = $desc", sid=scene_id, desc=events[0]['text'])
-        for evt in events:
-             tx.run("""
-                MERGE (e:Event {description: $desc, manuscript_id: $mid, scene_id: $sid})
-                MERGE (s:Scene {id: $sid})-[:INCLUDES_EVENT]->(e)
-            """, desc=evt['text'], mid=mid, sid=scene_id)
+            await tx.run("""
+                MATCH (s:Scene {id: $sid})
+                UNWIND $rows AS row
+                MERGE (e:Event {description: row.desc, manuscript_id: $mid, scene_id: $sid})
+                MERGE (s)-[:INCLUDES_EVENT]->(e)
+            """, rows=events, mid=mid, sid=scene_id)
 
         print(f"💾 Scene {seq_index} Saved: Entities Resolved.")
 
+        # Timeline entry for this scene, applied once the transaction has committed
+        scene = {
+            "manuscript_id": mid,
+            "scene_id": scene_id,
+            "step": seq_index,
+            "summary": events[0]['desc'] if events else None,
+            "events": list(dict.fromkeys(evt['desc'] for evt in events)),
+            "characters": list(dict.fromkeys(
+                character_state(c['name'], c['emo'], c['goal']) for c in characters
+            )),
+            "names": list(dict.fromkeys(c['name'] for c in characters)),
+        }
+        return scene, await manuscript_versions.bump(tx, mid)
+
+# Another process wrote to a manuscript: its in-memory state is rebuilt from the graph
+for registry in (timeline_digests, alias_registry, lexicons):
+    manuscript_versions.on_stale(registry.forget)
+
 graph_db = GraphManager()
\ No newline at end of file
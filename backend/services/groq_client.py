@@ -7,9 +7,12 @@ import re
 from typing import Dict, List, Any
 from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
+from services.rate_limiter import limiter
+from services.tokens import estimate_tokens
 
 # Initialize Groq LLM
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+GROQ_MODEL = "llama-3.1-8b-instant"
 
 def call_groq_langchain(system_prompt: str, user_message: str) -> str:
     """
@@ -21,9 +24,10 @@ def call_groq_langchain(system_prompt: str, user_message: str) -> str:
     try:
         llm = ChatGroq(
             api_key=GROQ_API_KEY,
-            model="llama-3.1-8b-instant",
+            model=GROQ_MODEL,
             temperature=0.3,
-            max_tokens=1024
+            max_tokens=1024,
+            max_retries=0  # 429s are retried by the shared rate limiter
         )
         
         prompt = ChatPromptTemplate.from_messages([
@@ -32,7 +36,11 @@ def call_groq_langchain(system_prompt: str, user_message: str) -> str:
         ])
         
         chain = prompt | llm
-        response = chain.invoke({})
+        response = limiter.call(
+            GROQ_MODEL,
+            lambda: chain.invoke({}),
+            tokens=estimate_tokens(system_prompt + user_message) + 1024
+        )
         return response.content
     except Exception as e:
         print(f"Error calling Groq API via LangChain: {e}")
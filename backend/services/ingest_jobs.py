@@ -0,0 +1,163 @@
+"""
+Bulk manuscript ingestion (POST /ingest/{id} and the ingest.py CLI).
+
+A job memory-maps a text file and decodes it block by block, so a novel is never
+held as one string. The text is chunked incrementally (text_processor.stream_chunks)
+and queued like WebSocket frames, only with websocket=None. The shared worker pool
+extracts the chunks in parallel with other manuscripts. Each chunk reports back to
+its job when it is done, so clients can poll progress by job id with no tab open.
+
+Uploads are spooled to a temp file first, so the request ends as soon as the body
+has arrived; backpressure then applies to the job, not to the HTTP connection.
+"""
+import asyncio
+import codecs
+import mmap
+import os
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from .graph_manager import graph_db
+from .text_processor import processor as text_streamer
+
+READ_BLOCK = 256 * 1024  # Bytes decoded per step
+MAX_JOBS = int(os.getenv("INGEST_MAX_JOBS", "100"))  # Finished jobs kept for polling
+SPOOL_DIR = Path(os.getenv("INGEST_SPOOL_DIR", Path(__file__).resolve().parent.parent / ".cache" / "uploads"))
+
+
+class IngestJob:
+    def __init__(self, manuscript_id: str, source: str, chapter: int = 1, paragraph: int = 0):
+        self.id = uuid.uuid4().hex[:12]
+        self.manuscript_id = manuscript_id
+        self.source = source
+        self.chapter = chapter
+        self.paragraph = paragraph
+
+        self.state = "reading"  # reading -> extracting -> done | failed
+        self.bytes_total = 0
+        self.bytes_read = 0
+        self.queued = 0
+        self.unchanged = 0
+        self.retracted = 0
+        self.extracted = 0
+        self.failed = 0
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._finished = asyncio.Event()
+
+    def chunk_finished(self, ok: bool):
+        # Called by the extraction worker for every chunk of this job
+        if ok:
+            self.extracted += 1
+        else:
+            self.failed += 1
+        self._check_finished()
+
+    def _check_finished(self):
+        if self.state == "extracting" and self.extracted + self.failed >= self.queued:
+            self._finish("done")
+
+    def _finish(self, state: str, error: str = None):
+        self.state = state
+        self.error = error
+        self.finished_at = time.time()
+        self._finished.set()
+
+    async def wait(self):
+        await self._finished.wait()
+
+    def to_dict(self) -> dict:
+        finished = self.extracted + self.failed
+        return {
+            "job_id": self.id,
+            "manuscript_id": self.manuscript_id,
+            "source": self.source,
+            "state": self.state,
+            "bytes_read": self.bytes_read,
+            "bytes_total": self.bytes_total,
+            "chunks_queued": self.queued,
+            "chunks_unchanged": self.unchanged,
+            "chunks_retracted": self.retracted,
+            "chunks_extracted": self.extracted,
+            "chunks_failed": self.failed,
+            # Unknown until the whole file has been read
+            "progress": round(finished / self.queued, 3) if self.queued and self.state != "reading" else None,
+            "elapsed_s": round((self.finished_at or time.time()) - self.started_at, 1),
+            "error": self.error,
+        }
+
+
+def read_text(path: Path, job: IngestJob = None) -> Iterator[str]:
+    """
+    Decodes a UTF-8 file through mmap in READ_BLOCK slices (multi-byte characters
+    split across slices are handled by the incremental decoder).
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if job is not None:
+            job.bytes_total = size
+        if size == 0:
+            return  # mmap refuses empty files
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for offset in range(0, size, READ_BLOCK):
+                block = mm[offset:offset + READ_BLOCK]
+                if job is not None:
+                    job.bytes_read = offset + len(block)
+                yield decoder.decode(block)
+    yield decoder.decode(b"", final=True)
+
+
+class IngestJobRegistry:
+    def __init__(self):
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self._jobs.get(job_id)
+
+    def list(self, manuscript_id: str = None) -> list:
+        return [job.to_dict() for job in self._jobs.values() if manuscript_id in (None, job.manuscript_id)]
+
+    def start_file(self, manuscript_id: str, path: Path, chapter: int = 1, paragraph: int = 0,
+                   source: str = None, cleanup: bool = False) -> IngestJob:
+        """
+        Starts ingesting a local file in the background; cleanup=True deletes it
+        afterwards (spooled uploads).
+        """
+        job = IngestJob(manuscript_id, source or Path(path).name, chapter, paragraph)
+        self._jobs[job.id] = job
+        self._evict()
+        asyncio.create_task(self._run(job, Path(path), cleanup))
+        return job
+
+    def _evict(self):
+        finished = [jid for jid, job in self._jobs.items() if job.finished_at is not None]
+        for jid in finished[:max(0, len(self._jobs) - MAX_JOBS)]:
+            del self._jobs[jid]
+
+    async def _run(self, job: IngestJob, path: Path, cleanup: bool):
+        metadata = {"manuscript_id": job.manuscript_id, "chapter": job.chapter, "paragraph": job.paragraph}
+        try:
+            print(f"📚 Bulk ingest {job.id}: {job.source} -> {job.manuscript_id}")
+            plan = await text_streamer.add_file_stream(read_text(path, job), metadata, job)
+            job.unchanged = plan["unchanged"]
+            job.retracted = len(plan["retracted"])
+            # A shorter re-upload loses the scenes of its vanished tail (one batch)
+            if plan["retracted"]:
+                await graph_db.retract_scenes(job.manuscript_id, plan["retracted"])
+            await graph_db.move_scenes(job.manuscript_id, plan["moved"])
+            job.state = "extracting"
+            job._check_finished()
+            print(f"✂️ Bulk ingest {job.id}: {job.queued} chunks queued, {job.unchanged} unchanged")
+        except Exception as e:
+            print(f"❌ Bulk ingest {job.id} failed: {e}")
+            job._finish("failed", str(e))
+        finally:
+            if cleanup:
+                path.unlink(missing_ok=True)
+
+ingest_jobs = IngestJobRegistry()
@@ -0,0 +1,244 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_PATH = Path(__file__).resolve().parent.parent / ".cache" / "extraction_jobs.sqlite3"
+
+# Finished rows (done, failed, superseded) older than this are pruned
+RETENTION_DAYS = float(os.getenv("EXTRACTION_JOBS_RETENTION_DAYS", "30"))
+# Beyond this many rows, the oldest finished ones are pruned whatever their age
+MAX_ROWS = int(os.getenv("EXTRACTION_JOBS_MAX_ROWS", "200000"))
+PRUNE_EVERY = 1000  # Completions between prunes
+
+# queued -> in_flight -> done | failed; any of them -> superseded once the slot has new text
+STATES = ("queued", "in_flight", "done", "failed", "superseded")
+
+JobKey = Tuple[str, str, str]  # (manuscript_id, fingerprint, slot)
+
+
+class JobStore:
+    """
+    Durable record of every extraction job (SQLite, WAL mode).
+
+    A job is one chunk of a manuscript, keyed by (manuscript, chunk fingerprint, slot);
+    the slot is the scene's paragraph id ("0_3"). The in-memory processing queue only
+    dispatches; this store is what survives a restart:
+
+      - jobs still queued or in flight are re-queued on startup (resume);
+      - a chunk already done in its slot is never queued again, even after a restart
+        wiped the in-memory fingerprints;
+      - extracted entities are kept per (manuscript, fingerprint), so text that was
+        done anywhere in the manuscript (e.g. a paragraph shifted by an insert above
+        it) is written to its new scene without another LLM call;
+      - new text in a slot supersedes the older fingerprints there, and a superseded
+        job that is still queued is skipped when a worker tries to claim it;
+      - finished rows are pruned by age and by a row cap (prune).
+    """
+
+    def __init__(self, path: str = None):
+        self.path = Path(path or os.getenv("EXTRACTION_JOBS_PATH", DEFAULT_PATH))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Commits survive a crash of the process (not of the machine) without an fsync each
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                manuscript_id TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                slot TEXT NOT NULL,
+                state TEXT NOT NULL,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                entities TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                seq INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (manuscript_id, fingerprint, slot)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_slot ON jobs (manuscript_id, slot)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (state, seq)")
+        self._conn.commit()
+        self._seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM jobs").fetchone()[0]
+        self.reused = 0  # Chunks written from stored entities instead of a new extraction
+        self.pruned = 0
+        self._since_prune = 0
+
+    @staticmethod
+    def key(metadata: Dict[str, Any]) -> JobKey:
+        return (metadata.get("manuscript_id", "default"), metadata["fingerprint"], str(metadata["paragraph"]))
+
+    def enqueue(self, text: str, metadata: Dict[str, Any]) -> bool:
+        """
+        Records a chunk to extract. False when there is nothing to do: the same text
+        is already done (or still pending) in that slot. Sets metadata["is_revision"]
+        when the slot held other text before.
+        """
+        mid, fingerprint, slot = self.key(metadata)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state FROM jobs WHERE manuscript_id = ? AND fingerprint = ? AND slot = ?",
+                (mid, fingerprint, slot),
+            ).fetchone()
+            if row and row[0] in ("done", "queued", "in_flight"):
+                return False
+
+            # Older text of this slot is stale now (its entities stay reusable)
+            older = self._conn.execute(
+                "UPDATE jobs SET state = 'superseded', updated_at = ? WHERE manuscript_id = ? AND slot = ? AND fingerprint != ?",
+                (time.time(), mid, slot, fingerprint),
+            ).rowcount
+            if older:
+                # The slot had a scene before (maybe in an earlier run): clear its old links first
+                metadata["is_revision"] = True
+            stored = {k: v for k, v in metadata.items() if k != "raw_text"}  # raw_text == text
+            self._seq += 1
+            self._conn.execute("""
+                INSERT INTO jobs (manuscript_id, fingerprint, slot, state, text, metadata, seq, updated_at)
+                VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)
+                ON CONFLICT (manuscript_id, fingerprint, slot) DO UPDATE SET
+                    state = 'queued', text = excluded.text, metadata = excluded.metadata,
+                    error = NULL, seq = excluded.seq, updated_at = excluded.updated_at
+            """, (mid, fingerprint, slot, text, json.dumps(stored), self._seq, time.time()))
+            self._conn.commit()
+            return True
+
+    def claim(self, key: JobKey) -> bool:
+        """
+        Marks a queued job in flight. False if it was superseded (or finished) since.
+        """
+        with self._lock:
+            claimed = self._conn.execute("""
+                UPDATE jobs SET state = 'in_flight', attempts = attempts + 1, updated_at = ?
+                WHERE manuscript_id = ? AND fingerprint = ? AND slot = ? AND state = 'queued'
+            """, (time.time(), *key)).rowcount
+            self._conn.commit()
+            return claimed == 1
+
+    def complete(self, key: JobKey, entities: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute("""
+                UPDATE jobs SET state = 'done', entities = ?, error = NULL, updated_at = ?
+                WHERE manuscript_id = ? AND fingerprint = ? AND slot = ? AND state = 'in_flight'
+            """, (json.dumps(entities), time.time(), *key))
+            self._conn.commit()
+            self._since_prune += 1
+            if self._since_prune < PRUNE_EVERY:
+                return
+        self.prune()
+
+    def prune(self) -> int:
+        """
+        Deletes finished rows past RETENTION_DAYS, then the oldest finished rows beyond
+        MAX_ROWS. Queued and in-flight jobs are never pruned. A pruned done row only
+        means that text is extracted again if it is ever sent again.
+        """
+        with self._lock:
+            self._since_prune = 0
+            removed = self._conn.execute(
+                "DELETE FROM jobs WHERE state IN ('done', 'failed', 'superseded') AND updated_at < ?",
+                (time.time() - RETENTION_DAYS * 86400,),
+            ).rowcount
+            excess = self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] - MAX_ROWS
+            if excess > 0:
+                # Superseded rows go first, then the least recently touched
+                removed += self._conn.execute("""
+                    DELETE FROM jobs WHERE rowid IN (
+                        SELECT rowid FROM jobs WHERE state IN ('done', 'failed', 'superseded')
+                        ORDER BY state != 'superseded', updated_at LIMIT ?
+                    )
+                """, (excess,)).rowcount
+            self._conn.commit()
+            self.pruned += removed
+        if removed:
+            print(f"🧹 Pruned {removed} finished extraction jobs")
+        return removed
+
+    def fail(self, key: JobKey, error: str):
+        # Failed jobs are not resumed; sending the chunk again re-queues it
+        with self._lock:
+            self._conn.execute("""
+                UPDATE jobs SET state = 'failed', error = ?, updated_at = ?
+                WHERE manuscript_id = ? AND fingerprint = ? AND slot = ? AND state = 'in_flight'
+            """, (error, time.time(), *key))
+            self._conn.commit()
+
+    def entities(self, manuscript_id: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        Entities already extracted for this text anywhere in the manuscript.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT entities FROM jobs WHERE manuscript_id = ? AND fingerprint = ? AND entities IS NOT NULL LIMIT 1",
+                (manuscript_id, fingerprint),
+            ).fetchone()
+        if row is None:
+            return None
+        self.reused += 1
+        return json.loads(row[0])
+
+    def slots(self, manuscript_id: str, base_paragraph: str) -> List[Optional[Tuple[str, int, int]]]:
+        """
+        Current (fingerprint, char_start, char_end) of each chunk slot of a paragraph
+        ("0_0", "0_1", ...), by chunk index; None where a slot has nothing live. Lets
+        a restarted process diff a resent document against what it already holds.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                # Prefix range on the (manuscript_id, slot) index: "0_" <= slot < "0`"
+                "SELECT slot, fingerprint, metadata FROM jobs WHERE manuscript_id = ? AND slot >= ? AND slot < ? "
+                "AND state IN ('done', 'queued', 'in_flight')",
+                (manuscript_id, f"{base_paragraph}_", f"{base_paragraph}`"),
+            ).fetchall()
+        found = {}
+        for slot, fingerprint, metadata in rows:
+            base, _, index = slot.rpartition("_")
+            if base == base_paragraph and index.isdigit():
+                metadata = json.loads(metadata)
+                found[int(index)] = (fingerprint, metadata.get("char_start"), metadata.get("char_end"))
+        return [found.get(i) for i in range(max(found) + 1)] if found else []
+
+    def retract(self, manuscript_id: str, slots: List[str]):
+        # Slots whose chunks vanished from the document: nothing there to resume
+        if not slots:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET state = 'superseded', updated_at = ? WHERE manuscript_id = ? AND slot = ? AND state != 'superseded'",
+                [(time.time(), manuscript_id, slot) for slot in slots],
+            )
+            self._conn.commit()
+
+    def resume(self) -> List[Dict[str, Any]]:
+        """
+        Jobs a previous run left queued or in flight, in the order they were queued,
+        as (text, metadata) dicts ready to be put back on the processing queue.
+        Also prunes old finished rows.
+        """
+        self.prune()
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET state = 'queued' WHERE state = 'in_flight'")
+            self._conn.commit()
+            rows = self._conn.execute(
+                "SELECT text, metadata FROM jobs WHERE state = 'queued' ORDER BY seq"
+            ).fetchall()
+        return [{"text": text, "metadata": {**json.loads(metadata), "raw_text": text}} for text, metadata in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+        return {
+            "path": str(self.path),
+            **{state: counts.get(state, 0) for state in STATES},
+            "reused_extractions": self.reused,
+            "pruned": self.pruned,
+        }
+
+job_store = JobStore()
@@ -0,0 +1,213 @@
+"""
+Tolerant, single-pass JSON parser for LLM completions.
+
+Well-formed output takes the C fast path (json's raw_decode from the first '{').
+Anything else is parsed once, left to right, repairing as it goes:
+
+- prose and ```json fences around the object, // comments
+- unquoted keys and bare-word values, single-quoted strings
+- trailing / doubled commas, missing commas, Python None/True/False
+- truncated output: every complete element is kept and all open containers are
+  closed, so a completion cut off mid-array still yields the entities before the cut
+
+The repair pass moves strictly forward (a failed C attempt on one array element
+is the only re-scan), so the cost stays linear however long or broken the
+completion is.
+"""
+import json
+import re
+from json.decoder import scanstring
+from typing import Any, NamedTuple, Optional
+
+class RepairResult(NamedTuple):
+    value: Optional[Any]   # Recovered object (None if nothing usable was found)
+    complete: bool         # False if the input was cut off before the object closed
+    repaired: bool         # True if any repair was needed
+    end: int               # Index just past the last character consumed
+
+class _Truncated(Exception):
+    pass
+
+_DECODER = json.JSONDecoder(strict=False)  # Raw newlines inside strings are fine
+_SKIP = re.compile(r'(?:\s+|//[^\n]*|```[A-Za-z]*)*')
+_NUMBER = re.compile(r'-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+_BARE = re.compile(r'[^,:{}\[\]"\'\n]+')
+_SINGLE_QUOTED = re.compile(r"'((?:[^'\\]|\\.)*)'", re.DOTALL)
+_DOUBLE_QUOTED = re.compile(r'"((?:[^"\\]|\\.)*)"', re.DOTALL)
+_LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.s = text
+        self.n = len(text)
+        self.i = 0
+        self.repaired = False
+        self.truncated = False
+        self.fast_elements = True
+
+    def skip(self):
+        self.i = _SKIP.match(self.s, self.i).end()
+
+    def value(self):
+        self.skip()
+        if self.i >= self.n:
+            raise _Truncated()
+        c = self.s[self.i]
+        if c == '{':
+            return self.obj()
+        if c == '[':
+            return self.arr()
+        if c == '"' or c == "'":
+            return self.string()
+        m = _NUMBER.match(self.s, self.i)
+        if m and (m.end() == self.n or self.s[m.end()] in ' \t\r\n,}]'):
+            self.i = m.end()
+            text = m.group()
+            return float(text) if any(ch in text for ch in '.eE') else int(text)
+        m = _BARE.match(self.s, self.i)
+        if not m:
+            raise ValueError(f"Unexpected '{c}' at {self.i}")
+        self.i = m.end()
+        word = m.group().strip()
+        self.repaired = self.repaired or word not in ("true", "false", "null")
+        return _LITERALS.get(word, word)
+
+    def string(self) -> str:
+        quote = self.s[self.i]
+        if quote == '"':
+            try:
+                # strict=False accepts raw newlines/tabs inside strings
+                text, self.i = scanstring(self.s, self.i + 1, False)
+                return text
+            except ValueError:
+                pass  # Unterminated or bad escape: fall back to regex
+        pattern = _DOUBLE_QUOTED if quote == '"' else _SINGLE_QUOTED
+        m = pattern.match(self.s, self.i)
+        if not m:
+            raise _Truncated()
+        self.repaired = True
+        self.i = m.end()
+        return m.group(1).replace("\\" + quote, quote).replace("\n", " ")
+
+    def key(self) -> Optional[str]:
+        c = self.s[self.i]
+        if c == '"' or c == "'":
+            return self.string()
+        m = _BARE.match(self.s, self.i)
+        if not m:
+            return None
+        self.repaired = True
+        self.i = m.end()
+        return m.group().strip()
+
+    def obj(self) -> dict:
+        self.i += 1
+        result = {}
+        while True:
+            self.skip()
+            if self.i >= self.n:
+                self.truncated = True
+                return result
+            c = self.s[self.i]
+            if c == '}':
+                self.i += 1
+                return result
+            if c == ',':
+                self.i += 1
+                continue
+            if c == ']':  # Mismatched bracket: treat as the end of this object
+                self.repaired = True
+                return result
+
+            try:
+                k = self.key()
+                if k is None:
+                    self.repaired = True
+                    self.i += 1
+                    continue
+                self.skip()
+                if self.i < self.n and self.s[self.i] == ':':
+                    self.i += 1
+                else:
+                    self.repaired = True
+                v = self.value()
+            except _Truncated:
+                self.truncated = True
+                return result
+
+            if self.truncated:
+                # Keep containers that recovered something; drop half-written scalars
+                if isinstance(v, (list, dict)) and v:
+                    result[k] = v
+                return result
+            result[k] = v
+
+    def arr(self) -> list:
+        self.i += 1
+        result = []
+        while True:
+            self.skip()
+            if self.i >= self.n:
+                self.truncated = True
+                return result
+            c = self.s[self.i]
+            if c == ']':
+                self.i += 1
+                return result
+            if c == ',':
+                self.i += 1
+                continue
+            if c == '}':
+                self.repaired = True
+                return result
+            if c == '{' and self.fast_elements:
+                # Often only the tail is broken (truncation, one missing comma), so try
+                # each element in C first. Errors are usually systematic (every key
+                # unquoted...), so after the first failure we stop trying.
+                try:
+                    v, self.i = _DECODER.raw_decode(self.s, self.i)
+                    result.append(v)
+                    continue
+                except ValueError:
+                    self.fast_elements = False
+
+            try:
+                v = self.value()
+            except _Truncated:
+                self.truncated = True
+                return result
+
+            if self.truncated:
+                # The element that was cut off is incomplete: only nested lists survive
+                if isinstance(v, list) and v:
+                    result.append(v)
+                return result
+            result.append(v)
+
+
+def parse_llm_json(text: str) -> RepairResult:
+    """
+    Returns the first JSON object in an LLM completion, repairing it if needed.
+    """
+    if not text:
+        return RepairResult(None, False, False, 0)
+    start = text.find('{')
+    if start == -1:
+        return RepairResult(None, False, False, 0)
+
+    # 1. Fast path: valid JSON (trailing prose is fine)
+    try:
+        value, end = _DECODER.raw_decode(text, start)
+        return RepairResult(value, True, False, end)
+    except ValueError:
+        pass
+
+    # 2. One tolerant pass
+    parser = _Parser(text)
+    parser.i = start
+    try:
+        value = parser.obj()
+    except (ValueError, RecursionError):
+        return RepairResult(None, False, True, parser.i)
+    return RepairResult(value, not parser.truncated, True, parser.i)
@@ -6,21 +6,28 @@ import json
 import re
 from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
+from services.rate_limiter import limiter
 
 # Initialize Groq LLM
 groq_api_key = os.getenv("GROQ_API_KEY")
+GROQ_MODEL = "llama-3.1-8b-instant"
 
 try:
     llm = ChatGroq(
         api_key=groq_api_key,
-        model="llama-3.1-8b-instant",
+        model=GROQ_MODEL,
         temperature=0.3,
-        max_tokens=1024
+        max_tokens=1024,
+        max_retries=0  # 429s are retried by the shared rate limiter
     )
 except Exception as e:
     print(f"Warning: Could not initialize Groq LLM: {e}")
     llm = None
 
+def _invoke(chain):
+    # Every call shares the process-wide Groq budget (prompt + max_tokens, roughly)
+    return limiter.call(GROQ_MODEL, lambda: chain.invoke({}), tokens=1500)
+
 def extract_entities_fast(text: str) -> dict:
     """
     Fast entity extraction using Groq LLM
@@ -40,7 +47,7 @@ def extract_entities_fast(text: str) -> dict:
         ])
         
         chain = prompt | llm
-        response = chain.invoke({})
+        response = _invoke(chain)
         
         # Parse JSON response
         try:
@@ -88,7 +95,7 @@ def generate_summary(text: str) -> str:
         ])
         
         chain = prompt | llm
-        return chain.invoke({}).content
+        return _invoke(chain).content
     except Exception as e:
         print(f"Error generating summary: {e}")
         return text[:100] + "..." if len(text) > 100 else text
@@ -105,7 +112,7 @@ def generate_scene_suggestion(context: str) -> str:
         ])
         
         chain = prompt | llm
-        return chain.invoke({}).content
+        return _invoke(chain).content
     except Exception as e:
         print(f"Error generating suggestions: {e}")
         return "Continue the narrative with a new scene."
@@ -0,0 +1,29 @@
+import os
+from neo4j import AsyncGraphDatabase
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# One async driver (and therefore one connection pool) for the whole process.
+# Created lazily so it binds to the running event loop rather than import time.
+_driver = None
+
+def get_driver():
+    global _driver
+    if _driver is None:
+        uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+        user = os.getenv("NEO4J_USER", "neo4j")
+        password = os.getenv("NEO4J_PASSWORD", "password")
+        _driver = AsyncGraphDatabase.driver(
+            uri,
+            auth=(user, password),
+            max_connection_pool_size=int(os.getenv("NEO4J_MAX_POOL_SIZE", "50")),
+            connection_acquisition_timeout=float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "30")),
+        )
+    return _driver
+
+async def close_driver():
+    global _driver
+    if _driver is not None:
+        await _driver.close()
+        _driver = None
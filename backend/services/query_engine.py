@@ -1,41 +1,29 @@
 import os
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
-from langchain_neo4j import Neo4jVector
-from langchain_huggingface import HuggingFaceEmbeddings
-from services.graph_manager import KnowledgeGraphManager
+from services.graph_manager import graph_db
+from services.rate_limiter import limiter
+from services.tokens import estimate_tokens
+from services.vector_index import vector_indexes
 
 load_dotenv()
 
 class QueryEngine:
     def __init__(self):
         # 1. Setup reasoning engine (Groq)
+        self.model_name = "llama-3.1-70b-versatile" # 70B is better for complex reasoning
         self.llm = ChatGroq(
-            model_name="llama-3.1-70b-versatile", # 70B is better for complex reasoning
+            model_name=self.model_name,
             temperature=0,
-            groq_api_key=os.getenv("GROQ_API_KEY")
+            groq_api_key=os.getenv("GROQ_API_KEY"),
+            max_retries=0  # 429s are retried by the shared rate limiter
         )
         
-        # 2. Setup semantic memory (Neo4j Vector Store)
-        # Using local HuggingFace embeddings to save on API costs
-        self.embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        # 2. Setup semantic memory (local per-manuscript vector index)
+        # Local HuggingFace embeddings, memory-mapped on disk: no database round trip
+        self.vector_store = vector_indexes
         
-        self.vector_store = Neo4jVector.from_existing_graph(
-            embedding=self.embeddings,
-            url=os.getenv('NEO4J_URI'),
-            username=os.getenv('NEO4J_USER'),
-            password=os.getenv('NEO4J_PASSWORD'),
-            index_name="story_entities",
-            node_label="Event", # We search across events
-            text_node_properties=["text", "summary"],
-            embedding_node_property="embedding"
-        )
-        
-        self.graph_manager = KnowledgeGraphManager(
-            os.getenv('NEO4J_URI'), 
-            os.getenv('NEO4J_USER'), 
-            os.getenv('NEO4J_PASSWORD')
-        )
+        self.graph_manager = graph_db  # Shares the process-wide async driver
     
     async def answer_query(self, question: str, manuscript_id: str):
         """Processes natural language questions about the story."""
@@ -44,12 +32,8 @@ class QueryEngine:
             intent = await self._classify_query(question)
             
             # Step 2: Semantic search for context
-            # asimilarity_search is non-blocking
-            relevant_docs = await self.vector_store.asimilarity_search(
-                question, 
-                k=5, 
-                filter={"manuscript_id": manuscript_id}
-            )
+            # Scene and event embeddings of this manuscript only (searched off the event loop)
+            relevant_docs = await self.vector_store.search(manuscript_id, question, k=5)
             
             # Step 3: Graph search for structured data
             graph_context = await self._execute_graph_query(intent, question)
@@ -61,10 +45,13 @@ class QueryEngine:
             print(f"❌ Query Engine Error: {e}")
             return {"answer": "I'm sorry, I couldn't retrieve that information right now.", "sources": []}
 
+    async def _ask(self, prompt: str):
+        return await limiter.acall(self.model_name, lambda: self.llm.ainvoke(prompt), tokens=estimate_tokens(prompt) + 300)
+
     async def _classify_query(self, question: str):
         """Determines if the user is asking about a person, place, or event."""
         prompt = f"Classify the intent of this story question: '{question}'\nTypes: character_info, location_info, plot_timeline. Return ONLY the type name."
-        response = await self.llm.ainvoke(prompt)
+        response = await self._ask(prompt)
         return response.content.strip().lower()
 
     async def _execute_graph_query(self, intent: str, question: str):
@@ -86,7 +73,7 @@ class QueryEngine:
 
     async def _synthesize_answer(self, question, docs, graph_context):
         """Combines all data into a narrative response."""
-        context_text = "\n".join([d.page_content for d in docs])
+        context_text = "\n".join([d["text"] for d in docs])
         graph_text = str(graph_context)
         
         prompt = f"""
@@ -98,8 +85,8 @@ class QueryEngine:
         
         Answer concisely in 2-3 sentences.
         """
-        response = await self.llm.ainvoke(prompt)
+        response = await self._ask(prompt)
         return {
             "answer": response.content,
-            "sources": [d.metadata for d in docs]
+            "sources": [{k: v for k, v in d.items() if k != "text"} for d in docs]
         }
\ No newline at end of file
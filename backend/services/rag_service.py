@@ -1,79 +1,59 @@
 import os
-from neo4j import GraphDatabase
 from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
 from dotenv import load_dotenv
+from .context_selector import context_selector
+from .neo4j_driver import get_driver
+from .rate_limiter import limiter
+from .timeline_digest import timeline_digests
+from .tokens import estimate_tokens
+from .vector_index import vector_indexes
 
 load_dotenv()
 
 class GraphRAGService:
+    # Nearest scene/event rows fed into context ranking
+    SEMANTIC_HITS = 20
+
     def __init__(self):
-        uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-        user = os.getenv("NEO4J_USER", "neo4j")
-        password = os.getenv("NEO4J_PASSWORD", "password")
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
-        
+        self.model_name = "llama-3.1-8b-instant"
         self.llm = ChatGroq(
             temperature=0.3,
-            model_name="llama-3.1-8b-instant",
-            groq_api_key=os.getenv("GROQ_API_KEY")
+            model_name=self.model_name,
+            groq_api_key=os.getenv("GROQ_API_KEY"),
+            max_retries=0  # 429s are retried by the shared rate limiter
         )
 
-    def close(self):
-        self.driver.close()
+    @property
+    def driver(self):
+        # Shared async driver, so graph reads never block the event loop
+        return get_driver()
 
-    def _get_narrative_context(self, manuscript_id: str):
-        """
-        Retrieves the story timeline by following the Manuscript -> Scene link.
+    async def _get_narrative_context(self, manuscript_id: str, question: str):
         """
-        # --- FIXED QUERY ---
-        query = """
-        MATCH (m:Manuscript {id: $mid})-[:CONTAINS]->(s:Scene)
-        
-        // Gather Events linked to this scene
-        OPTIONAL MATCH (s)-[:INCLUDES_EVENT]->(e:Event)
-        
-        // Gather Characters appearing in this scene
-        OPTIONAL MATCH (c:Character)-[:APPEARS_IN]->(s)
-        
-        WITH s, e, c
-        ORDER BY s.sequence_index ASC
-        
-        RETURN 
-            s.sequence_index as step,
-            s.description as scene_desc,
-            collect(DISTINCT e.description) as specific_events,
-            collect(DISTINCT c.name + ' (Feeling: ' + c.emotion + ', Goal: ' + c.goal + ')') as character_states
+        Returns the story timeline, trimmed to the scenes most relevant to the question
+        when the whole of it would not fit the context budget. The timeline is
+        materialized per manuscript, so only the first question walks the graph.
         """
-        
-        with self.driver.session() as session:
-            result = session.run(query, mid=manuscript_id)
-            records = [record.data() for record in result]
-            
-            if not records:
-                return None
+        digest = await timeline_digests.get(manuscript_id, self.driver)
+        if context_selector.fits(digest):
+            return digest.text()
+        return context_selector.select(digest, question, semantic=await self._semantic_scores(manuscript_id, question))
 
-            context_text = f"STORY TIMELINE FOR MANUSCRIPT '{manuscript_id}':\n\n"
-            for r in records:
-                # Default to Step 0 if index is None
-                step = r['step'] if r['step'] is not None else "?"
-                context_text += f"SCENE {step}:\n"
-                context_text += f"  Summary: {r['scene_desc']}\n"
-                
-                if r['specific_events']:
-                    # Filter out duplicates or empty strings
-                    valid_events = [ev for ev in r['specific_events'] if ev]
-                    if valid_events:
-                        context_text += f"  Details: {', '.join(valid_events)}\n"
-                
-                if r['character_states']:
-                    context_text += f"  Characters: {'; '.join(r['character_states'])}\n"
-                context_text += "\n"
-                
-            return context_text
+    async def _semantic_scores(self, manuscript_id: str, question: str) -> dict:
+        """
+        Best embedding similarity per scene, from the local vector index (no graph access).
+        """
+        scores = {}
+        try:
+            for hit in await vector_indexes.search(manuscript_id, question, k=self.SEMANTIC_HITS):
+                scores[hit["scene_id"]] = max(scores.get(hit["scene_id"], 0.0), hit["score"])
+        except Exception as e:
+            print(f"⚠️ Semantic ranking skipped: {e}")
+        return scores
 
     async def answer_question(self, manuscript_id: str, question: str):
-        context = self._get_narrative_context(manuscript_id)
+        context = await self._get_narrative_context(manuscript_id, question)
         
         if not context:
             return "I don't have enough data on this story yet. Please process the text first."
@@ -96,7 +76,11 @@ class GraphRAGService:
         """)
         
         chain = prompt | self.llm
-        response = await chain.ainvoke({"context": context, "question": question})
+        response = await limiter.acall(
+            self.model_name,
+            lambda: chain.ainvoke({"context": context, "question": question}),
+            tokens=estimate_tokens(context) + estimate_tokens(question) + 600
+        )
         
         return response.content
 
@@ -0,0 +1,230 @@
+"""
+Process-wide rate limiter shared by every Groq caller.
+
+Each model gets a request bucket (RPM), a token bucket (TPM) and an adaptive
+concurrency limit. A 429 halves that model's concurrency, blocks the model for
+Retry-After seconds (or a jittered exponential backoff when the header is
+missing), and the call is retried. Successes grow concurrency back one step at
+a time.
+
+State is guarded by a threading lock, so sync callers (running in executor
+threads) and async callers share the same budget.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount: float) -> float:
+        # Seconds until `amount` is available (0 if it already is)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+
+class ModelBudget:
+    def __init__(self, rpm: int, tpm: int, max_concurrency: int):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(max_concurrency)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+
+        self.calls = 0
+        self.rate_limited = 0
+        self.wait_seconds = 0.0
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    for attr in ("status_code", "code", "status"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    return getattr(getattr(error, "response", None), "status_code", None)
+
+def is_rate_limited(error: Exception) -> bool:
+    if _status_code(error) == 429:
+        return True
+    message = str(error).lower()
+    return "429" in message or "rate_limit" in message or "rate limit" in message
+
+def retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(error, "headers", None) or getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    POLL_INTERVAL = 0.05
+
+    def __init__(self):
+        self.DEFAULT_RPM = int(os.getenv("GROQ_RPM", "30"))
+        self.DEFAULT_TPM = int(os.getenv("GROQ_TPM", "6000"))
+        self.DEFAULT_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "4"))
+        self.MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "5"))
+        self.BACKOFF_BASE = float(os.getenv("GROQ_BACKOFF_BASE", "1.0"))
+        self.BACKOFF_CAP = float(os.getenv("GROQ_BACKOFF_CAP", "60"))
+
+        self._lock = threading.Lock()
+        self._budgets: Dict[str, ModelBudget] = {}
+
+    def configure(self, model: str, rpm: int = None, tpm: int = None, max_concurrency: int = None):
+        with self._lock:
+            self._budgets[model] = ModelBudget(
+                rpm or self.DEFAULT_RPM,
+                tpm or self.DEFAULT_TPM,
+                max_concurrency or self.DEFAULT_CONCURRENCY,
+            )
+
+    def _budget(self, model: str) -> ModelBudget:
+        budget = self._budgets.get(model)
+        if budget is None:
+            budget = self._budgets[model] = ModelBudget(self.DEFAULT_RPM, self.DEFAULT_TPM, self.DEFAULT_CONCURRENCY)
+        return budget
+
+    # --- Budget bookkeeping (shared by the sync and async paths) ---
+
+    def _try_acquire(self, model: str, tokens: int) -> float:
+        """
+        Takes one request slot if everything allows it and returns 0.
+        Otherwise returns how long to wait before trying again.
+        """
+        with self._lock:
+            budget = self._budget(model)
+            now = time.monotonic()
+            budget.requests.refill(now)
+            budget.tokens.refill(now)
+
+            wait = max(
+                budget.blocked_until - now,
+                budget.requests.wait_for(1),
+                budget.tokens.wait_for(tokens),
+            )
+            if wait <= 0 and budget.in_flight >= int(budget.concurrency):
+                wait = self.POLL_INTERVAL
+            if wait > 0:
+                return wait
+
+            budget.requests.level -= 1
+            budget.tokens.level -= min(tokens, budget.tokens.capacity)
+            budget.in_flight += 1
+            budget.calls += 1
+            return 0.0
+
+    def _on_success(self, model: str):
+        with self._lock:
+            budget = self._budget(model)
+            budget.in_flight -= 1
+            # Additive increase: roughly +1 slot per `concurrency` successes
+            budget.concurrency = min(budget.max_concurrency, budget.concurrency + 1.0 / budget.concurrency)
+
+    def _on_failure(self, model: str, error: Exception, attempt: int) -> Optional[float]:
+        """
+        Releases the slot. For a 429 returns the delay before retrying, else None.
+        """
+        with self._lock:
+            budget = self._budget(model)
+            budget.in_flight -= 1
+            if not is_rate_limited(error):
+                return None
+
+            # Multiplicative decrease, then block the whole model until it is safe
+            budget.rate_limited += 1
+            budget.concurrency = max(1.0, budget.concurrency / 2)
+            delay = retry_after(error)
+            if delay is None:
+                delay = random.uniform(0, min(self.BACKOFF_CAP, self.BACKOFF_BASE * 2 ** attempt))
+            else:
+                delay += random.uniform(0, 0.1 * delay + 0.05)  # Spread the herd past the reset
+            budget.blocked_until = max(budget.blocked_until, time.monotonic() + delay)
+            return delay
+
+    def _release(self, model: str):
+        # Cancelled (or interrupted) call: free the slot, no success or 429 to learn from
+        with self._lock:
+            self._budget(model).in_flight -= 1
+
+    def _record_wait(self, model: str, seconds: float):
+        with self._lock:
+            self._budget(model).wait_seconds += seconds
+
+    # --- Public API ---
+
+    async def acall(self, model: str, fn: Callable[[], Awaitable[Any]], tokens: int = 0) -> Any:
+        """
+        Runs `await fn()` inside the model's budget, retrying on 429.
+        """
+        for attempt in range(self.MAX_RETRIES + 1):
+            while (wait := self._try_acquire(model, tokens)) > 0:
+                self._record_wait(model, wait)
+                await asyncio.sleep(wait)
+            try:
+                result = await fn()
+            except Exception as e:
+                delay = self._on_failure(model, e, attempt)
+                if delay is None or attempt == self.MAX_RETRIES:
+                    raise
+                print(f"⏳ Rate Limit Hit on {model}. Retrying in {delay:.1f}s... (Attempt {attempt + 1}/{self.MAX_RETRIES})")
+                continue
+            except BaseException:
+                # asyncio.CancelledError (worker shutdown, cancelled task) is not an Exception
+                self._release(model)
+                raise
+            self._on_success(model)
+            return result
+
+    def call(self, model: str, fn: Callable[[], Any], tokens: int = 0) -> Any:
+        """
+        Blocking variant of acall() for sync callers (run them off the event loop).
+        """
+        for attempt in range(self.MAX_RETRIES + 1):
+            while (wait := self._try_acquire(model, tokens)) > 0:
+                self._record_wait(model, wait)
+                time.sleep(wait)
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self._on_failure(model, e, attempt)
+                if delay is None or attempt == self.MAX_RETRIES:
+                    raise
+                print(f"⏳ Rate Limit Hit on {model}. Retrying in {delay:.1f}s... (Attempt {attempt + 1}/{self.MAX_RETRIES})")
+                continue
+            except BaseException:
+                # KeyboardInterrupt / SystemExit in the calling thread
+                self._release(model)
+                raise
+            self._on_success(model)
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                model: {
+                    "calls": b.calls,
+                    "rate_limited": b.rate_limited,
+                    "in_flight": b.in_flight,
+                    "concurrency": round(b.concurrency, 2),
+                    "max_concurrency": b.max_concurrency,
+                    "wait_seconds": round(b.wait_seconds, 2),
+                }
+                for model, b in self._budgets.items()
+            }
+
+limiter = RateLimiter()
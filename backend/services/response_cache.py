@@ -0,0 +1,181 @@
+"""
+Versioned response caching for manuscript reads (analytics, RAG).
+
+Every write that can change what a manuscript's reads return bumps that manuscript's
+version. Responses carry an ETag built from (endpoint, args, version), so a polling
+client that already has the current data gets 304 Not Modified. The server keeps
+serialized bodies in an LRU keyed the same way, bounded by RESPONSE_CACHE_MAX_BYTES,
+so unchanged manuscripts skip the query and the sentiment pass altogether. Entries of
+older versions are never served again and simply age out.
+
+Versions are stored on the Manuscript node and bumped inside each write transaction,
+so writes from any process (the ingest CLI, a second worker) make this process's
+cached responses stale too. Reads check the stored version with one indexed lookup.
+The ETag includes a per-process nonce so tags issued before a restart never match.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import secrets
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from .neo4j_driver import get_driver
+
+_BOOT = secrets.token_hex(4)
+
+
+class ManuscriptVersions:
+    """
+    Reads and bumps m.version. The last version this process saw is remembered per
+    manuscript: a change it did not make itself means another process wrote, and the
+    in-memory state registered with on_stale (timeline digest, alias index, lexicon)
+    is dropped so it is rebuilt from the graph.
+    """
+
+    def __init__(self):
+        self._seen: Dict[str, int] = {}
+        self._writing: Dict[str, int] = {}  # This process's write transactions in flight
+        self._stale_hooks: List[Callable[[str], None]] = []
+
+    @contextlib.contextmanager
+    def writing(self, manuscript_id: str):
+        """
+        Wraps a write transaction that bumps the version, so concurrent commits of
+        this process are not mistaken for another writer.
+        """
+        self._writing[manuscript_id] = self._writing.get(manuscript_id, 0) + 1
+        try:
+            yield
+        finally:
+            self._writing[manuscript_id] -= 1
+            if not self._writing[manuscript_id]:
+                del self._writing[manuscript_id]
+
+    def on_stale(self, hook: Callable[[str], None]):
+        self._stale_hooks.append(hook)
+
+    def _see(self, manuscript_id: str, version: int, own: bool):
+        """
+        Advances the last seen version. Writes of one manuscript (a worker save, a
+        retract from the WebSocket) can report out of commit order, so an older
+        version is ignored. Another writer is assumed only when the version moves
+        past what this process accounts for: its own commit (+1) and its writes
+        still in flight, which may have committed without reporting yet.
+        """
+        seen = self._seen.get(manuscript_id)
+        if seen is not None and version <= seen:
+            return
+        if seen is not None and version > seen + own + self._writing.get(manuscript_id, 0):
+            for hook in self._stale_hooks:
+                hook(manuscript_id)
+        self._seen[manuscript_id] = version
+
+    async def get(self, manuscript_id: str, driver=None) -> int:
+        async with (driver or get_driver()).session() as session:
+            result = await session.run(
+                "OPTIONAL MATCH (m:Manuscript {id: $mid}) RETURN coalesce(m.version, 0) AS version", mid=manuscript_id
+            )
+            record = await result.single()
+        version = record["version"] if record else 0
+        self._see(manuscript_id, version, own=False)
+        return version
+
+    @staticmethod
+    async def bump(tx, manuscript_id: str) -> int:
+        """
+        Runs inside a write transaction; pass the result to committed() once it commits.
+        """
+        result = await tx.run(
+            "MERGE (m:Manuscript {id: $mid}) SET m.version = coalesce(m.version, 0) + 1 RETURN m.version AS version",
+            mid=manuscript_id,
+        )
+        return (await result.single())["version"]
+
+    def committed(self, manuscript_id: str, version: int):
+        # Call after leaving writing()
+        self._see(manuscript_id, version, own=True)
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = max_bytes or int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+        self._entries: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self.bytes = 0
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, endpoint: str, outcome: str):
+        counters = self.counters.setdefault(endpoint, {"hits": 0, "misses": 0, "not_modified": 0})
+        counters[outcome] += 1
+
+    def get(self, key: Tuple) -> Optional[bytes]:
+        body = self._entries.get(key)
+        if body is not None:
+            self._entries.move_to_end(key)
+        return body
+
+    def put(self, key: Tuple, body: bytes):
+        if len(body) > self.max_bytes // 4:
+            return  # One huge response should not flush everything else
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes -= len(old)
+        self._entries[key] = body
+        self.bytes += len(body)
+        while self.bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= len(evicted)
+
+    def stats(self) -> dict:
+        endpoints = {}
+        for endpoint, c in self.counters.items():
+            served = c["hits"] + c["misses"] + c["not_modified"]
+            endpoints[endpoint] = {
+                **c,
+                # 304s never touch the cache body but are served without recomputing too
+                "hit_ratio": round((c["hits"] + c["not_modified"]) / served, 3) if served else 0.0,
+            }
+        return {"entries": len(self._entries), "bytes": self.bytes, "max_bytes": self.max_bytes, "endpoints": endpoints}
+
+
+manuscript_versions = ManuscriptVersions()
+response_cache = ResponseCache()
+
+
+def make_etag(endpoint: str, manuscript_id: str, args: Any, version: int) -> str:
+    args_hash = hashlib.sha1(json.dumps([endpoint, manuscript_id, args], sort_keys=True, default=str).encode("utf-8")).hexdigest()[:12]
+    return f'W/"{_BOOT}-{version}-{args_hash}"'
+
+def _matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in [tag.strip() for tag in header.split(",")]
+
+async def cached_response(request: Request, endpoint: str, manuscript_id: str, args: Any,
+                          compute: Callable[[], Awaitable[Any]], conditional: bool = True) -> Response:
+    """
+    Serves compute() for (endpoint, manuscript, args) at the manuscript's current
+    version: 304 when the client's If-None-Match matches, the cached body when the
+    server has it, otherwise computes and caches it. Exceptions (e.g. a 404) pass
+    through uncached. conditional=False (POST reads) skips the If-None-Match check.
+    """
+    version = await manuscript_versions.get(manuscript_id)  # Read first: the result is at least this new
+    etag = make_etag(endpoint, manuscript_id, args, version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if conditional and _matches(request, etag):
+        response_cache._count(endpoint, "not_modified")
+        return Response(status_code=304, headers=headers)
+
+    key = (endpoint, manuscript_id, json.dumps(args, sort_keys=True, default=str), version)
+    body = response_cache.get(key)
+    if body is None:
+        response_cache._count(endpoint, "misses")
+        body = json.dumps(jsonable_encoder(await compute())).encode("utf-8")
+        response_cache.put(key, body)
+    else:
+        response_cache._count(endpoint, "hits")
+    return Response(content=body, media_type="application/json", headers=headers)
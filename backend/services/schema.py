@@ -0,0 +1,192 @@
+"""
+Idempotent Neo4j schema bootstrap: constraints and indexes for the hot MERGE/MATCH keys.
+
+Every statement uses IF NOT EXISTS, so running it on each startup is cheap. The
+applied version is recorded on a single (:SchemaVersion) node; data migrations
+(MIGRATIONS) run once, when the recorded version is older than theirs.
+"""
+from typing import Dict, List
+from .alias_index import normalize_name
+
+SCHEMA_VERSION = 4
+
+# Each entry: name, the statement to run, an index-only fallback for when the
+# constraint cannot be created (e.g. old duplicate nodes), and the queries it serves.
+SCHEMA_ITEMS: List[Dict] = [
+    {
+        "name": "manuscript_id",
+        "statement": "CREATE CONSTRAINT manuscript_id IF NOT EXISTS FOR (m:Manuscript) REQUIRE m.id IS UNIQUE",
+        "fallback": "CREATE INDEX manuscript_id_idx IF NOT EXISTS FOR (m:Manuscript) ON (m.id)",
+        "serves": [
+            "graph_manager: MERGE (m:Manuscript {id: $mid})",
+            "rag_service: MATCH (m:Manuscript {id: $mid})-[:CONTAINS]->(s:Scene)",
+        ],
+    },
+    {
+        "name": "scene_id",
+        "statement": "CREATE CONSTRAINT scene_id IF NOT EXISTS FOR (s:Scene) REQUIRE s.id IS UNIQUE",
+        "fallback": "CREATE INDEX scene_id_idx IF NOT EXISTS FOR (s:Scene) ON (s.id)",
+        "serves": [
+            "graph_manager: MERGE (s:Scene {id: $sid})",
+            "graph_manager: MATCH (s:Scene {id: $sid}) before each entity UNWIND",
+            "graph_manager: OPTIONAL MATCH (prev:Scene {id: $prev_sid})",
+        ],
+    },
+    {
+        "name": "narrative_entity_key",
+        "statement": "CREATE CONSTRAINT narrative_entity_key IF NOT EXISTS FOR (e:NarrativeEntity) REQUIRE (e.name, e.manuscript_id) IS UNIQUE",
+        "fallback": "CREATE INDEX narrative_entity_key_idx IF NOT EXISTS FOR (e:NarrativeEntity) ON (e.name, e.manuscript_id)",
+        "serves": [
+            "graph_manager: MERGE (c:NarrativeEntity {name: row.name, manuscript_id: $mid})",
+        ],
+    },
+    {
+        "name": "narrative_entity_manuscript",
+        "statement": "CREATE INDEX narrative_entity_manuscript IF NOT EXISTS FOR (e:NarrativeEntity) ON (e.manuscript_id)",
+        "serves": [
+            "character_arc: MATCH (c:NarrativeEntity {manuscript_id: $mid})-[:APPEARS_IN]->(s:Scene)",
+        ],
+    },
+    {
+        "name": "narrative_entity_name_key",
+        "statement": "CREATE INDEX narrative_entity_name_key IF NOT EXISTS FOR (e:NarrativeEntity) ON (e.manuscript_id, e.name_key)",
+        "serves": [
+            "character_arc: MATCH (c:NarrativeEntity {manuscript_id: $mid, name_key: $key})",
+            "character_arc: MATCH (c:NarrativeEntity {manuscript_id: $mid}) WHERE c.name_key IN $keys",
+        ],
+    },
+    {
+        "name": "event_scene",
+        "statement": "CREATE INDEX event_scene IF NOT EXISTS FOR (e:Event) ON (e.scene_id)",
+        "serves": [
+            "graph_manager: MERGE (e:Event {description: row.desc, manuscript_id: $mid, scene_id: $sid})",
+        ],
+    },
+]
+
+
+async def _backfill_name_keys(session, batch_size: int = 1000) -> int:
+    """
+    v2: entities written before name_key existed get it (same normalization as the write path).
+    """
+    total = 0
+    while True:
+        result = await session.run("""
+            MATCH (e:NarrativeEntity) WHERE e.name_key IS NULL AND e.name IS NOT NULL
+            RETURN elementId(e) AS id, e.name AS name LIMIT $limit
+        """, limit=batch_size)
+        rows = [{"id": r["id"], "key": normalize_name(r["name"])} for r in await result.data()]
+        if not rows:
+            return total
+        await (await session.run("""
+            UNWIND $rows AS row
+            MATCH (e) WHERE elementId(e) = row.id
+            SET e.name_key = row.key
+        """, rows=rows)).consume()
+        total += len(rows)
+
+async def _rekey_titled_names(session, batch_size: int = 1000) -> int:
+    """
+    v3: name_key keeps titles ("Mr. Smith" -> "mr smith", was "smith"). Every entity
+    is re-keyed; only keys that changed are written.
+    """
+    # Re-keying never changes name/manuscript_id, so the page order is stable across batches
+    total, skip = 0, 0
+    while True:
+        result = await session.run("""
+            MATCH (e:NarrativeEntity) WHERE e.name IS NOT NULL
+            RETURN elementId(e) AS id, e.name AS name, e.name_key AS key
+            ORDER BY e.manuscript_id, e.name SKIP $skip LIMIT $limit
+        """, skip=skip, limit=batch_size)
+        records = await result.data()
+        if not records:
+            return total
+        skip += len(records)
+        rows = [{"id": r["id"], "key": normalize_name(r["name"])} for r in records
+                if normalize_name(r["name"]) != r["key"]]
+        if rows:
+            await (await session.run("""
+                UNWIND $rows AS row
+                MATCH (e) WHERE elementId(e) = row.id
+                SET e.name_key = row.key
+            """, rows=rows)).consume()
+        total += len(rows)
+
+async def _unlink_cross_paragraph_scenes(session) -> int:
+    """
+    v4: NEXT_SCENE used to link scenes by chunk index alone, so chunk i of every
+    paragraph pointed at chunk i+1 of every other one. Drops the links between
+    scenes of different paragraphs ("0_2" -> "1_3").
+    """
+    result = await session.run("""
+        MATCH (p:Scene)-[r:NEXT_SCENE]->(s:Scene)
+        WITH r, split(p.paragraph_id, '_') AS a, split(s.paragraph_id, '_') AS b
+        WHERE a[..-1] <> b[..-1]
+        DELETE r
+        RETURN count(*) AS removed
+    """)
+    record = await result.single()
+    return record["removed"] if record else 0
+
+# version -> (name, coroutine(session) returning the number of nodes touched)
+MIGRATIONS = {
+    2: ("backfill_name_keys", _backfill_name_keys),
+    3: ("rekey_titled_names", _rekey_titled_names),
+    4: ("unlink_cross_paragraph_scenes", _unlink_cross_paragraph_scenes),
+}
+
+
+async def _read_version(session) -> int:
+    result = await session.run("MATCH (v:SchemaVersion {id: 'storygraph'}) RETURN v.version AS version")
+    record = await result.single()
+    return record["version"] if record else 0
+
+
+async def _apply(session) -> List[Dict]:
+    report = []
+    applied = await _read_version(session)
+    for item in SCHEMA_ITEMS:
+        entry = {"name": item["name"], "serves": item["serves"], "status": "ok"}
+        try:
+            await (await session.run(item["statement"])).consume()
+        except Exception as e:
+            if not item.get("fallback"):
+                entry["status"] = f"failed: {e}"
+            else:
+                # Usually pre-existing duplicates; a plain index still removes the label scan
+                await (await session.run(item["fallback"])).consume()
+                entry["status"] = f"index only (constraint failed: {e})"
+        report.append(entry)
+
+    for version in sorted(v for v in MIGRATIONS if v > applied):
+        name, migrate = MIGRATIONS[version]
+        touched = await migrate(session)
+        report.append({"name": f"migration v{version}: {name}", "serves": [], "status": f"ok ({touched} nodes)"})
+
+    await (await session.run("""
+        MERGE (v:SchemaVersion {id: 'storygraph'})
+        SET v.version = $version, v.applied_at = timestamp()
+    """, version=SCHEMA_VERSION)).consume()
+    return report
+
+
+async def apply_schema(driver) -> List[Dict]:
+    """
+    Creates all constraints/indexes and records SCHEMA_VERSION. Safe to run repeatedly.
+    Returns one report entry per schema item, listing the queries it speeds up.
+    """
+    async with driver.session() as session:
+        return await _apply(session)
+
+
+async def current_version(driver) -> int:
+    async with driver.session() as session:
+        return await _read_version(session)
+
+
+def print_report(report: List[Dict]):
+    print(f"🗂️ Schema v{SCHEMA_VERSION}:")
+    for entry in report:
+        print(f"  • {entry['name']}: {entry['status']}")
+        for query in entry["serves"]:
+            print(f"      speeds up {query}")
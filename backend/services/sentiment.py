@@ -0,0 +1,194 @@
+"""
+Scene sentiment engine.
+
+Scores are computed when a scene is written (and by bulk recompute) and stored on
+the Scene node: sentiment_score, text_polarity, negative_hits, positive_hits and
+sentiment_hash (text + lexicon signature, so a lexicon change invalidates it).
+
+A score is TextBlob polarity, overridden by the trigger heuristic the arc chart has
+always used: any negative trigger forces -0.8, otherwise any positive trigger forces
++0.8. Triggers match as substrings, like the original `x in text` checks ("war" fires
+inside "warm"). Each lexicon is compiled into ONE regex that finds both kinds of
+trigger in a single pass, and TextBlob only runs for texts without a trigger hit (its
+polarity would be overridden anyway; text_polarity is stored as null for those).
+
+Batches are scored into NumPy arrays and smoothing is an array operation.
+Manuscripts can extend or replace the default lexicon.
+"""
+import hashlib
+import json
+import re
+from typing import Dict, List, Optional
+
+import numpy as np
+from textblob import TextBlob
+
+NEGATIVE_TRIGGERS = ["misery", "freezing", "frozen", "cold", "dead", "death", "pain", "sad", "despair", "fear", "anxious", "starving", "hungry", "dark", "alone", "weeping", "cry", "suffering", "struggle", "striving", "strived"]
+POSITIVE_TRIGGERS = ["warm", "comfort", "happy", "peace", "love", "beautiful", "bright", "awed", "dream", "vision", "hope", "light", "celestial", "glory", "joy", "rejoiced"]
+TRIGGER_SCORE = 0.8
+ARC_THRESHOLD = 0.4
+SMOOTHING_WINDOW = 3
+
+
+class Lexicon:
+    def __init__(self, negative: List[str], positive: List[str], trigger_score: float = TRIGGER_SCORE):
+        self.negative = sorted({w.lower() for w in negative if w.strip()})
+        self.positive = sorted({w.lower() for w in positive if w.strip()})
+        self.trigger_score = trigger_score
+        self.signature = hashlib.sha1(
+            json.dumps([self.negative, self.positive, trigger_score]).encode("utf-8")
+        ).hexdigest()[:12]
+
+        # Substring semantics, like the original `x in text_lower` checks. The lookahead
+        # tries every position, taking the longest trigger that starts there; triggers
+        # inside a found one ("war" in "warm") are added from `contained`.
+        words = sorted({*self.negative, *self.positive}, key=len, reverse=True)
+        self.pattern = re.compile(f"(?=({'|'.join(map(re.escape, words))}))") if words else None
+        self._contained = {w: [o for o in words if o in w] for w in words}
+        self._negative_set = set(self.negative)
+
+    def hits(self, text: str):
+        if self.pattern is None:
+            return [], []
+        found = {w for match in set(self.pattern.findall(text.lower())) for w in self._contained[match]}
+        negative = sorted(w for w in found if w in self._negative_set)
+        positive = sorted(w for w in found if w not in self._negative_set)
+        return negative, positive
+
+    def to_dict(self) -> dict:
+        return {"negative": self.negative, "positive": self.positive, "trigger_score": self.trigger_score}
+
+DEFAULT_LEXICON = Lexicon(NEGATIVE_TRIGGERS, POSITIVE_TRIGGERS)
+
+
+def text_hash(text: str, lexicon: Lexicon = DEFAULT_LEXICON) -> str:
+    return hashlib.sha1(f"{lexicon.signature}\x00{text}".encode("utf-8")).hexdigest()
+
+def score_texts(texts: List[str], lexicon: Lexicon = DEFAULT_LEXICON) -> dict:
+    """
+    Scores a batch. Returns arrays "score" and "polarity" (NaN where TextBlob was
+    skipped) plus per-text "negative_hits" / "positive_hits" lists.
+    """
+    hits = [lexicon.hits(text) for text in texts]
+    negative_any = np.fromiter((bool(neg) for neg, _ in hits), dtype=bool, count=len(texts))
+    positive_any = np.fromiter((bool(pos) for _, pos in hits), dtype=bool, count=len(texts))
+
+    polarity = np.full(len(texts), np.nan)
+    for i in np.flatnonzero(~(negative_any | positive_any)):
+        polarity[i] = TextBlob(texts[i]).sentiment.polarity
+
+    score = np.where(negative_any, -lexicon.trigger_score,
+                     np.where(positive_any, lexicon.trigger_score, polarity))
+    return {
+        "score": score,
+        "polarity": polarity,
+        "negative_hits": [neg for neg, _ in hits],
+        "positive_hits": [pos for _, pos in hits],
+    }
+
+def score_text(text: str, lexicon: Lexicon = DEFAULT_LEXICON) -> dict:
+    batch = score_texts([text], lexicon)
+    polarity = batch["polarity"][0]
+    return {
+        "score": float(batch["score"][0]),
+        "polarity": None if np.isnan(polarity) else float(polarity),
+        "negative_hits": batch["negative_hits"][0],
+        "positive_hits": batch["positive_hits"][0],
+    }
+
+def scene_text(raw_text: Optional[str], description: Optional[str] = None) -> Optional[str]:
+    # Paragraph text first, then the scene description
+    text = raw_text if raw_text and raw_text.strip() else description
+    return text if text and text.strip() else None
+
+def score_scene(raw_text: str, description: Optional[str] = None, lexicon: Lexicon = DEFAULT_LEXICON) -> Optional[dict]:
+    """
+    Sentiment for one scene. None when there is nothing to score; the arc then falls
+    back to the character's emotion label.
+    """
+    text = scene_text(raw_text, description)
+    if text is None:
+        return None
+    return {**score_text(text, lexicon), "hash": text_hash(text, lexicon)}
+
+def score_scenes(scenes: List[dict], lexicon: Lexicon = DEFAULT_LEXICON) -> List[dict]:
+    """
+    Bulk variant for [{"id", "raw_text", "description"}, ...]. Scenes with nothing to
+    score are left out.
+    """
+    texts = [(scene["id"], scene_text(scene.get("raw_text"), scene.get("description"))) for scene in scenes]
+    texts = [(sid, text) for sid, text in texts if text is not None]
+    batch = score_texts([text for _, text in texts], lexicon)
+    return [{
+        "sid": sid,
+        "score": float(batch["score"][i]),
+        "polarity": None if np.isnan(batch["polarity"][i]) else float(batch["polarity"][i]),
+        "negative_hits": batch["negative_hits"][i],
+        "positive_hits": batch["positive_hits"][i],
+        "hash": text_hash(text, lexicon),
+    } for i, (sid, text) in enumerate(texts)]
+
+def smooth(scores, window: int = SMOOTHING_WINDOW) -> np.ndarray:
+    """
+    Trailing moving average; the first points average over what exists so far.
+    """
+    scores = np.asarray(scores, dtype=float)
+    if scores.size == 0:
+        return scores
+    sums = np.cumsum(np.concatenate(([0.0], scores)))
+    ends = np.arange(1, scores.size + 1)
+    starts = np.maximum(ends - window, 0)
+    return (sums[ends] - sums[starts]) / (ends - starts)
+
+def classify_arc(scores, threshold: float = ARC_THRESHOLD) -> str:
+    scores = np.asarray(scores, dtype=float)
+    if scores.size == 0:
+        return "Insufficient Data"
+    delta = scores[-1] - scores[0]
+    if delta > threshold: return "Redemption / Rise"
+    if delta < -threshold: return "Tragedy / Fall"
+    return "Steady / Flat"
+
+
+class LexiconRegistry:
+    """
+    Per-manuscript lexicons, stored as JSON on the Manuscript node (sentiment_lexicon)
+    and cached in memory after the first load.
+    """
+
+    def __init__(self):
+        self._lexicons: Dict[str, Lexicon] = {}
+
+    def forget(self, manuscript_id: str):
+        self._lexicons.pop(manuscript_id, None)
+
+    async def ensure_loaded(self, manuscript_id: str, driver) -> Lexicon:
+        if manuscript_id in self._lexicons:
+            return self._lexicons[manuscript_id]
+        async with driver.session() as session:
+            result = await session.run(
+                "OPTIONAL MATCH (m:Manuscript {id: $mid}) RETURN m.sentiment_lexicon AS lexicon", mid=manuscript_id
+            )
+            record = await result.single()
+        stored = json.loads(record["lexicon"]) if record and record["lexicon"] else None
+        lexicon = Lexicon(**stored) if stored else DEFAULT_LEXICON
+        return self._lexicons.setdefault(manuscript_id, lexicon)
+
+    async def set_lexicon(self, manuscript_id: str, negative: List[str], positive: List[str],
+                          extend: bool = True, driver=None) -> Lexicon:
+        """
+        Extends (or replaces) the manuscript's lexicon and persists it.
+        """
+        base = await self.ensure_loaded(manuscript_id, driver)
+        if extend:
+            negative, positive = [*base.negative, *negative], [*base.positive, *positive]
+        lexicon = Lexicon(negative, positive, base.trigger_score)
+        async with driver.session() as session:
+            await session.run(
+                "MERGE (m:Manuscript {id: $mid}) SET m.sentiment_lexicon = $lexicon",
+                mid=manuscript_id, lexicon=json.dumps(lexicon.to_dict())
+            )
+        self._lexicons[manuscript_id] = lexicon
+        return lexicon
+
+lexicons = LexiconRegistry()
@@ -1,55 +1,133 @@
 import asyncio
-import time
 from .entity_extractor import EntityExtractor
+from .extraction_cache import extraction_cache
 from .graph_manager import graph_db
+from .embedding_pipeline import embedding_pipeline
+from .job_store import job_store
 
 class StoryProcessor:
+    # Rough size of the extraction prompt template, used for the tokens-saved estimate
+    PROMPT_TOKENS = 350
+
     def __init__(self):
         self.extractor = EntityExtractor()
         self.active_contexts = {}
 
-    async def process_paragraph(self, text: str, metadata: dict):
-        manuscript_id = metadata.get("manuscript_id", "default")
-        
-        # RETRY LOGIC for Rate Limits
-        max_retries = 3
-        attempt = 0
-        
-        while attempt < max_retries:
+    async def _extract_cached(self, text: str, metadata: dict, context: list, on_entity=None):
+        """
+        Returns the cached extraction for this exact chunk text, or calls the LLM
+        (streaming entities to on_entity as they are parsed, when given).
+        """
+        key = extraction_cache.make_key(text, self.extractor.model_name, self.extractor.PROMPT_VERSION)
+
+        entities = await self._lookup(key, metadata)
+        if entities is not None:
+            print(f"♻️ Cache hit for Paragraph {metadata.get('paragraph')}")
+            return entities
+
+        if on_entity:
+            entities = await self.extractor.extract_streaming(text, metadata, context, on_entity)
+        else:
+            entities = await self.extractor.extract(text, metadata, context)
+        await self._remember(key, text, entities)
+        return entities
+
+    async def _lookup(self, key: str, metadata: dict):
+        """
+        Entities this text already has: from the job store (kept for good, per
+        manuscript) or from the extraction cache (shared, LRU-bounded).
+        """
+        loop = asyncio.get_event_loop()
+        if metadata.get("fingerprint"):
+            entities = await loop.run_in_executor(
+                None, job_store.entities, metadata.get("manuscript_id", "default"), metadata["fingerprint"])
+            if entities is not None:
+                return entities
+        return await loop.run_in_executor(None, extraction_cache.get, key)
+
+    async def _remember(self, key: str, text: str, entities: dict):
+        # Empty results are usually a failed/garbled completion: don't pin those
+        if any(entities.get(kind) for kind in ("characters", "locations", "events")):
+            tokens = (len(text) + len(str(entities))) // 4 + self.PROMPT_TOKENS
+            await asyncio.get_event_loop().run_in_executor(None, extraction_cache.put, key, entities, tokens)
+
+    async def _index_scene(self, scene: dict, text: str):
+        # Semantic search is a nice-to-have: a failed embedding must not fail the scene.
+        # The scene is only queued here; the pipeline embeds it in a background batch.
+        try:
+            await embedding_pipeline.submit(scene["manuscript_id"], scene, text)
+        except Exception as e:
+            print(f"⚠️ Embedding Skipped: {e}")
+
+    async def process_batch(self, items: list):
+        """
+        Packed variant of process_paragraph for several (text, metadata) pairs of ONE
+        manuscript, in chunk order. Cache hits are reused, the misses share a single LLM
+        call, and each scene is still saved separately and in order.
+        """
+        manuscript_id = items[0][1].get("manuscript_id", "default")
+        context = self.active_contexts.get(manuscript_id, [])
+
+        # 1. Cache lookups (job store, then extraction cache)
+        keys = [extraction_cache.make_key(text, self.extractor.model_name, self.extractor.PROMPT_VERSION) for text, _ in items]
+        cached = [await self._lookup(key, metadata) for key, (_, metadata) in zip(keys, items)]
+
+        # 2. One packed call for everything that missed (ids are batch positions)
+        misses = [(str(i), text) for i, ((text, _), hit) in enumerate(zip(items, cached)) if hit is None]
+        print(f"📦 Packed extraction: {len(misses)} chunks in one call, {len(items) - len(misses)} cache hits")
+        extracted = await self.extractor.extract_batch(misses, context, manuscript_id) if misses else {}
+
+        # 3. Persist each scene separately, in order
+        results = []
+        for i, ((text, metadata), key, hit) in enumerate(zip(items, keys, cached)):
+            entities = hit if hit is not None else extracted[str(i)]
             try:
-                # 1. Get Context
-                context = self.active_contexts.get(manuscript_id, [])
-                
-                # 2. Extract (AI)
-                entities = await self.extractor.extract(text, metadata, context)
-                
-                # 3. Save to Neo4j (Bulk Optimized)
-                # We run this in a thread to keep the async loop moving
-                loop = asyncio.get_event_loop()
-                await loop.run_in_executor(None, graph_db.save_extracted_entities, entities, metadata)
-                
-                # 4. Update Memory
+                if hit is None:
+                    await self._remember(key, text, entities)
+                scene = await graph_db.save_extracted_entities(entities, metadata)
+                await self._index_scene(scene, text)
+
                 new_chars = [c['text'] for c in entities.get('characters', [])]
-                self.active_contexts[manuscript_id] = list(set(context + new_chars))[-15:] # Increased memory
-                
-                return {
+                context = list(set(context + new_chars))[-15:]
+                self.active_contexts[manuscript_id] = context
+
+                results.append({
                     "event_id": f"evt_{metadata.get('paragraph')}",
                     "entities_extracted": entities,
                     "status": "processed"
-                }
-
+                })
             except Exception as e:
-                error_str = str(e)
-                # Detect Rate Limits (429) or Overloaded Model (503)
-                if "429" in error_str or "rate_limit" in error_str.lower():
-                    attempt += 1
-                    wait_time = 20 * attempt # Linear backoff: 20s, 40s, 60s
-                    print(f"⏳ Rate Limit Hit. Cooling down for {wait_time}s... (Attempt {attempt}/{max_retries})")
-                    await asyncio.sleep(wait_time)
-                else:
-                    print(f"❌ Unrecoverable Error: {e}")
-                    return {"entities_extracted": {}, "error": error_str}
-        
-        return {"error": "Max retries exceeded"}
+                print(f"❌ Unrecoverable Error: {e}")
+                results.append({"entities_extracted": {}, "error": str(e)})
+        return results
+
+    async def process_paragraph(self, text: str, metadata: dict, on_entity=None):
+        manuscript_id = metadata.get("manuscript_id", "default")
+
+        # Rate limits (429) are absorbed by the shared limiter inside the extractor
+        try:
+            # 1. Get Context
+            context = self.active_contexts.get(manuscript_id, [])
+            
+            # 2. Extract (Cache, then AI)
+            entities = await self._extract_cached(text, metadata, context, on_entity)
+            
+            # 3. Save to Neo4j (Bulk Optimized, async driver keeps the loop moving)
+            scene = await graph_db.save_extracted_entities(entities, metadata)
+            await self._index_scene(scene, text)
+            
+            # 4. Update Memory
+            new_chars = [c['text'] for c in entities.get('characters', [])]
+            self.active_contexts[manuscript_id] = list(set(context + new_chars))[-15:] # Increased memory
+            
+            return {
+                "event_id": f"evt_{metadata.get('paragraph')}",
+                "entities_extracted": entities,
+                "status": "processed"
+            }
+
+        except Exception as e:
+            print(f"❌ Unrecoverable Error: {e}")
+            return {"entities_extracted": {}, "error": str(e)}
 
 processor = StoryProcessor()
\ No newline at end of file
@@ -0,0 +1,95 @@
+import json
+from typing import Any, Dict, List, Tuple
+from .json_repair import parse_llm_json
+
+class IncrementalEntityParser:
+    """
+    Pulls entities out of a streamed extraction completion as soon as each array
+    element closes, e.g. the first {"text": "Portia", ...} inside "characters": [...]
+    is returned while the model is still writing the rest of the JSON.
+
+    feed() scans only the newly received text and keeps just the unfinished element,
+    so the total work is linear in the completion length no matter how small the
+    streamed pieces are.
+    """
+
+    ENTITY_KINDS = ("characters", "locations", "events")
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.started = False        # Prose/code fences before the first '{' are ignored
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.string_start = 0
+        self.last_key = None        # Last string closed at depth 1 (an object key)
+        self.array_kind = None      # Entity kind of the array we are inside, if any
+        self.element_start = None
+
+    def feed(self, piece: str) -> List[Tuple[str, Dict[str, Any]]]:
+        self.buffer += piece
+        found = []
+        buf = self.buffer
+
+        for i in range(self.pos, len(buf)):
+            char = buf[i]
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == '\\':
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.depth == 1:
+                        self.last_key = buf[self.string_start:i]
+                continue
+
+            if not self.started:
+                if char == '{':
+                    self.started = True
+                    self.depth = 1
+                continue
+
+            if char == '"':
+                self.in_string = True
+                self.string_start = i + 1
+            elif char in '{[':
+                if char == '[' and self.depth == 1:
+                    self.array_kind = self.last_key if self.last_key in self.ENTITY_KINDS else None
+                elif char == '{' and self.depth == 2 and self.array_kind:
+                    self.element_start = i
+                self.depth += 1
+            elif char in '}]':
+                self.depth -= 1
+                if char == '}' and self.depth == 2 and self.element_start is not None:
+                    element = self._load(buf[self.element_start:i + 1])
+                    if element:
+                        found.append((self.array_kind, element))
+                    self.element_start = None
+                elif char == ']' and self.depth == 1:
+                    self.array_kind = None
+
+        # Drop text we no longer need, keeping only an unfinished element or key.
+        # The buffer stays about one element long, so appends never get quadratic.
+        keep = len(buf)
+        if self.element_start is not None:
+            keep = self.element_start
+        elif self.in_string:
+            keep = self.string_start
+        self.buffer = buf[keep:]
+        self.pos = len(buf) - keep
+        if self.element_start is not None:
+            self.element_start -= keep
+        if self.in_string:
+            self.string_start -= keep
+        return found
+
+    @staticmethod
+    def _load(fragment: str):
+        try:
+            value = json.loads(fragment)
+        except json.JSONDecodeError:
+            value = parse_llm_json(fragment).value  # e.g. single quotes or unquoted keys
+        return value if isinstance(value, dict) and value.get("text") else None
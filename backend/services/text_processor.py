@@ -1,85 +1,400 @@
 import asyncio
+import hashlib
+import os
 import re
-from typing import Dict, Any, List
+from itertools import chain, islice
+from typing import Dict, Any, AsyncIterator, Iterable, Iterator, List, Optional, Tuple
 from fastapi import WebSocket
+from starlette.websockets import WebSocketState
+from .job_store import job_store
+from .tokens import count_tokens
+
+Span = Tuple[int, int]
+
+# Chunks pulled per worker-thread hop when a file is decoded and chunked off the loop
+STREAM_BATCH = 64
+
+PARAGRAPH_BREAK = re.compile(r'(?:\r\n|\r|\n)[ \t]*(?:\r\n|\r|\n)')
+LINE_BREAK = re.compile(r'\r\n|\r|\n')
+SENTENCE_BREAK = re.compile(r'[.!?]\s+')  # The first char (the period) stays with its sentence
+
+def _trim(text: str, start: int, end: int) -> Span:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+def _pieces(text: str, start: int, end: int, separator: re.Pattern) -> Iterator[Span]:
+    # Non-blank stretches of text[start:end] between separator matches, trimmed
+    keep = 1 if separator is SENTENCE_BREAK else 0
+    pos = start
+    for match in separator.finditer(text, start, end):
+        piece = _trim(text, pos, match.start() + keep)
+        if piece[0] < piece[1]:
+            yield piece
+        pos = match.end()
+    piece = _trim(text, pos, end)
+    if piece[0] < piece[1]:
+        yield piece
+
+def _cut(text: str, start: int, limit: int) -> Span:
+    # (end of the piece, start of the rest) for a piece of text[start:] ending by limit
+    cut = None
+    for cut in SENTENCE_BREAK.finditer(text, start, limit + 1):
+        pass
+    if cut is not None and cut.start() > start:
+        return cut.start() + 1, cut.end()
+    space = text.rfind(" ", start + 1, limit)
+    return (space, space) if space > 0 else (limit, limit)
+
+def _last_match(pattern: re.Pattern, text: str) -> Optional[re.Match]:
+    match = None
+    for match in pattern.finditer(text):
+        pass
+    return match
+
+async def _aiter(items: Iterable) -> AsyncIterator:
+    for item in items:
+        yield item
+
+async def _threaded(items: Iterator, batch: int = STREAM_BATCH) -> AsyncIterator:
+    # The iterator only ever runs in one thread at a time, so generators are safe here
+    while True:
+        chunk_batch = await asyncio.to_thread(lambda: list(islice(items, batch)))
+        if not chunk_batch:
+            return
+        for item in chunk_batch:
+            yield item
+
 
 class TextStreamProcessor:
     def __init__(self):
-        self.processing_queue = asyncio.Queue()
+        # --- BACKPRESSURE LIMITS ---
+        # Jobs count against the caps from the moment they are queued until the
+        # worker releases them, so chunks waiting in a manuscript lane are included.
+        self.MAX_QUEUED_CHUNKS = int(os.getenv("MAX_QUEUED_CHUNKS", "500"))
+        self.MAX_QUEUED_PER_MANUSCRIPT = int(os.getenv("MAX_QUEUED_PER_MANUSCRIPT", "50"))
+
+        self.processing_queue = asyncio.Queue(maxsize=self.MAX_QUEUED_CHUNKS)
+
+        # (manuscript_id, paragraph) -> fingerprint of each chunk last queued, by chunk_index.
+        # Lets a resent document queue only the chunks whose text actually changed.
+        self.fingerprints: Dict[Tuple[str, str], List[str]] = {}
+        # Same key -> (char_start, char_end) of each of those chunks
+        self.spans: Dict[Tuple[str, str], List[Span]] = {}
+        self.pending_total = 0
+        self.pending_by_manuscript: Dict[str, int] = {}
+        self._slot_freed = asyncio.Event()
         
         # --- TUNING FOR SHORT STORIES ---
         # Lowered to 200 to ensure "Little Match Girl" gets split into 5-6 scenes
         self.MIN_CHUNK_SIZE = 200 
         self.MAX_CHUNK_SIZE = 4000
 
-    def _chunk_text(self, text: str) -> List[str]:
+        # Token-budget mode (use_token_budget): chunks are filled up to this many model
+        # tokens instead of MIN_CHUNK_SIZE chars, and split rather than exceed it
+        self.token_budget: Optional[int] = None
+
+        # Streamed input is chunked in blocks of about this many chars (see stream_chunks)
+        self.STREAM_BLOCK = int(os.getenv("INGEST_STREAM_BLOCK", str(64 * 1024)))
+
+    def use_token_budget(self, tokens: int):
+        self.token_budget = tokens
+        print(f"🧮 Token-budget chunking: up to {tokens} tokens of text per chunk")
+
+    def _size(self, text: str, start: int, end: int) -> int:
+        # Chars, or model tokens in token-budget mode
+        return end - start if self.token_budget is None else count_tokens(text[start:end])
+
+    def chunk_spans(self, text: str, start: int = 0, end: int = None, fallback: bool = True) -> Iterator[Span]:
         """
-        Aggressive slicer to guarantee multiple scene generation.
+        Aggressive slicer to guarantee multiple scene generation, as (start, end) offsets
+        into text: nothing is copied, so a chunk is text[start:end].
+
+        Paragraphs (blank lines) are merged up to MIN_CHUNK_SIZE; a text with no
+        paragraph breaks is split by lines, then by sentences (unless fallback=False).
+        A paragraph longer than MAX_CHUNK_SIZE is split at sentence boundaries, so no
+        chunk ever exceeds it. In token-budget mode paragraphs are packed up to
+        token_budget tokens instead, and that is the limit nothing may exceed.
         """
-        text = text.strip()
-        if not text: return []
+        end = len(text) if end is None else end
 
-        # 1. Normalize Newlines (Handle Windows \r\n and mixed types)
-        text = text.replace('\r\n', '\n').replace('\r', '\n')
+        # 1. Paragraphs (\n, \r\n and \r all count as newlines)
+        pieces = _pieces(text, start, end, PARAGRAPH_BREAK)
+        head = list(islice(pieces, 2))
 
-        # 2. Try splitting by Double Newlines (Paragraphs)
-        raw_chunks = [p.strip() for p in text.split('\n\n') if p.strip()]
+        # 2. Fallback: If that didn't work (e.g. text is one block), split by Single Newlines
+        if len(head) <= 1 and fallback:
+            pieces = _pieces(text, start, end, LINE_BREAK)
+            head = list(islice(pieces, 2))
 
-        # 3. Fallback: If that didn't work (e.g. text is one block), split by Single Newlines
-        if len(raw_chunks) <= 1:
-            raw_chunks = [p.strip() for p in text.split('\n') if p.strip()]
+        # 3. Emergency Fallback: If still 1 chunk, split by Sentences (Periods)
+        if len(head) <= 1 and fallback:
+            pieces = _pieces(text, start, end, SENTENCE_BREAK)
+            head = list(islice(pieces, 2))
 
-        # 4. Emergency Fallback: If still 1 chunk, split by Sentences (Periods)
-        if len(raw_chunks) <= 1:
-            # Split by period followed by space, keeping the period
-            raw_chunks = re.split(r'(?<=[.!?])\s+', text)
+        # 4. Merge logic (chars: assemble into MIN_CHUNK_SIZE, never past MAX_CHUNK_SIZE;
+        #    tokens: fill up to token_budget, counting ~1 token per paragraph break)
+        current, current_size = None, 0
+        for piece_start, piece_end, piece_size in self._bounded(text, chain(head, pieces)):
+            if current is None:
+                current, current_size = (piece_start, piece_end), piece_size
+            elif self.token_budget is None and current_size + piece_size < self.MIN_CHUNK_SIZE \
+                    and piece_end - current[0] <= self.MAX_CHUNK_SIZE:
+                current = (current[0], piece_end)
+                current_size = piece_end - current[0]
+            elif self.token_budget is not None and current_size + 1 + piece_size <= self.token_budget:
+                current = (current[0], piece_end)
+                current_size += 1 + piece_size
+            else:
+                yield current
+                current, current_size = (piece_start, piece_end), piece_size
 
-        final_chunks = []
-        current_chunk = ""
+        # Add the last leftover piece
+        if current is not None:
+            yield current
+
+    def _bounded(self, text: str, pieces: Iterable[Span]) -> Iterator[Tuple[int, int, int]]:
+        """
+        Yields (start, end, size) for each piece, splitting pieces over the limit
+        (MAX_CHUNK_SIZE chars, or token_budget tokens) at the last sentence boundary
+        that fits, or the last space for a sentence that long on its own.
+        """
+        limit = self.MAX_CHUNK_SIZE if self.token_budget is None else self.token_budget
+        for start, end in pieces:
+            size = self._size(text, start, end)
+            while size > limit:
+                # Chars that should fit: the limit itself, or scaled by this piece's chars per token
+                reach = max(1, int(limit * (end - start) / size))
+                while True:
+                    piece_end, next_start = _cut(text, start, min(start + reach, end))
+                    piece_size = self._size(text, start, piece_end)
+                    if piece_size <= limit or reach == 1:
+                        break
+                    reach = max(1, int(reach * 0.9))  # Denser text than the average: back off
+                yield start, piece_end, piece_size
+                remaining = size - piece_size
+                start, end = _trim(text, next_start, end)
+                # Tokens are only re-counted once the rest looks like it fits
+                size = remaining if self.token_budget is not None and remaining > limit else self._size(text, start, end)
+            if start < end:
+                yield start, end, size
 
-        # 5. Merge logic (Assemble into MIN_CHUNK_SIZE)
-        for piece in raw_chunks:
-            # If adding this piece keeps us under the limit, merge it
-            if len(current_chunk) + len(piece) < self.MIN_CHUNK_SIZE:
-                current_chunk += "\n\n" + piece
+    def stream_chunks(self, pieces: Iterable[str]) -> Iterator[Tuple[int, int, str]]:
+        """
+        chunk_spans for text that arrives in pieces (a file read block by block), so a
+        whole novel is never one string. Yields (start, end, chunk) with offsets into
+        the whole text. Blocks are cut at their last paragraph break; the last chunk
+        of each block is carried into the next, since it may still merge with what
+        follows, which keeps the chunks the same as chunking the whole text.
+        """
+        buffer, base = "", 0
+        paragraphs = False  # Once the text has paragraph breaks, blocks never use the fallbacks
+        for piece in pieces:
+            buffer += piece
+            if len(buffer) < self.STREAM_BLOCK:
+                continue
+            cut = _last_match(PARAGRAPH_BREAK, buffer)
+            if cut is not None:
+                paragraphs = True
             else:
-                # Chunk is big enough, save it
-                if current_chunk:
-                    final_chunks.append(current_chunk.strip())
-                current_chunk = piece
-        
-        # Add the last leftover piece
-        if current_chunk:
-            final_chunks.append(current_chunk.strip())
+                # No paragraph breaks (yet): fall back to lines, then sentences
+                cut = _last_match(LINE_BREAK, buffer) or _last_match(SENTENCE_BREAK, buffer)
+            if cut is None or cut.start() == 0:
+                continue
+            spans = list(self.chunk_spans(buffer, 0, cut.start(), fallback=not paragraphs))
+            if not spans:
+                continue
+            for start, end in spans[:-1]:
+                yield base + start, base + end, buffer[start:end]
+            carry = spans[-1][0]
+            buffer, base = buffer[carry:], base + carry
+        for start, end in self.chunk_spans(buffer, fallback=not paragraphs):
+            yield base + start, base + end, buffer[start:end]
+
+    @staticmethod
+    def fingerprint(chunk: str) -> str:
+        # Whitespace-insensitive, so re-wrapping a line does not count as an edit
+        return hashlib.sha1(" ".join(chunk.split()).encode("utf-8")).hexdigest()
+
+    def _has_capacity(self, manuscript_id: str) -> bool:
+        return (
+            self.pending_total < self.MAX_QUEUED_CHUNKS
+            and self.pending_by_manuscript.get(manuscript_id, 0) < self.MAX_QUEUED_PER_MANUSCRIPT
+        )
 
-        return final_chunks
+    async def _notify(self, websocket: WebSocket, message: Dict[str, Any]):
+        if websocket is not None and websocket.client_state == WebSocketState.CONNECTED:
+            try:
+                await websocket.send_json(message)
+            except Exception as e:
+                print(f"⚠️ Could not send '{message['type']}': {e}")
 
-    async def add_to_stream(self, websocket: WebSocket, text: str, metadata: Dict[str, Any]):
+    async def _reserve_slot(self, websocket: WebSocket, manuscript_id: str):
+        """
+        Waits until both the global and the per-manuscript cap allow one more job.
+        While waiting, the WebSocket loop that called us stops reading frames, and
+        the client is told to pause with a 'throttle' message ('resume' when clear).
+        """
+        throttled = False
+        while not self._has_capacity(manuscript_id):
+            if not throttled:
+                throttled = True
+                print(f"🚦 Throttling {manuscript_id}: {self.pending_by_manuscript.get(manuscript_id, 0)} queued ({self.pending_total} total)")
+                await self._notify(websocket, {
+                    "type": "throttle",
+                    "manuscript_id": manuscript_id,
+                    "queued": self.pending_by_manuscript.get(manuscript_id, 0),
+                })
+                # A slot may have been released while we were sending: check again
+                continue
+            # No await between the capacity check and wait(), so no release is missed
+            self._slot_freed.clear()
+            await self._slot_freed.wait()
+
+        self.pending_total += 1
+        self.pending_by_manuscript[manuscript_id] = self.pending_by_manuscript.get(manuscript_id, 0) + 1
+
+        if throttled:
+            await self._notify(websocket, {"type": "resume", "manuscript_id": manuscript_id})
+
+    def release(self, job: Dict[str, Any]):
+        """
+        Called by the worker once a job is finished (or dropped) to free its slot.
+        """
+        manuscript_id = job["metadata"].get("manuscript_id", "default")
+        self.pending_total -= 1
+        remaining = self.pending_by_manuscript.get(manuscript_id, 1) - 1
+        if remaining > 0:
+            self.pending_by_manuscript[manuscript_id] = remaining
+        else:
+            self.pending_by_manuscript.pop(manuscript_id, None)
+        self._slot_freed.set()
+
+    def forget(self, metadata: Dict[str, Any]):
+        """
+        Called by the worker when a chunk's extraction failed: drops its fingerprint, so
+        sending the same text again re-queues it instead of counting it as unchanged.
+        """
+        base_para, _, index = str(metadata['paragraph']).rpartition('_')
+        fingerprints = self.fingerprints.get((metadata.get('manuscript_id', 'default'), base_para))
+        i = int(index)
+        if fingerprints and i < len(fingerprints) and fingerprints[i] == metadata.get('fingerprint'):
+            fingerprints[i] = None
+
+    async def add_to_stream(self, websocket: WebSocket, text: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Chunks the text and queues only new or modified chunks.
+        Returns the ingest plan; 'retracted' lists paragraph ids whose chunks disappeared
+        and whose scenes the caller should remove from the graph, 'moved' the unchanged
+        chunks whose offsets the caller should update (GraphManager.move_scenes).
+        """
         if not text or not text.strip():
-            return
+            spans = []
+        else:
+            print(f"📚 Analyzing Input: {len(text)} chars...")
 
-        print(f"📚 Analyzing Input: {len(text)} chars...")
+            # 1. RUN AGGRESSIVE CHUNKING (offsets only; each chunk is sliced when queued)
+            spans = list(self.chunk_spans(text))
+            print(f"✂️ Split into {len(spans)} Scenes.") # <--- Watch this log!
 
-        # 1. RUN AGGRESSIVE CHUNKING
-        chunks = self._chunk_text(text)
-        print(f"✂️ Split into {len(chunks)} Scenes.") # <--- Watch this log!
+        chunks = ((start, end, text[start:end]) for start, end in spans)
+        return await self._queue_chunks(websocket, _aiter(chunks), metadata, total=len(spans))
 
+    async def add_file_stream(self, pieces: Iterable[str], metadata: Dict[str, Any], job) -> Dict[str, Any]:
+        """
+        Bulk variant of add_to_stream: chunks text pieces as they are read and queues
+        the changed chunks with no WebSocket attached. job (an IngestJob) counts them.
+        Reading, decoding and chunking run in a worker thread, STREAM_BATCH chunks at
+        a time, so a multi-MB file never blocks the event loop while it is cut.
+        """
+        return await self._queue_chunks(None, _threaded(self.stream_chunks(pieces)), metadata, job=job)
+
+    async def _queue_chunks(self, websocket: WebSocket, chunks: AsyncIterator[Tuple[int, int, str]], metadata: Dict[str, Any],
+                            total: int = None, job=None) -> Dict[str, Any]:
+        """
+        Queues the (start, end, chunk) triples whose text changed since the last version.
+        """
         base_para = metadata.get('paragraph', 0)
-        
-        for i, chunk in enumerate(chunks):
+        manuscript_id = metadata.get('manuscript_id', 'default')
+        key = (manuscript_id, str(base_para))
+        if key not in self.fingerprints:
+            # Nothing in memory (e.g. after a restart): diff against the job store, so a
+            # shortened document still retracts its tail and shifted chunks still move
+            stored = await asyncio.to_thread(job_store.slots, manuscript_id, str(base_para))
+            if stored:
+                self.fingerprints[key] = [slot[0] if slot else None for slot in stored]
+                self.spans[key] = [(slot[1], slot[2]) if slot else None for slot in stored]
+        previous = self.fingerprints.get(key, [])
+        previous_spans = self.spans.get(key, [])
+
+        # 2. DIFF AGAINST THE LAST VERSION OF THIS DOCUMENT (chunk by chunk, as they come)
+        current, current_spans = [], []
+        plan = {"queued": 0, "unchanged": 0, "moved": []}
+
+        i = -1
+        async for start, end, chunk in chunks:
+            i += 1
+            current.append(self.fingerprint(chunk))
+            current_spans.append((start, end))
+            if i < len(previous) and previous[i] == current[i]:
+                plan["unchanged"] += 1
+                if i < len(previous_spans) and previous_spans[i] != (start, end):
+                    # Same text, shifted by an edit above it: only its offsets need updating
+                    plan["moved"].append({"paragraph": f"{base_para}_{i}", "char_start": start, "char_end": end})
+                continue
+
             chunk_metadata = metadata.copy()
             # Unique ID for the timeline: 0_0, 0_1, 0_2...
             chunk_metadata['paragraph'] = f"{base_para}_{i}" 
-            chunk_metadata['total_chunks'] = len(chunks)
+            chunk_metadata['total_chunks'] = total  # None while a file is still being read
             chunk_metadata['chunk_index'] = i
             chunk_metadata['raw_text'] = chunk  # Store raw text for sentiment analysis
+            chunk_metadata['char_start'] = start  # Offsets into the sent text, for highlighting
+            chunk_metadata['char_end'] = end
+            chunk_metadata['is_revision'] = i < len(previous)  # Scene exists; clear its old links first
+            chunk_metadata['fingerprint'] = current[i]
+
+            # Durable record first: a chunk already done in this slot (e.g. before a
+            # restart wiped the fingerprints above) is never extracted again
+            if not await asyncio.to_thread(job_store.enqueue, chunk, chunk_metadata):
+                plan["unchanged"] += 1
+                continue
             
-            print(f"📥 Queuing Scene {i+1}/{len(chunks)} ({len(chunk)} chars)")
+            await self._reserve_slot(websocket, manuscript_id)
+            print(f"📥 Queuing Scene {i+1}/{total or '?'} ({len(chunk)} chars)")
             
-            await self.processing_queue.put({
+            self.processing_queue.put_nowait({
                 "websocket": websocket,
                 "text": chunk,
-                "metadata": chunk_metadata
+                "metadata": chunk_metadata,
+                "ingest": job,
             })
+            plan["queued"] += 1
+            if job is not None:
+                job.queued += 1
+
+        self.fingerprints[key], self.spans[key] = current, current_spans
+        if not current:
+            self.fingerprints.pop(key, None)
+            self.spans.pop(key, None)
+        plan["retracted"] = [f"{base_para}_{i}" for i in range(len(current), len(previous))]
+        await asyncio.to_thread(job_store.retract, manuscript_id, plan["retracted"])
+
+        if previous:
+            print(f"🔁 Re-ingest: {plan['queued']} changed, {plan['unchanged']} unchanged, {len(plan['retracted'])} removed")
+        return plan
+
+    async def resume(self, jobs: List[Dict[str, Any]]):
+        """
+        Puts the jobs a previous run left unfinished (JobStore.resume) back on the
+        queue, with no WebSocket attached, under the usual backpressure caps.
+        """
+        for job in jobs:
+            await self._reserve_slot(None, job["metadata"].get("manuscript_id", "default"))
+            self.processing_queue.put_nowait({"websocket": None, "ingest": None, **job})
+        if jobs:
+            print(f"♻️ Resumed {len(jobs)} unfinished extraction jobs")
 
 processor = TextStreamProcessor()
\ No newline at end of file
@@ -0,0 +1,162 @@
+"""
+Materialized per-manuscript story timelines for GraphRAG.
+
+A digest keeps one structured entry per scene (step, summary, events, character
+states) and renders the timeline text once, caching it until the next change.
+GraphManager updates digests that are already in memory as each scene is saved or
+retracted; the first question about a manuscript builds its digest from the graph.
+The version is the number of scenes the digest holds.
+"""
+import time
+from typing import Dict, List, Optional
+
+TIMELINE_QUERY = """
+MATCH (m:Manuscript {id: $mid})-[:CONTAINS]->(s:Scene)
+
+// Gather Events linked to this scene
+OPTIONAL MATCH (s)-[:INCLUDES_EVENT]->(e:Event)
+
+// Gather Characters appearing in this scene
+OPTIONAL MATCH (c:Character)-[:APPEARS_IN]->(s)
+
+RETURN
+    s.id as scene_id,
+    s.sequence_index as step,
+    s.description as scene_desc,
+    collect(DISTINCT e.description) as specific_events,
+    collect(DISTINCT c.name + ' (Feeling: ' + c.emotion + ', Goal: ' + c.goal + ')') as character_states,
+    collect(DISTINCT c.name) as names
+"""
+
+def character_state(name: str, emotion: str, goal: str) -> Optional[str]:
+    # Same shape as the Cypher concatenation (which is null if any part is null)
+    if name is None or emotion is None or goal is None:
+        return None
+    return f"{name} (Feeling: {emotion}, Goal: {goal})"
+
+def timeline_header(manuscript_id: str) -> str:
+    return f"STORY TIMELINE FOR MANUSCRIPT '{manuscript_id}':\n\n"
+
+def render_scene(scene: dict, compact: bool = False) -> str:
+    """
+    One scene block of the timeline. Compact keeps only the summary and names.
+    """
+    # Default to ? if index is None
+    step = scene["step"] if scene["step"] is not None else "?"
+    parts = [f"SCENE {step}:\n", f"  Summary: {scene['summary']}\n"]
+    if compact:
+        if scene["names"]:
+            parts.append(f"  Characters: {', '.join(scene['names'])}\n")
+    else:
+        if scene["events"]:
+            parts.append(f"  Details: {', '.join(scene['events'])}\n")
+        if scene["characters"]:
+            parts.append(f"  Characters: {'; '.join(scene['characters'])}\n")
+    parts.append("\n")
+    return "".join(parts)
+
+
+class TimelineDigest:
+    def __init__(self, manuscript_id: str):
+        self.manuscript_id = manuscript_id
+        self.scenes: Dict[str, dict] = {}
+        self._text: Optional[str] = None
+
+    @property
+    def version(self) -> int:
+        return len(self.scenes)
+
+    def upsert(self, scene_id: str, step, summary, events: List[str], characters: List[str], names: List[str] = ()):
+        previous = self.scenes.get(scene_id)
+        if summary is None and previous:
+            summary = previous["summary"]  # Mirrors coalesce($desc, s.description)
+        self.scenes[scene_id] = {
+            "id": scene_id,
+            "step": step,
+            "summary": summary,
+            "events": [ev for ev in events if ev],
+            "characters": [c for c in characters if c],
+            "names": [n for n in names if n],
+        }
+        self._text = None
+
+    def remove(self, scene_ids: List[str]):
+        for scene_id in scene_ids:
+            self.scenes.pop(scene_id, None)
+        self._text = None
+
+    def text(self) -> Optional[str]:
+        if not self.scenes:
+            return None
+        if self._text is None:
+            self._text = timeline_header(self.manuscript_id) + "".join(map(render_scene, self.ordered()))
+        return self._text
+
+    def ordered(self) -> List[dict]:
+        return sorted(self.scenes.values(), key=lambda s: (s["step"] is None, s["step"] or 0))
+
+
+class TimelineDigestRegistry:
+    def __init__(self):
+        self._digests: Dict[str, TimelineDigest] = {}
+        self._writes: Dict[str, int] = {}  # Bumped on every change, loaded or not
+        self.builds = 0
+        self.hits = 0
+        self.build_seconds = 0.0
+
+    def record_scene(self, manuscript_id: str, scene_id: str, step, summary, events, characters, names=()):
+        """
+        Called after a scene's transaction commits. Digests not in memory are left
+        alone; they are built from the graph when first asked for.
+        """
+        self._writes[manuscript_id] = self._writes.get(manuscript_id, 0) + 1
+        digest = self._digests.get(manuscript_id)
+        if digest is not None:
+            digest.upsert(scene_id, step, summary, events, characters, names)
+
+    def drop_scenes(self, manuscript_id: str, scene_ids: List[str]):
+        self._writes[manuscript_id] = self._writes.get(manuscript_id, 0) + 1
+        digest = self._digests.get(manuscript_id)
+        if digest is not None:
+            digest.remove(scene_ids)
+
+    def forget(self, manuscript_id: str):
+        # Changed by another process: rebuilt from the graph on the next question
+        self._writes[manuscript_id] = self._writes.get(manuscript_id, 0) + 1
+        self._digests.pop(manuscript_id, None)
+
+    async def get(self, manuscript_id: str, driver) -> TimelineDigest:
+        digest = self._digests.get(manuscript_id)
+        if digest is not None:
+            self.hits += 1
+            return digest
+
+        start = time.perf_counter()
+        writes_before = self._writes.get(manuscript_id, 0)
+        async with driver.session() as session:
+            result = await session.run(TIMELINE_QUERY, mid=manuscript_id)
+            records = await result.data()
+
+        digest = TimelineDigest(manuscript_id)
+        for r in records:
+            digest.upsert(r["scene_id"], r["step"], r["scene_desc"], r["specific_events"], r["character_states"], r["names"])
+
+        # A scene saved while we were reading may be missing: serve this build, cache the next
+        if self._writes.get(manuscript_id, 0) == writes_before and records:
+            self._digests[manuscript_id] = digest
+        self.builds += 1
+        self.build_seconds += time.perf_counter() - start
+        return digest
+
+    def stats(self) -> dict:
+        lookups = self.builds + self.hits
+        return {
+            "manuscripts": len(self._digests),
+            "builds": self.builds,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "avg_build_ms": round(self.build_seconds / self.builds * 1000, 2) if self.builds else 0.0,
+            "versions": {mid: d.version for mid, d in self._digests.items()},
+        }
+
+timeline_digests = TimelineDigestRegistry()
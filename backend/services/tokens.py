@@ -0,0 +1,96 @@
+# Token accounting for prompt budgeting and token-budget chunking.
+#
+# count_tokens uses a local tokenizer when tiktoken (and its encoding) is available;
+# cl100k_base is close to the Llama 3 vocabulary. Otherwise, and always for the cheap
+# estimate_tokens, it is chars / chars_per_token. The ratio starts at ~4 chars/token
+# (Llama tokenizers on English prose) and is calibrated from the prompt token counts
+# the API reports back (observe), so it converges on the real model's tokenizer.
+#
+# tiktoken fetches its encoding file on first use. The server calls load() at startup,
+# off the event loop, so an offline host never stalls a request on network timeouts.
+import asyncio
+import os
+import threading
+from typing import Optional
+
+try:
+    import tiktoken
+except ImportError:  # Optional: the calibrated estimator is used instead
+    tiktoken = None
+
+CHARS_PER_TOKEN = float(os.getenv("TOKEN_CHARS_PER_TOKEN", "4.0"))
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+# Reported prompt tokens needed before the observed ratio replaces the default
+CALIBRATION_MIN_TOKENS = 5000
+
+
+class TokenCounter:
+    def __init__(self, chars_per_token: float = CHARS_PER_TOKEN):
+        self.chars_per_token = chars_per_token
+        self._observed_chars = 0
+        self._observed_tokens = 0
+        self._encoding = None
+        self._encoding_failed = tiktoken is None
+        self._lock = threading.Lock()
+
+    def _tokenizer(self):
+        if self._encoding is None and not self._encoding_failed:
+            try:
+                self._encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+            except Exception as e:
+                # e.g. the encoding file cannot be downloaded on an offline host
+                print(f"⚠️ Tokenizer unavailable ({e}); using the calibrated estimator")
+                self._encoding_failed = True
+        return self._encoding
+
+    async def load(self):
+        """
+        Loads the tokenizer in a worker thread and logs which counter is active.
+        """
+        if await asyncio.to_thread(self._tokenizer) is not None:
+            print(f"🔢 Token counter: tiktoken ({TOKENIZER_ENCODING})")
+        else:
+            print(f"🔢 Token counter: estimator ({self.chars_per_token:.1f} chars/token until calibrated from API usage)")
+
+    def estimate(self, text: str) -> int:
+        if not text:
+            return 0
+        return int(len(text) / self.chars_per_token) + 1
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        encoding = self._tokenizer()
+        if encoding is None:
+            return self.estimate(text)
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def observe(self, chars: int, tokens: Optional[int]):
+        """
+        Records the prompt token count the API reported for a prompt of `chars` chars.
+        """
+        if not tokens or chars <= 0:
+            return
+        with self._lock:
+            self._observed_chars += chars
+            self._observed_tokens += tokens
+            if self._observed_tokens >= CALIBRATION_MIN_TOKENS:
+                # Clamped, so one odd response cannot wreck every budget
+                self.chars_per_token = min(6.0, max(2.0, self._observed_chars / self._observed_tokens))
+
+    def stats(self) -> dict:
+        return {
+            "mode": "tokenizer" if self._tokenizer() is not None else "estimator",
+            "encoding": TOKENIZER_ENCODING if self._encoding is not None else None,
+            "chars_per_token": round(self.chars_per_token, 3),
+            "calibrated": self._observed_tokens >= CALIBRATION_MIN_TOKENS,
+            "observed_tokens": self._observed_tokens,
+        }
+
+token_counter = TokenCounter()
+
+def estimate_tokens(text: str) -> int:
+    return token_counter.estimate(text)
+
+def count_tokens(text: str) -> int:
+    return token_counter.count(text)
@@ -0,0 +1,241 @@
+"""
+Local vector index for scene and event embeddings, one per manuscript.
+
+Layout in VECTOR_INDEX_DIR, per manuscript:
+- <name>.f32    float32 rows of unit-length embeddings, appended as scenes are ingested
+                and memory-mapped for search (top-k by NumPy dot product)
+- <name>.jsonl  a header line ({"dim", "model"}) then one line per row
+                ({"scene_id", "kind", "step", "text"}) or per dropped scene ({"drop"})
+
+A re-ingested scene appends fresh rows and masks its old ones; dropped rows are
+reclaimed by compaction once they outnumber the live ones. Vectors are written
+before their metadata, so a crash can only leave unreferenced bytes, which the next
+load trims. Search never touches Neo4j.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", str(Path(__file__).resolve().parent.parent / ".cache" / "vectors"))
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+
+class VectorIndex:
+    def __init__(self, base_path: str, model: str):
+        self.vectors_path = base_path + ".f32"
+        self.meta_path = base_path + ".jsonl"
+        self.model = model
+        self.dim: Optional[int] = None
+        self.rows: List[dict] = []
+        self.alive: List[bool] = []
+        self.scene_rows: Dict[str, List[int]] = {}
+        self._matrix = None
+        self._mask = None
+        self._kind_masks: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    @property
+    def live_rows(self) -> int:
+        return sum(len(rows) for rows in self.scene_rows.values())
+
+    def _load(self):
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path, encoding="utf-8") as f:
+            header = json.loads(f.readline() or "{}")
+            if header.get("model") != self.model:
+                # Embeddings from another model are not comparable: start over
+                self._reset()
+                return
+            self.dim = header["dim"]
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # Torn last line
+                if "drop" in entry:
+                    self._forget(entry["drop"])
+                else:
+                    self._remember(entry)
+
+        # Trim rows whose metadata never made it to disk (and vice versa)
+        stored = os.path.getsize(self.vectors_path) // (4 * self.dim) if os.path.exists(self.vectors_path) else 0
+        if stored < len(self.rows):
+            for row in range(stored, len(self.rows)):
+                self.alive[row] = False
+            self.scene_rows = {sid: [r for r in rows if r < stored] for sid, rows in self.scene_rows.items()}
+            del self.rows[stored:], self.alive[stored:]
+        elif stored > len(self.rows):
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(len(self.rows) * 4 * self.dim)
+
+    def _reset(self):
+        for path in (self.vectors_path, self.meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _remember(self, entry: dict):
+        row = len(self.rows)
+        self.rows.append(entry)
+        self.alive.append(True)
+        self.scene_rows.setdefault(entry["scene_id"], []).append(row)
+
+    def _forget(self, scene_id: str):
+        for row in self.scene_rows.pop(scene_id, []):
+            self.alive[row] = False
+
+    def add_scene(self, scene_id: str, items: List[dict], vectors: np.ndarray):
+        """
+        Appends one scene's rows (items[i] describes vectors[i]), replacing any rows it had.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        with self._lock:
+            new_file = self.dim is None
+            if new_file:
+                self.dim = vectors.shape[1]
+                os.makedirs(os.path.dirname(self.meta_path), exist_ok=True)
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self.meta_path, "a", encoding="utf-8") as f:
+                if new_file:
+                    f.write(json.dumps({"dim": self.dim, "model": self.model}) + "\n")
+                if scene_id in self.scene_rows:
+                    f.write(json.dumps({"drop": scene_id}) + "\n")
+                    self._forget(scene_id)
+                for item in items:
+                    entry = {"scene_id": scene_id, **item}
+                    f.write(json.dumps(entry) + "\n")
+                    self._remember(entry)
+            self._matrix = self._mask = None
+            self._kind_masks = {}
+
+    def drop_scenes(self, scene_ids: List[str]):
+        with self._lock:
+            dropped = [sid for sid in scene_ids if sid in self.scene_rows]
+            if not dropped:
+                return
+            with open(self.meta_path, "a", encoding="utf-8") as f:
+                for scene_id in dropped:
+                    f.write(json.dumps({"drop": scene_id}) + "\n")
+                    self._forget(scene_id)
+            self._mask = None
+            if len(self.rows) - self.live_rows > max(self.live_rows, 256):
+                self._compact()
+
+    def _compact(self):
+        keep = [row for row, alive in enumerate(self.alive) if alive]
+        matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(len(self.rows), self.dim))[keep]
+        entries = [self.rows[row] for row in keep]
+
+        # Rewrite both files next to the originals, then swap them in
+        with open(self.vectors_path + ".tmp", "wb") as f:
+            f.write(np.ascontiguousarray(matrix).tobytes())
+        with open(self.meta_path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(json.dumps({"dim": self.dim, "model": self.model}) + "\n")
+            f.writelines(json.dumps(entry) + "\n" for entry in entries)
+        os.replace(self.vectors_path + ".tmp", self.vectors_path)
+        os.replace(self.meta_path + ".tmp", self.meta_path)
+        self.rows, self.alive, self.scene_rows = [], [], {}
+        for entry in entries:
+            self._remember(entry)
+        self._matrix = self._mask = None
+        self._kind_masks = {}
+
+    def search(self, query: np.ndarray, k: int = 5, kinds=None) -> List[dict]:
+        with self._lock:
+            if not self.rows or not self.live_rows:
+                return []
+            if self._matrix is None:
+                self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(len(self.rows), self.dim))
+            if self._mask is None:
+                self._mask = np.array(self.alive, dtype=bool)
+            mask, matrix, rows = self._mask, self._matrix, self.rows
+            for kind in kinds or ():
+                if kind not in self._kind_masks or len(self._kind_masks[kind]) != len(rows):
+                    self._kind_masks[kind] = np.array([row["kind"] == kind for row in rows], dtype=bool)
+            if kinds:
+                mask = mask & np.logical_or.reduce([self._kind_masks[kind] for kind in kinds])
+
+        query = np.asarray(query, dtype=np.float32)
+        scores = matrix @ (query / max(float(np.linalg.norm(query)), 1e-12))
+        scores = np.where(mask, scores, -np.inf)
+        k = min(k, int(mask.sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{**rows[i], "score": float(scores[i])} for i in top]
+
+
+class VectorIndexRegistry:
+    def __init__(self, directory: str = VECTOR_INDEX_DIR, embedder=None, model: str = EMBEDDING_MODEL):
+        self.directory = directory
+        self.model = model
+        self._embedder = embedder
+        self._indexes: Dict[str, VectorIndex] = {}
+
+    @property
+    def embedder(self):
+        # Loaded on first use: importing sentence-transformers is slow and optional
+        if self._embedder is None:
+            from langchain_huggingface import HuggingFaceEmbeddings
+            self._embedder = HuggingFaceEmbeddings(model_name=self.model)
+        return self._embedder
+
+    def index_for(self, manuscript_id: str) -> VectorIndex:
+        index = self._indexes.get(manuscript_id)
+        if index is None:
+            # Manuscript ids come from URLs: keep them readable but filesystem-safe
+            safe = re.sub(r"[^A-Za-z0-9_.-]", "_", manuscript_id)[:64]
+            digest = hashlib.sha1(manuscript_id.encode("utf-8")).hexdigest()[:8]
+            index = self._indexes[manuscript_id] = VectorIndex(os.path.join(self.directory, f"{safe}-{digest}"), self.model)
+        return index
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.embedder.embed_documents(texts), dtype=np.float32)
+
+    @staticmethod
+    def scene_items(scene: dict, raw_text: str) -> List[dict]:
+        # One row for the scene's own text and one per extracted event
+        items = [{"kind": "scene", "step": scene["step"], "text": raw_text or scene["summary"] or ""}]
+        items += [{"kind": "event", "step": scene["step"], "text": desc} for desc in scene["events"]]
+        return [item for item in items if item["text"]]
+
+    def _index_scene(self, manuscript_id: str, scene: dict, raw_text: str):
+        items = self.scene_items(scene, raw_text)
+        if items:
+            self.index_for(manuscript_id).add_scene(scene["scene_id"], items, self.embed([i["text"] for i in items]))
+
+    async def index_scene(self, manuscript_id: str, scene: dict, raw_text: str):
+        # Embedding is CPU-bound: keep it off the event loop
+        await asyncio.to_thread(self._index_scene, manuscript_id, scene, raw_text)
+
+    async def drop_scenes(self, manuscript_id: str, scene_ids: List[str]):
+        await asyncio.to_thread(self.index_for(manuscript_id).drop_scenes, scene_ids)
+
+    def _search(self, manuscript_id: str, text: str, k: int, kinds):
+        index = self.index_for(manuscript_id)
+        if not index.live_rows:
+            return []
+        query = np.asarray(self.embedder.embed_query(text), dtype=np.float32)
+        return index.search(query, k, kinds)
+
+    async def search(self, manuscript_id: str, text: str, k: int = 5, kinds=None) -> List[dict]:
+        return await asyncio.to_thread(self._search, manuscript_id, text, k, kinds)
+
+    def stats(self) -> dict:
+        return {
+            mid: {"rows": len(index.rows), "live_rows": index.live_rows, "scenes": len(index.scene_rows), "dim": index.dim}
+            for mid, index in self._indexes.items()
+        }
+
+vector_indexes = VectorIndexRegistry()
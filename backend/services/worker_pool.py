@@ -0,0 +1,101 @@
+import asyncio
+import os
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Set
+from .tokens import estimate_tokens
+
+Job = Dict[str, Any]
+
+
+class ExtractionWorkerPool:
+    """
+    Runs N extraction workers over the shared processing queue.
+
+    Jobs are routed into one lane per manuscript. A lane is owned by at most one
+    worker at a time, so chunks of the same manuscript are applied strictly in the
+    order they were queued (which is chunk_index order), while different
+    manuscripts are processed in parallel.
+
+    The handler always receives a list of consecutive jobs from one lane. With
+    batch_tokens > 0, a worker packs as many queued chunks as fit in that input
+    token budget into one call; otherwise every list holds a single job.
+    """
+
+    def __init__(self, queue: asyncio.Queue, handler: Callable[[List[Job]], Awaitable[Any]], size: int = None, batch_tokens: int = None):
+        self.queue = queue
+        self.handler = handler
+        self.size = max(1, size or int(os.getenv("EXTRACTION_WORKERS", "4")))
+        self.batch_tokens = batch_tokens if batch_tokens is not None else int(os.getenv("EXTRACTION_BATCH_TOKENS", "0"))
+
+        # After this many jobs a busy manuscript goes to the back of the line,
+        # so one pasted novel cannot starve everyone else when lanes > workers.
+        self.MAX_BURST = int(os.getenv("EXTRACTION_MAX_BURST", "8"))
+
+        self._lanes: Dict[str, Deque[Job]] = {}
+        self._scheduled: Set[str] = set()  # Manuscripts that are ready or owned by a worker
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks.append(asyncio.create_task(self._dispatch()))
+        for n in range(self.size):
+            self._tasks.append(asyncio.create_task(self._worker(n)))
+        print(f"⚙️ Worker Pool: {self.size} workers online and listening to queue...")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def _take_batch(self, lane: Deque[Job]) -> List[Job]:
+        batch = [lane.popleft()]
+        if self.batch_tokens <= 0:
+            return batch
+
+        budget = self.batch_tokens - estimate_tokens(batch[0]["text"])
+        while lane and estimate_tokens(lane[0]["text"]) <= budget:
+            job = lane.popleft()
+            budget -= estimate_tokens(job["text"])
+            batch.append(job)
+        return batch
+
+    async def _dispatch(self):
+        """
+        Moves jobs from the shared queue into their manuscript's lane.
+        """
+        while True:
+            job = await self.queue.get()
+            mid = job["metadata"].get("manuscript_id", "default")
+
+            self._lanes.setdefault(mid, deque()).append(job)
+            if mid not in self._scheduled:
+                self._scheduled.add(mid)
+                self._ready.put_nowait(mid)
+
+    async def _worker(self, n: int):
+        while True:
+            mid = await self._ready.get()
+            lane = self._lanes[mid]
+
+            handled = 0
+            while lane and handled < self.MAX_BURST:
+                batch = self._take_batch(lane)
+                try:
+                    await self.handler(batch)
+                except Exception as e:
+                    print(f"❌ Worker {n} Error: {e}")
+                finally:
+                    # Mark jobs as done so the queue knows
+                    for _ in batch:
+                        self.queue.task_done()
+                handled += len(batch)
+
+            if lane:
+                # Still has work: yield the lane to the next worker in line
+                self._ready.put_nowait(mid)
+            else:
+                del self._lanes[mid]
+                self._scheduled.discard(mid)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Run from anywhere: services/ is imported the way main.py imports it
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,57 @@
+import pytest
+
+from services.alias_index import AliasIndex, normalize_name
+
+
+def resolve_all(*names):
+    index = AliasIndex()
+    return [index.resolve(name) for name in names]
+
+
+@pytest.mark.parametrize("first, second", [
+    ("Mr. Smith", "Mrs. Smith"),
+    ("Mr. Bennet", "Mrs. Bennet"),
+    ("King Henry", "Prince Henry"),
+    ("Lady Macbeth", "Queen Macbeth"),
+])
+def test_different_titles_stay_different_characters(first, second):
+    assert resolve_all(first, second) == [first, second]
+    assert resolve_all(second, first) == [second, first]
+
+
+@pytest.mark.parametrize("names", [
+    ("Bassanio", "Lord Bassanio", "Bassanio's"),
+    ("Lord Bassanio", "Bassanio", "Bassanio's"),
+    ("Little Match Girl", "Match Girl"),
+    ("Match Girl", "Little Match Girl"),
+])
+def test_one_character_whichever_name_comes_first(names):
+    assert len(set(resolve_all(*names))) == 1
+
+
+def test_untitled_character_takes_only_one_title():
+    assert resolve_all("Smith", "Mr. Smith", "Mrs. Smith") == ["Smith", "Smith", "Mrs. Smith"]
+
+
+def test_titles_are_kept_in_the_key():
+    assert normalize_name("The Lord Bassanio's") == "lord bassanio"
+    assert normalize_name("Mrs. Smith") == "mrs smith"
+    assert normalize_name("The King") == "king"
+
+
+def test_bare_name_resolves_to_the_only_titled_character():
+    assert resolve_all("Mr. Smith", "Smith") == ["Mr. Smith", "Mr. Smith"]
+
+
+def test_bare_name_is_ambiguous_between_titles():
+    assert resolve_all("Mr. Smith", "Mrs. Smith", "Smith") == ["Mr. Smith", "Mrs. Smith", "Smith"]
+    assert resolve_all("King Henry", "Prince Henry", "Henry") == ["King Henry", "Prince Henry", "Henry"]
+
+
+def test_same_title_matches_by_surname():
+    assert resolve_all("Mr. John Smith", "Mr. Smith") == ["Mr. John Smith", "Mr. John Smith"]
+
+
+def test_fuzzy_match_does_not_cross_titles():
+    assert resolve_all("Bassanio", "Basanio") == ["Bassanio", "Bassanio"]
+    assert resolve_all("Mr. Smith", "Mrs. Smyth") == ["Mr. Smith", "Mrs. Smyth"]
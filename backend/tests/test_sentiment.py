@@ -0,0 +1,25 @@
+from services.sentiment import DEFAULT_LEXICON, Lexicon, score_text
+
+
+def test_triggers_match_as_substrings():
+    lexicon = Lexicon(negative=["war"], positive=[])
+    assert lexicon.hits("a warm evening") == (["war"], [])
+    assert lexicon.hits("the warrior slept") == (["war"], [])
+
+
+def test_trigger_inside_a_longer_trigger_still_fires():
+    # Same as the original any(word in text) checks: "warm" does not hide "war"
+    lexicon = Lexicon(negative=["war"], positive=["warm"])
+    assert lexicon.hits("a warm evening") == (["war"], ["warm"])
+    assert score_text("a warm evening", lexicon)["score"] == -lexicon.trigger_score
+
+
+def test_overlapping_triggers_at_different_offsets():
+    lexicon = Lexicon(negative=["warm"], positive=["armor"])
+    assert lexicon.hits("warmored") == (["warm"], ["armor"])
+
+
+def test_default_lexicon_scores():
+    assert score_text("They were cold and alone.")["score"] == -DEFAULT_LEXICON.trigger_score
+    assert score_text("A bright morning.")["score"] == DEFAULT_LEXICON.trigger_score
+    assert score_text("A bright but cold morning.")["negative_hits"] == ["cold"]
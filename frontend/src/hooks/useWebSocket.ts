@@ -43,6 +43,22 @@ export const useWebSocket = (manuscriptId: string) => {
 
           setEntities(transformed);
           setProcessing(false);
+        } else if (data.type === "entity_partial") {
+          // Streamed entity: show it right away, the full result replaces the list later
+          const item = data.entity || {};
+          const current = useStoryStore.getState().entities;
+          if (item.text && !current.some(e => e.text === item.text)) {
+            setEntities([
+              ...current,
+              { text: item.text, type: data.kind.replace(/s$/, '') as any, start: 0, end: 0 } as any
+            ]);
+          }
+        } else if (data.type === "throttle") {
+          // Backend queue is full: it stops reading frames until it sends 'resume'
+          console.warn("🚦 Backend busy, extraction queue throttled");
+          setProcessing(true);
+        } else if (data.type === "resume") {
+          console.log("🟢 Backend queue has room again");
         }
       } catch (err) {
         console.error("❌ Message Parse Error:", err);
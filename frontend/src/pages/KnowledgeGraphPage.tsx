@@ -37,6 +37,8 @@ const KnowledgeGraphPage: React.FC = () => {
     "Waiting for data...",
   );
   const ws = useRef<WebSocket | null>(null);
+  // Every character's arc from one bulk request; cleared when new entities arrive
+  const arcsCache = useRef<any[] | null>(null);
 
   useEffect(() => {
     const connect = () => {
@@ -52,6 +54,7 @@ const KnowledgeGraphPage: React.FC = () => {
         if (response.type === "entities_extracted") {
           // Note: Automatic fetch might miss the character name if not set yet.
           // We rely mostly on manual trigger or the Save button flow.
+          arcsCache.current = null;
           console.log("Entities extracted, ready to fetch graph.");
         }
       };
@@ -92,16 +95,23 @@ const KnowledgeGraphPage: React.FC = () => {
     }
 
     try {
-      // Encode the user input to handle spaces and special characters safely
-      const encodedName = encodeURIComponent(characterName.trim());
-      const res = await fetch(
-        `${API_URL}/analytics/character-arc/${MANUSCRIPT_ID}/${encodedName}`,
-      );
-      
-      if (res.ok) {
-        const data = await res.json();
-        setGraphData(data.data_points);
-        setOverallSentiment(data.overall_sentiment);
+      // One request for every arc of the manuscript (304 while it is unchanged);
+      // looking up another character afterwards needs no request at all
+      if (!arcsCache.current) {
+        const res = await fetch(`${API_URL}/analytics/character-arcs/${MANUSCRIPT_ID}`);
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+        arcsCache.current = (await res.json()).arcs;
+      }
+      const arcs = arcsCache.current ?? [];
+      const wanted = characterName.trim().toLowerCase();
+      // Exact name first, then partial-name matching (e.g. "Match Girl")
+      const arc =
+        arcs.find((a) => a.character.toLowerCase() === wanted) ??
+        arcs.find((a) => a.character.toLowerCase().includes(wanted));
+
+      if (arc) {
+        setGraphData(arc.data_points);
+        setOverallSentiment(arc.overall_sentiment);
         if (status === "processing") setStatus("connected");
       } else {
         console.error("Character not found");
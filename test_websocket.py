@@ -20,9 +20,11 @@ async def test_story_graph():
             await websocket.send(json.dumps(narrative_data))
             print("📨 Narrative sent. Waiting for AI extraction...")
             
-            # Wait for the response
-            response = await websocket.recv()
-            result = json.loads(response)
+            # Wait for the response (skip ingest_plan / throttle status frames)
+            result = json.loads(await websocket.recv())
+            while result.get("type") != "entities_extracted":
+                print(f"ℹ️ {result}")
+                result = json.loads(await websocket.recv())
             
             print("\n✅ RECEIVE SUCCESS:")
             print(json.dumps(result, indent=2))